@@ -4,6 +4,7 @@ from app.api.v1.endpoints import (
     auth,
     clinical_attentions,
     doctors,
+    events,
     gemini,
     health,
     insurance_company,
@@ -22,6 +23,7 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(doctors.router, prefix="/doctors", tags=["Doctors"])
 api_router.include_router(patients.router, prefix="/patients", tags=["Patients"])
 api_router.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
+api_router.include_router(events.router, prefix="/events", tags=["Events"])
 api_router.include_router(
     clinical_attentions.router, prefix="", tags=["Clinical Attentions"]
 )
@@ -1,15 +1,9 @@
 # app/api/v1/endpoints/clinical_attentions.py
+from typing import Literal
 from uuid import UUID
 
-from fastapi import (
-    APIRouter,
-    BackgroundTasks,
-    File,
-    HTTPException,
-    Path,
-    Query,
-    UploadFile,
-)
+from fastapi import APIRouter, File, HTTPException, Path, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
 
 from app.schemas.clinical_attention import (
     ClinicalAttentionDetailResponse,
@@ -17,11 +11,19 @@ from app.schemas.clinical_attention import (
     CloseEpisodeRequest,
     CreateClinicalAttentionRequest,
     DeleteClinicalAttentionRequest,
+    DraftEvaluationRequest,
     MedicApprovalRequest,
     ReopenEpisodeRequest,
+    ResolveEpisodesRequest,
+    ResolveEpisodesResponse,
+    SimilarCase,
+    SimilarCasesRequest,
     UpdateClinicalAttentionRequest,
 )
-from app.services import clinical_attention_service
+from app.schemas.gemini import UrgencyOutput
+from app.services import clinical_attention_service, episode_service, export_service
+from app.services.IA import ai_task, similar_cases
+from app.services.IA.limits import CircuitOpenError
 
 router = APIRouter()
 
@@ -73,6 +75,56 @@ def get_clinical_attentions(
         )
 
 
+@router.get("/clinical_attentions/export", tags=["Clinical Attentions"])
+def export_clinical_attentions(
+    format: Literal["csv", "xlsx"] = Query("csv", description="csv o xlsx"),
+    start_date: str | None = Query(None, description="Format YYYY-MM-DD"),
+    end_date: str | None = Query(None, description="Format YYYY-MM-DD"),
+    search: str
+    | None = Query(None, description="Buscar en paciente (RUT, nombre) o diagnóstico"),
+    patient_search: str
+    | None = Query(None, description="Buscar por paciente (nombre o RUT)"),
+    doctor_search: str | None = Query(None, description="Buscar por médico (nombre)"),
+    medic_approved: str
+    | None = Query(
+        None, description="Estado validación residente: pending, approved, rejected"
+    ),
+    supervisor_approved: str
+    | None = Query(
+        None, description="Estado validación supervisor: pending, approved, rejected"
+    ),
+    current_user_id: str
+    | None = Query(None, description="ID del usuario actual para filtrar por rol"),
+):
+    """
+    Exporta las atenciones (mismos filtros que el listado) como CSV o XLSX,
+    transmitido por bloques en orden de creación.
+    """
+    try:
+        content = export_service.export_attentions(
+            format,
+            start_date=start_date,
+            end_date=end_date,
+            search=search,
+            patient_search=patient_search,
+            doctor_search=doctor_search,
+            medic_approved=medic_approved,
+            supervisor_approved=supervisor_approved,
+            current_user_id=current_user_id,
+        )
+    except Exception as e:
+        print(f"Error exporting clinical attentions: {e}")
+        raise HTTPException(
+            status_code=500, detail="Ocurrió un error interno al exportar atenciones."
+        )
+
+    return StreamingResponse(
+        content,
+        media_type=export_service.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="atenciones.{format}"'},
+    )
+
+
 @router.get(
     "/clinical_attentions/{attention_id}",
     response_model=ClinicalAttentionDetailResponse,
@@ -88,6 +140,122 @@ def get_clinical_attention_detail(attention_id: UUID):
         raise HTTPException(status_code=500, detail="Ocurrió un error interno")
 
 
+@router.get(
+    "/clinical_attentions/by_episode/{id_episodio}",
+    response_model=ClinicalAttentionDetailResponse,
+    tags=["Clinical Attentions"],
+)
+def get_clinical_attention_by_episode(
+    id_episodio: str,
+    source: str | None = Query(None, description="Sistema de origen del episodio"),
+):
+    try:
+        return clinical_attention_service.get_attention_by_episode(id_episodio, source)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Atención clínica no encontrada")
+    except Exception as e:
+        print(f"Error en el endpoint (episodio): {e}")
+        raise HTTPException(status_code=500, detail="Ocurrió un error interno")
+
+
+@router.post(
+    "/clinical_attentions/resolve_episodes",
+    response_model=ResolveEpisodesResponse,
+    tags=["Clinical Attentions"],
+)
+def resolve_episodes(payload: ResolveEpisodesRequest):
+    """
+    Resuelve en lote números de episodio a atención, paciente y aseguradora.
+    """
+    try:
+        resolved = episode_service.resolve_episodes(payload.episodes, payload.source)
+        missing = [
+            episode
+            for episode in dict.fromkeys(e.strip() for e in payload.episodes)
+            if episode and episode not in resolved
+        ]
+        return ResolveEpisodesResponse(results=list(resolved.values()), missing=missing)
+    except Exception as e:
+        print(f"Error resolve_episodes endpoint: {e}")
+        raise HTTPException(status_code=500, detail="Error al resolver episodios")
+
+
+@router.post(
+    "/clinical_attentions/draft_evaluation",
+    response_model=UrgencyOutput,
+    responses={204: {"description": "Texto demasiado corto para evaluar"}},
+    tags=["Clinical Attentions"],
+)
+async def draft_evaluation(payload: DraftEvaluationRequest):
+    """
+    Evaluación especulativa del diagnóstico mientras se escribe (llamar con
+    debounce). El resultado queda en el cache de IA: si la atención se crea
+    o edita con el mismo texto, el resultado se adjunta al instante.
+    """
+    try:
+        result = await ai_task.evaluate_draft(payload.diagnostic)
+    except ai_task.DraftBudgetExceeded:
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiadas evaluaciones de borradores en curso",
+            headers={"Retry-After": "1"},
+        )
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(int(e.retry_after), 1))},
+        )
+    except Exception as e:
+        print(f"Error en el endpoint (draft_evaluation): {e}")
+        raise HTTPException(status_code=500, detail="Error al evaluar el borrador")
+    if result is None:
+        return Response(status_code=204)
+    return result
+
+
+@router.post(
+    "/clinical_attentions/similar_cases",
+    response_model=list[SimilarCase],
+    tags=["Clinical Attentions"],
+)
+def similar_cases_for_text(payload: SimilarCasesRequest):
+    """
+    Atenciones anteriores con el diagnóstico más parecido al texto (p. ej. un
+    borrador), de mayor a menor similitud.
+    """
+    try:
+        return similar_cases.search(
+            payload.diagnostic, k=payload.k, validated_only=payload.validated_only
+        )
+    except Exception as e:
+        print(f"Error en el endpoint (similar_cases): {e}")
+        raise HTTPException(status_code=500, detail="Error al buscar casos similares")
+
+
+@router.get(
+    "/clinical_attentions/{attention_id}/similar_cases",
+    response_model=list[SimilarCase],
+    tags=["Clinical Attentions"],
+)
+def similar_cases_for_attention(
+    attention_id: UUID,
+    k: int = Query(5, ge=1, le=50, description="Cantidad de casos"),
+    validated_only: bool = Query(
+        False, description="Solo casos validados por residente y supervisor"
+    ),
+):
+    try:
+        return clinical_attention_service.find_similar_cases(
+            attention_id, k, validated_only
+        )
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Atención clínica no encontrada")
+    except Exception as e:
+        print(f"Error en el endpoint (similar_cases): {e}")
+        raise HTTPException(status_code=500, detail="Error al buscar casos similares")
+
+
 @router.post(
     "/clinical_attentions",
     response_model=ClinicalAttentionDetailResponse,
@@ -95,12 +263,9 @@ def get_clinical_attention_detail(attention_id: UUID):
 )
 def create_clinical_attention(
     payload: CreateClinicalAttentionRequest,
-    background_tasks: BackgroundTasks,
 ) -> ClinicalAttentionDetailResponse:
     try:
-        created_attention = clinical_attention_service.create_attention(
-            payload, background_tasks
-        )
+        created_attention = clinical_attention_service.create_attention(payload)
         return created_attention
     except HTTPException as e:
         raise e
@@ -118,14 +283,13 @@ def create_clinical_attention(
     tags=["Clinical Attentions"],
 )
 def patch_clinical_attention(
-    background_tasks: BackgroundTasks,
     attention_id: UUID = Path(..., description="ID de la atención clínica"),
     payload: UpdateClinicalAttentionRequest = None,
 ):
     try:
         FAKE_EDITOR_ID = "392c3fe1-ee87-4bbb-ae46-d2733a84bf8f"
         updated_attention = clinical_attention_service.update_attention(
-            attention_id, payload, background_tasks, editor_id=FAKE_EDITOR_ID
+            attention_id, payload, editor_id=FAKE_EDITOR_ID
         )
         return updated_attention
     except HTTPException as e:
@@ -0,0 +1,55 @@
+import asyncio
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.services import events
+
+router = APIRouter()
+
+
+@router.get("/stream", tags=["Events"])
+async def stream_events(
+    request: Request,
+    attention_ids: Optional[List[str]] = Query(
+        None, description="IDs de atenciones a seguir"
+    ),
+    user_id: Optional[str] = Query(
+        None, description="Seguir las atenciones donde es residente o supervisor"
+    ),
+):
+    """
+    Stream SSE de cambios en atenciones: resultado de IA (`ai_result`),
+    validaciones (`approval`) y cierre (`closure`). Reemplaza el polling de
+    GET /clinical_attentions/{id}.
+    """
+    if not attention_ids and not user_id:
+        raise HTTPException(
+            status_code=400, detail="Indique attention_ids o user_id a seguir"
+        )
+    subscription = events.subscribe(attention_ids or [], user_id)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Mantiene viva la conexión a través de proxies
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,22 +1,62 @@
-from fastapi import APIRouter, HTTPException
+import json
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from app.schemas.gemini import UrgencyInput, UrgencyOutput
-from app.services.IA import gemini as gemini_module
+from app.services.IA import reasoning
+from app.services.IA.limits import CircuitOpenError
 
 router = APIRouter()
 
 
 @router.post("/reason", response_model=UrgencyOutput)
-def reason(payload: UrgencyInput):
+async def reason(
+    payload: UrgencyInput,
+    stream: bool = Query(
+        False, description="Responder como stream SSE con campos parciales"
+    ),
+):
     """Evaluate urgency using Gemini.
 
     Expects a JSON body matching `UrgencyInput` and returns `UrgencyOutput`.
+
+    With `stream=true` the response is an SSE stream: a `field` event per
+    top-level field as soon as it is generated (`urgency_flag` and
+    `urgency_confidence` first), then a `result` event with the full
+    `UrgencyOutput`, or an `error` event.
     """
+    if stream:
+        return StreamingResponse(
+            _reason_events(payload),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
-        result = gemini_module.reason(payload.dict())
+        result = await reasoning.reason(payload.dict(), reasoning.STRUCTURED)
         return result
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(int(e.retry_after), 1))},
+        )
     except RuntimeError as e:
         # Explicit runtime error when google-genai client is missing
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini evaluation failed: {e}")
+
+
+async def _reason_events(payload: UrgencyInput):
+    def sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    try:
+        async for kind, data in reasoning.reason_stream(
+            payload.dict(), reasoning.STRUCTURED
+        ):
+            yield sse(kind, data.dict() if kind == "result" else data)
+    except Exception as e:
+        # The status line is already sent: report the failure in the stream
+        yield sse("error", {"detail": f"Gemini evaluation failed: {e}"})
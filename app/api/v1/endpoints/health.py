@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+
+from app.services.IA import ai_cache, ai_queue, gemini_client, reevaluation
 
 router = APIRouter()
 
@@ -16,3 +18,44 @@ async def detailed_health_check() -> dict:
         "version": "1.0.0",
         "environment": "development",
     }
+
+
+@router.get("/ai_queue")
+def ai_queue_health() -> dict:
+    """Profundidad y antigüedad de la cola de evaluaciones de IA."""
+    try:
+        return ai_queue.queue_stats()
+    except Exception as e:
+        print(f"Error fetching AI queue stats: {e}")
+        raise HTTPException(status_code=503, detail="Cola de IA no disponible")
+
+
+@router.get("/gemini")
+def gemini_health() -> dict:
+    """Circuit breaker y cupo RPM/TPM disponible de Gemini (de este proceso)."""
+    return gemini_client.limiter_state()
+
+
+@router.get("/ai_cache")
+def ai_cache_health() -> dict:
+    """Tasa de aciertos del cache de resultados de IA."""
+    try:
+        return ai_cache.stats()
+    except Exception as e:
+        print(f"Error fetching AI cache stats: {e}")
+        raise HTTPException(status_code=503, detail="Cache de IA no disponible")
+
+
+@router.get("/ai_reevaluations")
+def ai_reevaluations() -> list[dict]:
+    """Últimas corridas de re-evaluación masiva de IA."""
+    return reevaluation.list_runs()
+
+
+@router.get("/ai_reevaluations/{run_id}")
+def ai_reevaluation_progress(run_id: int) -> dict:
+    """Avance, throughput y ETA de una corrida de re-evaluación."""
+    try:
+        return reevaluation.progress(run_id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Corrida no encontrada")
@@ -1,14 +1,99 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from app.schemas.metric import MetricStats
-from app.services import metric_service
+from app.schemas.metric import AgreementResponse, MetricSeriesResponse, MetricStats
+from app.services import export_service, metric_service
 
 router = APIRouter()
 
 
+@router.get("/series", response_model=MetricSeriesResponse, tags=["Metrics"])
+def get_metrics_series(
+    scope: Literal["users", "insurance_companies"] = Query(
+        "users", description="Entidades: users o insurance_companies"
+    ),
+    bucket: Literal["day", "week", "month"] = Query(
+        "month", description="Tamaño del bucket: day, week o month"
+    ),
+    ids: Optional[List[str]] = Query(
+        None, description="IDs de usuarios o aseguradoras (por defecto todos)"
+    ),
+    start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+):
+    """
+    Obtiene la serie temporal de métricas por bucket de fecha.
+    """
+    try:
+        return metric_service.get_metrics_series(
+            scope, bucket, ids, start_date, end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error fetching metrics series: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error calculando serie de métricas"
+        )
+
+
+@router.get("/agreement", response_model=AgreementResponse, tags=["Metrics"])
+def get_agreement_metrics(
+    group_by: Literal["users", "insurance_companies", "all"] = Query(
+        "all", description="Agrupar por users, insurance_companies o all"
+    ),
+    bucket: Optional[Literal["day", "week", "month"]] = Query(
+        None, description="Separar además por day, week o month"
+    ),
+    start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+):
+    """
+    Concordancia de la IA con la pertinencia de la aseguradora: matriz de
+    confusión, precision/recall y calibración de ai_confidence.
+    """
+    try:
+        return metric_service.get_agreement_metrics(
+            group_by, bucket, start_date, end_date
+        )
+    except Exception as e:
+        print(f"Error fetching agreement metrics: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error calculando concordancia de la IA"
+        )
+
+
+@router.get("/export", tags=["Metrics"])
+def export_metrics(
+    scope: Literal["users", "insurance_companies"] = Query(
+        "users", description="Entidades: users o insurance_companies"
+    ),
+    format: Literal["csv", "xlsx"] = Query("csv", description="csv o xlsx"),
+    start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+):
+    """
+    Exporta las métricas de todos los usuarios o aseguradoras como CSV o XLSX.
+    """
+    try:
+        if scope == "users":
+            metrics = metric_service.get_all_users_metrics(start_date, end_date)
+        else:
+            metrics = metric_service.get_all_insurance_metrics(start_date, end_date)
+    except Exception as e:
+        print(f"Error exporting metrics: {e}")
+        raise HTTPException(status_code=500, detail="Error exportando métricas")
+
+    return StreamingResponse(
+        export_service.export_metrics(format, metrics),
+        media_type=export_service.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="metricas.{format}"'},
+    )
+
+
 @router.get("/users", response_model=List[MetricStats], tags=["Metrics"])
 def get_users_metrics(
     start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
@@ -46,6 +131,23 @@ def get_user_metrics(
         )
 
 
+@router.get("/insurance_companies", response_model=List[MetricStats], tags=["Metrics"])
+def get_all_insurance_metrics(
+    start_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Format YYYY-MM-DD"),
+):
+    """
+    Obtiene métricas de todas las aseguradoras.
+    """
+    try:
+        return metric_service.get_all_insurance_metrics(start_date, end_date)
+    except Exception as e:
+        print(f"Error fetching insurances metrics: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error calculando métricas de aseguradoras"
+        )
+
+
 @router.get(
     "/insurance_companies/{company_id}", response_model=MetricStats, tags=["Metrics"]
 )
@@ -0,0 +1,124 @@
+"""
+Comandos de mantenimiento del backend.
+
+Uso:
+    poetry run python -m app.cli rebuild-rollup [--start YYYY-MM-DD] [--end ...]
+    poetry run python -m app.cli snapshot-sync [--full]
+    poetry run python -m app.cli ai-worker [--concurrency N]
+    poetry run python -m app.cli ai-reevaluate [--start ...] [--end ...]
+        [--prompt-version V ...] [--model M ...] [--rate N] | --resume ID
+"""
+
+import argparse
+
+
+def _rebuild_rollup(args: argparse.Namespace) -> None:
+    from app.services import metric_service
+
+    rows = metric_service.rebuild_rollup(args.start, args.end)
+    print(f"Rollup de métricas recalculado: {rows} filas")
+
+
+def _snapshot_sync(args: argparse.Namespace) -> None:
+    from app.services import snapshot_service
+
+    for table, rows in snapshot_service.sync_snapshot(full=args.full).items():
+        print(f"Snapshot {table}: {rows} filas sincronizadas")
+
+
+def _ai_worker(args: argparse.Namespace) -> None:
+    from app.services.IA.ai_worker import AIWorker
+
+    # Con SIGTERM (deploy/restart) deja de reclamar y termina los jobs en curso
+    AIWorker(concurrency=args.concurrency).run()
+
+
+def _ai_reevaluate(args: argparse.Namespace) -> None:
+    import signal
+
+    from app.services.IA import reevaluation
+
+    if args.resume:
+        run_id = args.resume
+    else:
+        filters = {
+            "start_date": args.start,
+            "end_date": args.end,
+            "prompt_versions": args.prompt_version,
+            "models": args.model,
+        }
+        run = reevaluation.create_run(
+            {k: v for k, v in filters.items() if v}, args.rate
+        )
+        run_id = run["id"]
+        print(f"Corrida {run_id}: {run['total']} atenciones a re-evaluar")
+
+    # Con Ctrl+C / SIGTERM la corrida queda en pausa y se retoma con --resume
+    stopping = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.append(True))
+
+    run = reevaluation.execute(run_id, should_stop=lambda: bool(stopping))
+    print(
+        f"Corrida {run_id} {run['status']}: {run['enqueued']}/{run['total']} encoladas"
+    )
+    if run["status"] == "paused":
+        print(f"Retomar con: python -m app.cli ai-reevaluate --resume {run_id}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rollup = subparsers.add_parser(
+        "rebuild-rollup", help="Recalcula el rollup diario de métricas"
+    )
+    rollup.add_argument("--start", help="Día inicial (YYYY-MM-DD)")
+    rollup.add_argument("--end", help="Día final (YYYY-MM-DD)")
+    rollup.set_defaults(func=_rebuild_rollup)
+
+    snapshot = subparsers.add_parser(
+        "snapshot-sync", help="Sincroniza el snapshot Parquet local (incremental)"
+    )
+    snapshot.add_argument(
+        "--full", action="store_true", help="Rehace el snapshot completo"
+    )
+    snapshot.set_defaults(func=_snapshot_sync)
+
+    ai_worker = subparsers.add_parser(
+        "ai-worker", help="Procesa la cola de evaluaciones de IA"
+    )
+    ai_worker.add_argument(
+        "--concurrency", type=int, help="Evaluaciones simultáneas (por defecto config)"
+    )
+    ai_worker.set_defaults(func=_ai_worker)
+
+    reevaluate = subparsers.add_parser(
+        "ai-reevaluate",
+        help="Re-evalúa con IA atenciones existentes (tras cambiar prompt o modelo)",
+    )
+    reevaluate.add_argument("--start", help="Creadas desde (YYYY-MM-DD)")
+    reevaluate.add_argument("--end", help="Creadas hasta (YYYY-MM-DD)")
+    reevaluate.add_argument(
+        "--prompt-version",
+        action="append",
+        help="Versión de prompt del resultado actual ('none' = sin versión); "
+        "por defecto, toda versión distinta de la actual",
+    )
+    reevaluate.add_argument(
+        "--model", action="append", help="Modelo del resultado actual"
+    )
+    reevaluate.add_argument(
+        "--rate", type=int, help="Atenciones por minuto (por defecto config)"
+    )
+    reevaluate.add_argument(
+        "--resume", type=int, metavar="RUN_ID", help="Retoma una corrida"
+    )
+    reevaluate.set_defaults(func=_ai_reevaluate)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
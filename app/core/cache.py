@@ -0,0 +1,155 @@
+"""
+In-process caches shared by the services.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with a fixed number of entries."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class _Flight:
+    """A computation in progress for one key; other callers wait on it."""
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+
+class TTLCache:
+    """
+    Result cache with TTL, single-flight and stale-while-revalidate.
+
+    - Within `ttl` the cached value is returned.
+    - Past `ttl` but within `ttl + stale_ttl` the old value is returned and a
+      background thread recomputes it (at most once per key).
+    - On a miss only the first caller computes; concurrent callers wait and get
+      the same result (or the same exception).
+    - `invalidate` drops entries; a computation started before the
+      invalidation does not store its result.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._inflight: dict[Hashable, _Flight] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if self.ttl <= 0:
+            return compute()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    if key not in self._inflight:
+                        self._start_flight(key, compute, background=True)
+                    return value
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._start_flight(key, compute, background=False)
+
+        if leader:
+            self._run_flight(key, compute, flight)
+        else:
+            flight.event.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def invalidate(self, match: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """Drop every entry, or only the keys for which `match` returns True."""
+        with self._lock:
+            self._generation += 1
+            keys = [k for k in self._entries if match is None or match(k)]
+            for key in keys:
+                del self._entries[key]
+            # Callers arriving after this point start a fresh computation
+            for key in [k for k in self._inflight if match is None or match(k)]:
+                del self._inflight[key]
+
+    def _start_flight(
+        self, key: Hashable, compute: Callable[[], Any], background: bool
+    ) -> _Flight:
+        # Must be called with self._lock held
+        flight = _Flight(self._generation)
+        self._inflight[key] = flight
+        if background:
+            threading.Thread(
+                target=self._run_flight, args=(key, compute, flight), daemon=True
+            ).start()
+        return flight
+
+    def _run_flight(
+        self, key: Hashable, compute: Callable[[], Any], flight: _Flight
+    ) -> None:
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if flight.error is None and flight.generation == self._generation:
+                    self._entries[key] = (time.monotonic(), flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+            flight.event.set()
@@ -1,4 +1,4 @@
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 from pydantic import AnyHttpUrl, validator
 from pydantic_settings import BaseSettings
@@ -34,6 +34,106 @@ class Settings(BaseSettings):
     # Gemini / Google GenAI
     GEMINI_API_KEY: Optional[str] = None
     GEMINI_MODEL: str = "gemini-2.5-flash"
+    # Cascada: primero el modelo rápido; si su respuesta es "uncertain" o
+    # tiene confianza < THRESHOLD se escala a GEMINI_MODEL (vacío la desactiva)
+    GEMINI_FAST_MODEL: str = "gemini-2.5-flash-lite"
+    GEMINI_CASCADE_THRESHOLD: float = 0.8
+    # Timeout por intento, intentos ante errores transitorios y llamadas
+    # simultáneas por event loop
+    GEMINI_TIMEOUT_SECONDS: float = 60.0
+    GEMINI_MAX_ATTEMPTS: int = 3
+    GEMINI_MAX_CONCURRENCY: int = 8
+    # Cuota por proceso (API y cada worker tienen la suya; 0 desactiva):
+    # repartir la cuota del proyecto entre los procesos
+    GEMINI_RPM: int = 150
+    GEMINI_TPM: int = 1_000_000
+    # Tokens de respuesta supuestos al reservar TPM (se corrige con el uso real)
+    GEMINI_OUTPUT_TOKENS_ESTIMATE: int = 1024
+    GEMINI_BACKOFF_BASE_SECONDS: float = 1.0
+    GEMINI_BACKOFF_MAX_SECONDS: float = 20.0
+    # Circuit breaker: fallos transitorios seguidos para abrir y segundos
+    # abierto antes de probar de nuevo (0 fallos lo desactiva)
+    GEMINI_BREAKER_FAILURES: int = 5
+    GEMINI_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Cola de evaluaciones de IA (python -m app.cli ai-worker)
+    AI_WORKER_CONCURRENCY: int = 4
+    AI_WORKER_POLL_SECONDS: float = 2.0
+    # Máximo de jobs simultáneos por clase y worker (create / edit /
+    # backfill); las clases ausentes pueden usar toda la concurrencia
+    AI_WORKER_CLASS_QUOTAS: Dict[str, int] = {"edit": 3, "backfill": 1}
+    # Cada tantos segundos de espera un job sube un nivel de prioridad
+    AI_JOB_AGING_SECONDS: float = 60.0
+    # Tiempo que un job reclamado queda invisible para otros workers
+    AI_JOB_VISIBILITY_SECONDS: int = 300
+    AI_JOB_MAX_ATTEMPTS: int = 5
+    AI_JOB_RETRY_BASE_SECONDS: float = 10.0
+    AI_JOB_RETRY_MAX_SECONDS: float = 600.0
+    # Debounce de ediciones: la evaluación espera esta pausa sin cambios al
+    # diagnóstico, pero no más de MAX desde la primera edición pendiente
+    AI_JOB_DEBOUNCE_SECONDS: float = 5.0
+    AI_JOB_DEBOUNCE_MAX_SECONDS: float = 30.0
+    # Cache de resultados de IA por contenido (tabla ai_result_cache + LRU)
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_SIZE: int = 2048
+    # Los aciertos se acumulan en memoria y se escriben a la tabla cada
+    # FLUSH_SECONDS (un UPDATE por lote, no uno por acierto)
+    AI_CACHE_HIT_FLUSH_SECONDS: float = 30.0
+    # Pre-evaluación especulativa de borradores (POST .../draft_evaluation):
+    # largo mínimo del texto y evaluaciones simultáneas por proceso
+    AI_DRAFT_MIN_CHARS: int = 20
+    AI_DRAFT_MAX_CONCURRENCY: int = 4
+    # Re-evaluaciones masivas (python -m app.cli ai-reevaluate): atenciones
+    # encoladas por minuto y máximo de jobs pendientes de una corrida
+    AI_REEVAL_RATE_PER_MINUTE: int = 30
+    AI_REEVAL_MAX_PENDING: int = 200
+    # Casos similares (índice TF-IDF local de diagnósticos): precedentes
+    # validados sobre FAST_PATH_SCORE responden sin llamar a Gemini (0 lo
+    # desactiva); sobre GROUNDING_SCORE se agregan al prompt (hasta K). El
+    # índice relee los cambios cada REFRESH_SECONDS, desde OVERLAP_SECONDS
+    # antes de la última sync (filas cuyo updated_at se confirmó después)
+    SIMILAR_CASES_ENABLED: bool = True
+    SIMILAR_CASES_FAST_PATH_SCORE: float = 0.9
+    SIMILAR_CASES_GROUNDING_SCORE: float = 0.4
+    SIMILAR_CASES_GROUNDING_K: int = 3
+    SIMILAR_CASES_REFRESH_SECONDS: float = 30.0
+    SIMILAR_CASES_OVERLAP_SECONDS: int = 300
+    # Fast path por reglas para diagnósticos inequívocos (KNOWN_DX); con
+    # CONFIRM el resultado de la regla se guarda al instante y la IA lo
+    # confirma después. AI_RULES_SYNONYMS agrega sinónimos en JSON, p. ej.
+    # {"Politraumatismo": ["poli TEC"]}
+    AI_RULES_ENABLED: bool = True
+    AI_RULES_CONFIRM_WITH_LLM: bool = True
+    AI_RULES_CONFIDENCE: float = 0.95
+    AI_RULES_SYNONYMS: Dict[str, List[str]] = {}
+
+    # Eventos de atenciones por SSE: "memory" (solo este proceso) o "postgres"
+    # (pg_notify + LISTEN; necesario si el worker de IA corre aparte).
+    # EVENTS_DATABASE_URL debe ser una conexión de sesión (no el pooler en
+    # modo transacción), porque LISTEN vive en la sesión
+    EVENTS_BACKEND: str = "memory"
+    EVENTS_DATABASE_URL: str = ""
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+
+    # Episodes (id_episodio lookup)
+    EPISODE_DEFAULT_SOURCE: str = "local"
+    EPISODE_CACHE_SIZE: int = 4096
+
+    # Keyset scans (debe ser <= max-rows de PostgREST)
+    SCAN_CHUNK_SIZE: int = 1000
+
+    # Métricas: "rollup" (tabla metrics_daily_rollup), "raw" (atenciones) o
+    # "duckdb" (snapshot Parquet local, ver snapshot_service)
+    METRICS_BACKEND: str = "rollup"
+    # Cache de resultados de /metrics (TTL 0 lo desactiva)
+    METRICS_CACHE_TTL_SECONDS: int = 60
+    METRICS_CACHE_STALE_SECONDS: int = 300
+
+    # Snapshot Parquet local (python -m app.cli snapshot-sync)
+    SNAPSHOT_DIR: str = "data/snapshot"
+    # Margen hacia atrás de cada sync incremental, para no perder filas cuyo
+    # updated_at se confirmó después de la sync anterior
+    SNAPSHOT_OVERLAP_SECONDS: int = 300
 
     class Config:
         case_sensitive = True
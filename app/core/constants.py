@@ -13,3 +13,38 @@ URGENT_RULE = {
     "Politraumatismo": True,
     "Shock séptico": True,
 }
+
+# Sinónimos y abreviaturas de KNOWN_DX para el fast path por reglas
+# (app/services/IA/rules.py). Se comparan sin tildes ni mayúsculas; se pueden
+# extender con AI_RULES_SYNONYMS.
+DX_SYNONYMS = {
+    "ACV isquémico": [
+        "ACV isquémico",
+        "accidente cerebrovascular isquémico",
+        "ataque cerebrovascular isquémico",
+        "infarto cerebral",
+    ],
+    "Tromboembolismo pulmonar": [
+        "TEP",
+        "tromboembolismo pulmonar",
+        "tromboembolia pulmonar",
+        "embolia pulmonar",
+    ],
+    "Infarto agudo al miocardio": [
+        "IAM",
+        "IAMCEST",
+        "IAMSEST",
+        "infarto agudo al miocardio",
+        "infarto agudo de miocardio",
+        "infarto agudo del miocardio",
+    ],
+    "Politraumatismo": [
+        "politraumatismo",
+        "politraumatizado",
+        "politrauma",
+    ],
+    "Shock séptico": [
+        "shock séptico",
+        "choque séptico",
+    ],
+}
@@ -181,3 +181,44 @@ class CloseEpisodeRequest(BaseModel):
 
 class ReopenEpisodeRequest(BaseModel):
     reopened_by_id: UUID = Field(..., description="ID del admin que reabre el episodio")
+
+
+class EpisodeRef(BaseModel):
+    id_episodio: str
+    episode_source: str
+    attention_id: UUID
+    patient_id: Optional[UUID] = None
+    insurance_company_id: Optional[int] = None
+
+
+class ResolveEpisodesRequest(BaseModel):
+    episodes: list[str] = Field(..., description="Números de episodio a resolver")
+    source: Optional[str] = Field(
+        None, description="Sistema de origen del episodio (por defecto 'local')"
+    )
+
+
+class ResolveEpisodesResponse(BaseModel):
+    results: list[EpisodeRef]
+    missing: list[str]
+
+
+class DraftEvaluationRequest(BaseModel):
+    diagnostic: str = Field(..., description="Texto del diagnóstico en edición")
+
+
+class SimilarCase(BaseModel):
+    attention_id: UUID
+    id_episodio: Optional[str] = None
+    created_at: Optional[datetime] = None
+    diagnostic: str
+    # Veredicto final (IA corregida por residente y supervisor)
+    applies_urgency_law: Optional[bool] = None
+    validated: bool
+    score: float = Field(..., description="Similitud coseno TF-IDF (0-1)")
+
+
+class SimilarCasesRequest(BaseModel):
+    diagnostic: str = Field(..., description="Texto del diagnóstico a comparar")
+    k: int = Field(5, ge=1, le=50)
+    validated_only: bool = False
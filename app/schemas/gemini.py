@@ -71,6 +71,12 @@ class UrgencyOutput(BaseModel):
     diagnosis_hypotheses: List[Dx]
     rationale: str
     actions: List[str]
+    # Who answered: the model, and the cascade tier ("fast" / "strong"),
+    # "rules" or "precedent" for the local fast paths; prompt_version of the
+    # prompt used
+    model: Optional[str] = None
+    tier: Optional[Literal["fast", "strong", "rules", "precedent"]] = None
+    prompt_version: Optional[str] = None
 
     class Config:
         schema_extra = {
@@ -88,5 +94,7 @@ class UrgencyOutput(BaseModel):
                     "Traslado inmediato",
                     "Estabilización inicial",
                 ],
+                "model": "gemini-2.5-flash-lite",
+                "tier": "fast",
             }
         }
@@ -1,4 +1,5 @@
-from typing import Optional, Union
+from datetime import date
+from typing import Literal, Optional, Union
 
 from pydantic import BaseModel
 
@@ -30,3 +31,62 @@ class MetricsResponse(BaseModel):
     start_date: Optional[str]
     end_date: Optional[str]
     metrics: MetricStats | list[MetricStats]
+
+
+class MetricSeriesPoint(BaseModel):
+    bucket_start: date
+    metrics: list[MetricStats]
+
+
+class MetricSeriesResponse(BaseModel):
+    scope: Literal["users", "insurance_companies"]
+    bucket: Literal["day", "week", "month"]
+    start_date: Optional[str]
+    end_date: Optional[str]
+    points: list[MetricSeriesPoint]
+
+
+class ConfusionMatrix(BaseModel):
+    # IA (ai_result) vs. aseguradora (pertinencia); positivo = ley de urgencia
+    true_positive: int
+    false_positive: int
+    false_negative: int
+    true_negative: int
+    # IA con resultado, aseguradora aún sin pertinencia
+    pending: int
+    # Sin resultado de IA
+    without_ai: int
+
+
+class CalibrationBin(BaseModel):
+    # Rango de ai_confidence [lower, upper)
+    lower: float
+    upper: float
+    # Episodios con resultado de IA y pertinencia en el rango
+    episodes: int
+    mean_confidence: Optional[float]
+    # Fracción en que la aseguradora coincidió con la IA
+    agreement_rate: Optional[float]
+
+
+class AgreementStats(BaseModel):
+    id: Optional[Union[str, int]] = None
+    name: Optional[str] = "Desconocido"
+    bucket_start: Optional[date] = None
+
+    confusion: ConfusionMatrix
+    # Fracciones 0-1; None si no hay episodios para calcularlas
+    precision: Optional[float]
+    recall: Optional[float]
+    accuracy: Optional[float]
+
+    calibration: list[CalibrationBin]
+    expected_calibration_error: Optional[float]
+
+
+class AgreementResponse(BaseModel):
+    group_by: Literal["users", "insurance_companies", "all"]
+    bucket: Optional[Literal["day", "week", "month"]]
+    start_date: Optional[str]
+    end_date: Optional[str]
+    metrics: list[AgreementStats]
@@ -0,0 +1,158 @@
+"""
+Content-addressed cache of AI evaluations (table `ai_result_cache`).
+
+The key is a hash of the models (model_signature: cascade models and
+threshold), the prompt version and the diagnostic text normalized the way
+the reasoner sees it (triage section removed, whitespace collapsed), so
+template text, re-saves and whitespace-only edits reuse the stored
+UrgencyOutput instead of calling Gemini again. An in-process LRU sits
+in front of the table. Hits are counted in memory and written to the table
+in batches every AI_CACHE_HIT_FLUSH_SECONDS, so a hit never waits on a
+write. See db/migrations/20261019001000_ai_result_cache.sql.
+"""
+
+import atexit
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Optional
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.supabase_client import supabase
+from app.schemas.gemini import UrgencyOutput
+from app.services.IA import gemini_client
+from app.services.IA.prompts_txt import PROMPT_VERSION
+from app.services.IA.reasoning import model_signature, remove_triage_section
+
+_lru = LRUCache(maxsize=settings.AI_CACHE_SIZE)
+
+_stats = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+# Hits per key not yet written to the table (see flush_hits)
+_pending_hits: Counter = Counter()
+_flushed_at = time.monotonic()
+
+
+def enabled() -> bool:
+    # Mock results (CI / no API key) must never be stored as real answers
+    return settings.AI_CACHE_ENABLED and not gemini_client.is_mock_mode()
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", remove_triage_section(text or ""))
+    return " ".join(text.split())
+
+
+def cache_key(text: str) -> str:
+    material = "\x00".join((model_signature(), PROMPT_VERSION, normalize_text(text)))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _count(field: str) -> None:
+    with _stats_lock:
+        _stats[field] += 1
+
+
+def get(key: str) -> Optional[UrgencyOutput]:
+    """Cached output for `key`, from the LRU or else the table."""
+    output = _lru.get(key)
+    if output is not None:
+        _count("memory_hits")
+        _record_hit(key)
+        return output
+
+    response = (
+        supabase.table("ai_result_cache")
+        .select("output")
+        .eq("key", key)
+        .limit(1)
+        .execute()
+    )
+    if not response.data:
+        _count("misses")
+        return None
+
+    output = UrgencyOutput(**response.data[0]["output"])
+    if output.prompt_version is None:
+        # Stored before results were stamped; the key already pins the version
+        output.prompt_version = PROMPT_VERSION
+    _lru.set(key, output)
+    _count("store_hits")
+    _record_hit(key)
+    return output
+
+
+def put(key: str, output: UrgencyOutput) -> None:
+    _lru.set(key, output)
+    supabase.table("ai_result_cache").upsert(
+        {
+            "key": key,
+            "model": model_signature(),
+            "prompt_version": PROMPT_VERSION,
+            "output": output.dict(),
+        }
+    ).execute()
+
+
+def _record_hit(key: str) -> None:
+    global _flushed_at
+    with _stats_lock:
+        _pending_hits[key] += 1
+        now = time.monotonic()
+        due = now - _flushed_at >= settings.AI_CACHE_HIT_FLUSH_SECONDS
+        if due:
+            _flushed_at = now
+    if due:
+        threading.Thread(target=flush_hits, daemon=True).start()
+
+
+def flush_hits() -> None:
+    """
+    Add the hits counted by this process to the persistent counters, so the
+    hit rate covers every worker process. Never fails: on error the hits are
+    kept for the next flush.
+    """
+    with _stats_lock:
+        hits = dict(_pending_hits)
+        _pending_hits.clear()
+    if not hits:
+        return
+    try:
+        supabase.rpc("touch_ai_result_cache_batch", {"p_hits": hits}).execute()
+    except Exception as e:
+        print(f"[AI Cache] Error recording hits: {e}")
+        with _stats_lock:
+            _pending_hits.update(hits)
+
+
+atexit.register(flush_hits)
+
+
+def stats() -> dict:
+    """Hit counters of this process plus the persistent totals."""
+    with _stats_lock:
+        local = dict(_stats)
+    lookups = sum(local.values())
+    local["hit_rate"] = (
+        (local["memory_hits"] + local["store_hits"]) / lookups if lookups else None
+    )
+    local["memory_entries"] = len(_lru)
+
+    flush_hits()
+    response = supabase.rpc("ai_result_cache_stats", {}).execute()
+    store = (response.data or [{}])[0]
+    entries = store.get("entries") or 0
+    hits = store.get("hits") or 0
+    return {
+        "process": local,
+        "entries": entries,
+        "hits": hits,
+        # Every entry stands for one miss (one Gemini call)
+        "hit_rate": hits / (hits + entries) if hits + entries else None,
+        "model": model_signature(),
+        "prompt_version": PROMPT_VERSION,
+    }
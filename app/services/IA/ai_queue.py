@@ -0,0 +1,153 @@
+"""
+Durable queue of AI reasoning jobs (table `ai_job`).
+
+The API only enqueues; `ai_worker` claims and runs the jobs in a separate
+process. See db/migrations/20261019000900_ai_job_queue.sql.
+"""
+
+import random
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.supabase_client import supabase
+
+# Priority classes, most urgent first (ai_job.priority)
+PRIORITY_CREATE = 0
+PRIORITY_EDIT = 1
+PRIORITY_BACKFILL = 2
+PRIORITY_CLASSES = {
+    "create": PRIORITY_CREATE,
+    "edit": PRIORITY_EDIT,
+    "backfill": PRIORITY_BACKFILL,
+}
+
+
+def enqueue(
+    attention_id: UUID | str,
+    diagnostic: str,
+    priority: int = PRIORITY_CREATE,
+    debounce: bool = False,
+    reevaluation_run_id: Optional[int] = None,
+) -> None:
+    """
+    Queue an AI evaluation of `diagnostic` for the attention. An attention
+    has at most one queued job: a new request replaces its text and keeps the
+    more urgent priority. With `debounce` (edits) the job waits for
+    AI_JOB_DEBOUNCE_SECONDS without further edits, up to
+    AI_JOB_DEBOUNCE_MAX_SECONDS. `reevaluation_run_id` tags jobs of a bulk
+    re-evaluation (see reevaluation).
+    """
+    supabase.rpc(
+        "enqueue_ai_job",
+        {
+            "p_attention_id": str(attention_id),
+            "p_diagnostic": diagnostic,
+            "p_max_attempts": settings.AI_JOB_MAX_ATTEMPTS,
+            "p_priority": priority,
+            "p_delay_seconds": settings.AI_JOB_DEBOUNCE_SECONDS if debounce else 0,
+            "p_max_delay_seconds": settings.AI_JOB_DEBOUNCE_MAX_SECONDS,
+            "p_reevaluation_run_id": reevaluation_run_id,
+        },
+    ).execute()
+
+
+def claim(
+    worker_id: str, limit: int, class_limits: Optional[Dict[int, int]] = None
+) -> List[dict]:
+    """
+    Claim up to `limit` ready jobs, most urgent (after aging) first, and at
+    most `class_limits[priority]` of each class. They stay invisible to other
+    workers for AI_JOB_VISIBILITY_SECONDS.
+    """
+    if limit <= 0:
+        return []
+    params = {
+        "p_worker": worker_id,
+        "p_limit": limit,
+        "p_visibility_seconds": settings.AI_JOB_VISIBILITY_SECONDS,
+        "p_aging_seconds": settings.AI_JOB_AGING_SECONDS,
+    }
+    if class_limits is not None:
+        params["p_class_limits"] = [
+            max(class_limits.get(priority, limit), 0)
+            for priority in sorted(PRIORITY_CLASSES.values())
+        ]
+    response = supabase.rpc("claim_ai_jobs", params).execute()
+    return response.data or []
+
+
+def complete(job: dict, worker_id: str) -> None:
+    supabase.table("ai_job").update(
+        {
+            "status": "done",
+            "locked_by": None,
+            "locked_until": None,
+            "last_error": None,
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        }
+    ).eq("id", job["id"]).eq("locked_by", worker_id).eq("status", "running").execute()
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at AI_JOB_RETRY_MAX_SECONDS."""
+    ceiling = min(
+        settings.AI_JOB_RETRY_MAX_SECONDS,
+        settings.AI_JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0),
+    )
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def fail(job: dict, worker_id: str, error: Exception) -> str | None:
+    """
+    Record a failed attempt. Returns the new status ("queued" for a retry,
+    "failed" once attempts are exhausted, "superseded" if a newer job for the
+    attention is queued), or None if the job was no longer held by this
+    worker.
+    """
+    response = supabase.rpc(
+        "fail_ai_job",
+        {
+            "p_id": job["id"],
+            "p_worker": worker_id,
+            "p_error": f"{type(error).__name__}: {error}"[:2000],
+            "p_retry_in_seconds": retry_delay(job.get("attempts") or 1),
+        },
+    ).execute()
+    return response.data or None
+
+
+def release(job: dict, worker_id: str, delay_seconds: float) -> str | None:
+    """
+    Return a claimed job to the queue without spending an attempt (e.g. the
+    Gemini circuit breaker is open). Returns the new status, or None if the
+    job was no longer held by this worker.
+    """
+    response = supabase.rpc(
+        "release_ai_job",
+        {
+            "p_id": job["id"],
+            "p_worker": worker_id,
+            "p_delay_seconds": delay_seconds,
+        },
+    ).execute()
+    return response.data or None
+
+
+def queue_stats() -> dict:
+    """Queue depth and age of the oldest pending job, per status."""
+    response = supabase.rpc("ai_job_queue_stats", {}).execute()
+    by_status = {row["status"]: row for row in response.data or []}
+
+    def stat(status: str, field: str, default=0):
+        return (by_status.get(status) or {}).get(field) or default
+
+    return {
+        "queued": stat("queued", "jobs"),
+        "ready": stat("queued", "ready"),
+        "running": stat("running", "jobs"),
+        "failed": stat("failed", "jobs"),
+        "oldest_queued_age_seconds": stat("queued", "oldest_age_seconds", None),
+        "oldest_running_age_seconds": stat("running", "oldest_age_seconds", None),
+    }
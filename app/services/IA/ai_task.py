@@ -1,33 +1,181 @@
+import asyncio
+import hashlib
+import threading
 from uuid import UUID
 
+from app.core.config import settings
 from app.core.supabase_client import supabase
-from app.services.IA.gemini_txt import reason as ai_reasoner
+from app.schemas.gemini import UrgencyOutput
+from app.services import events, metric_service
+from app.services.IA import ai_cache, rules, similar_cases
+from app.services.IA.reasoning import GROUNDED_TEXT
+from app.services.IA.reasoning import reason as ai_reasoner
 
 
-def run_ai_reasoning_task(attention_id: UUID, diagnostic: str):
+async def evaluate(
+    diagnostic: str, attention_id: UUID | str | None = None
+) -> UrgencyOutput:
     """
-    Background task to process IA reasoning and update DB.
-    Runs async to avoid blocking API responses.
+    Evaluate `diagnostic`, reusing a cached result for the same normalized
+    text, model and prompt version (see ai_cache). Otherwise validated
+    similar cases (other than `attention_id`) answer directly when they are
+    near duplicates, or ground the Gemini prompt (see similar_cases). Only
+    answers without precedents are cached.
     """
+    key = None
+    if ai_cache.enabled():
+        key = ai_cache.cache_key(diagnostic)
+        try:
+            cached = await asyncio.to_thread(ai_cache.get, key)
+        except Exception as e:
+            # The cache is an optimization: fall through to Gemini
+            print(f"[AI Task] Cache lookup failed: {e}")
+            cached = None
+        if cached is not None:
+            print(f"[AI Task] Cache hit {key[:12]}")
+            return cached
+
     try:
-        print(f"[AI Task] Starting Gemini reasoning for attention {attention_id}")
+        precedents = await asyncio.to_thread(
+            similar_cases.find_precedents,
+            diagnostic,
+            str(attention_id) if attention_id else None,
+        )
+    except Exception as e:
+        print(f"[AI Task] Similar cases lookup failed: {e}")
+        precedents = []
+    ai_output = similar_cases.precedent_output(precedents)
+    if ai_output is not None:
+        print(f"[AI Task] Precedent match {precedents[0]['attention_id']}")
+        return ai_output
 
-        ai_output = ai_reasoner(diagnostic)  # Expensive call
-        print(f"[AI Task] Gemini output: {ai_output}")
-        # Correct field extraction
-        urgency_flag = ai_output.urgency_flag  # "applies"
-        applies_law = urgency_flag == "applies"
+    if precedents:
+        ai_output = await ai_reasoner(
+            {"text": diagnostic, "precedents": precedents}, GROUNDED_TEXT
+        )  # Expensive call
+    else:
+        ai_output = await ai_reasoner(diagnostic)  # Expensive call
+    # A grounded answer depends on the precedents too, not only on the text
+    # the cache key covers: only plain answers are reusable
+    if key is not None and not precedents:
+        try:
+            await asyncio.to_thread(ai_cache.put, key, ai_output)
+        except Exception as e:
+            print(f"[AI Task] Cache store failed: {e}")
+    return ai_output
+
+
+class DraftBudgetExceeded(Exception):
+    """Too many draft evaluations in flight in this process."""
+
+
+_drafts_in_flight = 0
+_drafts_lock = threading.Lock()
+
+
+async def evaluate_draft(diagnostic: str) -> UrgencyOutput | None:
+    """
+    Speculative evaluation of a diagnostic still being typed. The result goes
+    to the AI cache, so create/update with the same final text attach it
+    without waiting for the queue. Returns None for texts too short to be
+    worth a call; raises DraftBudgetExceeded when AI_DRAFT_MAX_CONCURRENCY
+    drafts are already running (drafts never queue up behind each other).
+    """
+    ai_output = rules.evaluate(diagnostic)
+    if ai_output is not None:
+        return ai_output
+    if len(ai_cache.normalize_text(diagnostic)) < settings.AI_DRAFT_MIN_CHARS:
+        return None
+
+    global _drafts_in_flight
+    with _drafts_lock:
+        if _drafts_in_flight >= settings.AI_DRAFT_MAX_CONCURRENCY:
+            raise DraftBudgetExceeded()
+        _drafts_in_flight += 1
+    try:
+        return await evaluate(diagnostic)
+    finally:
+        with _drafts_lock:
+            _drafts_in_flight -= 1
+
+
+def diagnostic_hash(diagnostic: str) -> str:
+    """Same value as the ClinicalAttention.diagnostic_hash column (md5)."""
+    return hashlib.md5(diagnostic.encode("utf-8")).hexdigest()
 
-        supabase.table("ClinicalAttention").update(
+
+def is_current(attention_id: UUID | str, diagnostic: str) -> bool:
+    """Whether `diagnostic` is still the attention's text."""
+    response = (
+        supabase.table("ClinicalAttention")
+        .select("id")
+        .eq("id", str(attention_id))
+        .eq("diagnostic_hash", diagnostic_hash(diagnostic))
+        .execute()
+    )
+    return bool(response.data)
+
+
+def save_result(
+    attention_id: UUID | str, diagnostic: str, ai_output: UrgencyOutput
+) -> bool:
+    """
+    Store an evaluation (from Gemini or the rules) of `diagnostic` on the
+    attention. Returns False, writing nothing, if the diagnostic was edited
+    since: a stale result never overwrites the one for a newer text.
+    """
+    # Correct field extraction
+    urgency_flag = ai_output.urgency_flag  # "applies"
+    applies_law = urgency_flag == "applies"
+
+    response = (
+        supabase.table("ClinicalAttention")
+        .update(
             {
                 "applies_urgency_law": applies_law,  # boolean
                 "ai_result": applies_law,  # short string
                 "ai_reason": ai_output.rationale,  # detailed JSON string
                 "ai_confidence": ai_output.urgency_confidence,  # new field
+                "ai_model": ai_output.model,
+                "ai_tier": ai_output.tier,
+                "ai_prompt_version": ai_output.prompt_version,
             }
-        ).eq("id", str(attention_id)).execute()
+        )
+        .eq("id", str(attention_id))
+        .eq("diagnostic_hash", diagnostic_hash(diagnostic))
+        .execute()
+    )
+    if not response.data:
+        return False
+    metric_service.invalidate_metrics_cache()
+    events.publish("ai_result", response.data)
+    return True
+
+
+async def run_ai_reasoning_task(attention_id: UUID, diagnostic: str):
+    """
+    Process IA reasoning and update DB. Run by the AI queue worker
+    (ai_worker); errors are re-raised so the queue can retry the job.
+    """
+    try:
+        # supabase-py is blocking: keep it off the event loop
+        if not await asyncio.to_thread(is_current, attention_id, diagnostic):
+            print(f"[AI Task] Skipping superseded diagnostic for {attention_id}")
+            return
+
+        print(f"[AI Task] Starting Gemini reasoning for attention {attention_id}")
+
+        ai_output = await evaluate(diagnostic, attention_id)
+        print(f"[AI Task] Gemini output: {ai_output}")
+        saved = await asyncio.to_thread(
+            save_result, attention_id, diagnostic, ai_output
+        )
+        if not saved:
+            print(f"[AI Task] Diagnostic edited meanwhile, discarding {attention_id}")
+            return
 
         print(f"[AI Task] ✅ Updated IA result for attention {attention_id}")
 
     except Exception as e:
         print(f"[AI Task] ❌ Error processing IA for {attention_id}: {e}")
+        raise
@@ -0,0 +1,154 @@
+"""
+Worker for the AI reasoning queue.
+
+Runs outside the web process (`python -m app.cli ai-worker`), so Gemini calls
+never compete with request threads. Jobs run as tasks on a single event loop
+(the Gemini client is async), at most `concurrency` at once per worker
+process. Each priority class (create / edit / backfill) may use at most its
+quota of those slots (AI_WORKER_CLASS_QUOTAS), so a back-fill never holds
+every slot while new attentions wait. Failed jobs are retried with backoff
+by the queue; while the Gemini circuit breaker is open the worker stops
+claiming and returns jobs to the queue without spending their attempts.
+"""
+
+import asyncio
+import os
+import random
+import signal
+import socket
+import uuid
+from collections import Counter
+
+from app.core.config import settings
+from app.services.IA import ai_queue, gemini_client
+from app.services.IA.ai_task import run_ai_reasoning_task
+from app.services.IA.limits import CircuitOpenError
+
+
+class AIWorker:
+    def __init__(
+        self, concurrency: int | None = None, poll_seconds: float | None = None
+    ):
+        self.concurrency = concurrency or settings.AI_WORKER_CONCURRENCY
+        self.poll_seconds = poll_seconds or settings.AI_WORKER_POLL_SECONDS
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.quotas = {
+            priority: min(
+                settings.AI_WORKER_CLASS_QUOTAS.get(name, self.concurrency),
+                self.concurrency,
+            )
+            for name, priority in ai_queue.PRIORITY_CLASSES.items()
+        }
+        self._running: Counter = Counter()  # Jobs in flight per priority
+        self._stopping = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Set when a slot frees up or on stop, to cut the poll wait short
+        self._wake: asyncio.Event | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def stop(self) -> None:
+        """
+        Stop claiming jobs; in-flight jobs are allowed to finish. Safe to call
+        from any thread.
+        """
+        self._stopping = True
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def run(self) -> None:
+        asyncio.run(self._run())
+
+    async def _run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        # SIGTERM (deploy/restart): stop claiming and drain in-flight jobs
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                self._loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Not on the main thread
+
+        print(
+            f"[AI Worker] {self.worker_id} started " f"(concurrency={self.concurrency})"
+        )
+        if settings.EVENTS_BACKEND == "memory":
+            # ai_result events would stay in this process: no SSE client
+            # connected to the API would ever see them
+            print(
+                "[AI Worker] WARNING: EVENTS_BACKEND=memory, AI results will "
+                "not reach SSE clients; set EVENTS_BACKEND=postgres"
+            )
+        while not self._stopping:
+            self._wake.clear()
+            claimed = await self._claim_batch()
+            for job in claimed:
+                task = asyncio.create_task(self._process(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._task_done)
+            if not claimed:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+        # Jobs that don't finish here return to the queue when their
+        # visibility timeout expires
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        print(f"[AI Worker] {self.worker_id} stopped")
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._wake.set()
+
+    async def _claim_batch(self) -> list[dict]:
+        # Only claim as many jobs as there are free slots, so claimed jobs
+        # never sit waiting while their visibility timeout runs out
+        free = self.concurrency - len(self._tasks)
+        if free <= 0 or gemini_client.breaker.retry_after() > 0:
+            return []
+        class_limits = {
+            priority: quota - self._running[priority]
+            for priority, quota in self.quotas.items()
+        }
+        try:
+            jobs = await asyncio.to_thread(
+                ai_queue.claim, self.worker_id, free, class_limits
+            )
+        except Exception as e:
+            print(f"[AI Worker] ❌ Error claiming jobs: {e}")
+            return []
+        for job in jobs:
+            self._running[job.get("priority") or 0] += 1
+        return jobs
+
+    async def _process(self, job: dict) -> None:
+        try:
+            await self._run_job(job)
+        finally:
+            self._running[job.get("priority") or 0] -= 1
+
+    async def _run_job(self, job: dict) -> None:
+        try:
+            await run_ai_reasoning_task(job["attention_id"], job["diagnostic"])
+        except CircuitOpenError as e:
+            # Spread the retries so they don't all probe at once
+            delay = e.retry_after + random.uniform(0, self.poll_seconds)
+            try:
+                await asyncio.to_thread(ai_queue.release, job, self.worker_id, delay)
+            except Exception as release_error:
+                print(f"[AI Worker] ❌ Error releasing job: {release_error}")
+            return
+        except Exception as e:
+            try:
+                status = await asyncio.to_thread(ai_queue.fail, job, self.worker_id, e)
+                print(f"[AI Worker] Job {job['id']} failed ({status}): {e}")
+            except Exception as fail_error:
+                # The visibility timeout will release the job
+                print(f"[AI Worker] ❌ Error recording failure: {fail_error}")
+            return
+
+        try:
+            await asyncio.to_thread(ai_queue.complete, job, self.worker_id)
+        except Exception as e:
+            print(f"[AI Worker] ❌ Error completing job {job['id']}: {e}")
@@ -0,0 +1,229 @@
+"""
+Async access to Gemini shared by the reasoning modules.
+
+Calls go through the async GenAI surface (`client.aio`), each attempt has a
+timeout, transient errors are retried with `asyncio.sleep` backoff and the
+number of concurrent calls per event loop is bounded by a semaphore, so an
+in-flight evaluation never pins a thread.
+
+Every attempt also passes the RPM/TPM token buckets and the circuit breaker
+(see limits): during a provider brownout calls fail fast with
+CircuitOpenError instead of piling up retries.
+
+The GenAI client is created on first use and shared by every thread and
+event loop of the process, so importing this module (and app.main) does not
+load the SDK.
+"""
+
+import asyncio
+import random
+import threading
+import weakref
+from typing import Any, AsyncIterator, Dict, List
+
+from app.core.config import settings
+from app.services.IA.limits import CircuitBreaker, TokenBucket
+
+GEN_MODEL = settings.GEMINI_MODEL or "gemini-2.5-flash"
+
+_client = None
+_client_lock = threading.Lock()
+
+requests_per_minute = TokenBucket(settings.GEMINI_RPM)
+tokens_per_minute = TokenBucket(settings.GEMINI_TPM)
+breaker = CircuitBreaker(
+    settings.GEMINI_BREAKER_FAILURES, settings.GEMINI_BREAKER_RESET_SECONDS
+)
+
+# HTTP status codes worth retrying (quota, overload, upstream errors)
+TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+
+# asyncio.Semaphore is bound to the loop that first uses it: one per loop
+_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(
+            settings.GEMINI_MAX_CONCURRENCY
+        )
+    return semaphore
+
+
+def get_client():
+    """Shared GenAI client, created on the first call."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def _create_client():
+    try:
+        from google import genai  # type: ignore
+    except Exception:  # pragma: no cover - runtime may not have google-genai
+        genai = None
+    if genai is None:
+        raise RuntimeError(
+            "google-genai client is not available. Install 'google-genai' and "
+            "configure credentials to use Gemini."
+        )
+    api_key = getattr(settings, "GEMINI_API_KEY", None)
+    try:
+        return genai.Client(api_key=api_key) if api_key else genai.Client()
+    except Exception as e:
+        raise RuntimeError(f"Could not create the google-genai client: {e}") from e
+
+
+def is_mock_mode() -> bool:
+    """CI / local mode without a real API key: callers return a mock result."""
+    api_key = getattr(settings, "GEMINI_API_KEY", None)
+    return api_key is None or "fake" in str(api_key).lower()
+
+
+def as_user_msg(text: str) -> Dict[str, Any]:
+    return {"role": "user", "parts": [{"text": text}]}
+
+
+def _is_transient(exc: Exception) -> bool:
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code in TRANSIENT_CODES
+    msg = str(exc).lower()
+    return any(x in msg for x in ("503", "unavailable", "overload", "rate"))
+
+
+def _estimate_tokens(contents: List[Dict[str, Any]]) -> int:
+    """Rough prompt size (~4 characters per token) plus the expected answer."""
+    chars = sum(
+        len(part.get("text", "")) for item in contents for part in item["parts"]
+    )
+    return chars // 4 + settings.GEMINI_OUTPUT_TOKENS_ESTIMATE
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter, so retries don't synchronize."""
+    ceiling = min(
+        settings.GEMINI_BACKOFF_MAX_SECONDS,
+        settings.GEMINI_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1),
+    )
+    return random.uniform(0, ceiling)
+
+
+def limiter_state() -> dict:
+    """Breaker state and remaining RPM/TPM capacity of this process."""
+    return {
+        "breaker": breaker.state(),
+        "requests_available": round(requests_per_minute.available(), 1),
+        "tokens_available": round(tokens_per_minute.available()),
+    }
+
+
+async def generate_json(system: str, prompt: str, model: str | None = None) -> str:
+    """
+    Ask Gemini (`model`, GEN_MODEL by default) for a JSON response and return
+    its raw text. Retries transient errors (and timeouts) up to
+    GEMINI_MAX_ATTEMPTS times; raises CircuitOpenError without calling Gemini
+    while the breaker is open.
+    """
+    client = get_client()
+    contents: List[Dict[str, Any]] = [as_user_msg(system), as_user_msg(prompt)]
+    estimated_tokens = _estimate_tokens(contents)
+    max_attempts = settings.GEMINI_MAX_ATTEMPTS
+
+    for attempt in range(1, max_attempts + 1):
+        probe = breaker.before_call()
+        try:
+            await requests_per_minute.acquire(1)
+            await tokens_per_minute.acquire(estimated_tokens)
+            async with _semaphore():
+                response = await asyncio.wait_for(
+                    client.aio.models.generate_content(
+                        model=model or GEN_MODEL,
+                        contents=contents,
+                        config={"response_mime_type": "application/json"},
+                    ),
+                    timeout=settings.GEMINI_TIMEOUT_SECONDS,
+                )
+        except Exception as exc:
+            if not _is_transient(exc):
+                raise
+            breaker.record_failure()
+            if attempt >= max_attempts:
+                raise
+            # Back off outside the semaphore so waiting frees the slot
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        else:
+            breaker.record_success()
+        finally:
+            # No verdict (non-transient error, cancellation): free the probe
+            # slot, or the breaker would stay half-open forever. A no-op once
+            # the probe recorded a success or failure
+            if probe:
+                breaker.release_probe()
+
+        usage = getattr(response, "usage_metadata", None)
+        used = getattr(usage, "total_token_count", None)
+        if isinstance(used, int):
+            tokens_per_minute.adjust(used - estimated_tokens)
+        return response.text or "{}"
+
+
+async def stream_json(
+    system: str, prompt: str, model: str | None = None
+) -> AsyncIterator[str]:
+    """
+    Stream Gemini's JSON response as text chunks. Not retried (chunks already
+    handed out can't be taken back); each chunk must arrive within
+    GEMINI_TIMEOUT_SECONDS.
+    """
+    client = get_client()
+    contents: List[Dict[str, Any]] = [as_user_msg(system), as_user_msg(prompt)]
+    estimated_tokens = _estimate_tokens(contents)
+    probe = breaker.before_call()
+    used = None
+    try:
+        await requests_per_minute.acquire(1)
+        await tokens_per_minute.acquire(estimated_tokens)
+        async with _semaphore():
+            stream = await asyncio.wait_for(
+                client.aio.models.generate_content_stream(
+                    model=model or GEN_MODEL,
+                    contents=contents,
+                    config={"response_mime_type": "application/json"},
+                ),
+                timeout=settings.GEMINI_TIMEOUT_SECONDS,
+            )
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(
+                        chunks.__anext__(), timeout=settings.GEMINI_TIMEOUT_SECONDS
+                    )
+                except StopAsyncIteration:
+                    break
+                usage = getattr(chunk, "usage_metadata", None)
+                used = getattr(usage, "total_token_count", None) or used
+                if chunk.text:
+                    yield chunk.text
+    except Exception as exc:
+        if _is_transient(exc):
+            breaker.record_failure()
+        raise
+    else:
+        breaker.record_success()
+    finally:
+        # The consumer may stop early (SSE client gone: GeneratorExit or
+        # CancelledError at `yield`); never leave the probe slot taken
+        if probe:
+            breaker.release_probe()
+
+    if isinstance(used, int):
+        tokens_per_minute.adjust(used - estimated_tokens)
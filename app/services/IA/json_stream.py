@@ -0,0 +1,105 @@
+"""
+JSON helpers for model output.
+
+- extract_json: first JSON object in a text (code fences, prose before or
+  after), decoded with `raw_decode` instead of a greedy regex.
+- FieldScanner: incremental parser for a streamed top-level object. It yields
+  each top-level field as soon as its value is complete, so short fields
+  (urgency_flag, urgency_confidence) are available long before the
+  rationale and actions finish generating.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Tuple
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(txt: str) -> Dict[str, Any]:
+    """First JSON object found in `txt`, or {}."""
+    if not txt:
+        return {}
+    try:
+        value = json.loads(txt)
+        return value if isinstance(value, dict) else {}
+    except json.JSONDecodeError:
+        pass
+    start = txt.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(txt, start)
+        except json.JSONDecodeError:
+            start = txt.find("{", start + 1)
+            continue
+        if isinstance(value, dict):
+            return value
+        start = txt.find("{", start + 1)
+    return {}
+
+
+class FieldScanner:
+    """
+    Feed chunks of a JSON object with `feed`; it returns the (key, value)
+    pairs of the top-level fields completed by that chunk. Nested values are
+    returned whole once closed. Text before the opening brace is skipped.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        # Where the top-level member being read ("key": value) starts
+        self._member_start = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        start = len(self._text)
+        self._text += chunk
+        return list(self._scan(start))
+
+    def _scan(self, start: int) -> Iterator[Tuple[str, Any]]:
+        text = self._text
+        for index in range(start, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._member_start = index + 1
+                continue
+            if self._depth == 0:
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    yield from self._member(index)
+            elif char == "," and self._depth == 1:
+                yield from self._member(index)
+
+    def _member(self, end: int) -> Iterator[Tuple[str, Any]]:
+        member = self._text[self._member_start : end].strip()
+        self._member_start = end + 1
+        try:
+            key, position = _decoder.raw_decode(member)
+            rest = member[position:].lstrip()
+            if not isinstance(key, str) or not rest.startswith(":"):
+                return
+            value = json.loads(rest[1:])
+        except json.JSONDecodeError:
+            return
+        yield key, value
@@ -0,0 +1,165 @@
+"""
+Client-side protection for the Gemini quota.
+
+- TokenBucket: requests-per-minute and tokens-per-minute limiter. Callers
+  reserve capacity and sleep until it is available, so throughput stays at
+  the configured ceiling instead of bursting into 429s.
+- CircuitBreaker: after GEMINI_BREAKER_FAILURES consecutive transient
+  failures calls fail fast with CircuitOpenError for
+  GEMINI_BREAKER_RESET_SECONDS; then a single probe call decides whether to
+  close it again.
+
+State is per process and thread-safe, so the limiters are shared by every
+event loop and thread in the process.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Gemini while the breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Gemini circuit breaker open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute, holding at most `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float) -> None:
+        # Must be called with self._lock held
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` units (possibly going into debt) and return how long the
+        caller must wait before using them. Reservations are served in order.
+        """
+        if not self.enabled:
+            return 0.0
+        # A request larger than the bucket would never fit: cap it
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            return max(-self._tokens / self.rate, 0.0)
+
+    def adjust(self, delta: float) -> None:
+        """Correct a reservation once the real cost is known (+ = more used)."""
+        if not self.enabled or not delta:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return self._retry_after(time.monotonic())
+
+    def _retry_after(self, now: float) -> float:
+        if self._state == self.CLOSED:
+            return 0.0
+        return max(self._opened_at + self.reset_seconds - now, 0.0)
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go through now. Returns True
+        if the call is the half-open probe: the caller must then end it with
+        record_success, record_failure or release_probe, even if cancelled.
+        """
+        if self.failure_threshold <= 0:
+            return False
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+            now = time.monotonic()
+            wait = self._retry_after(now)
+            if wait > 0:
+                raise CircuitOpenError(wait)
+            # Reset timeout elapsed: let exactly one probe through
+            if self._probing:
+                raise CircuitOpenError(1.0)
+            self._state = self.HALF_OPEN
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                print("[Gemini] Circuit breaker closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                if self._state == self.CLOSED:
+                    print(
+                        f"[Gemini] Circuit breaker open after "
+                        f"{self._failures} failures"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """A probe ended without a verdict (e.g. a non-transient error)."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+
+    def state(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_after_seconds": round(self._retry_after(time.monotonic()), 3),
+            }
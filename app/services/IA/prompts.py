@@ -2,6 +2,9 @@
 Prompt templates for Gemini clinical-legal reasoning.
 """
 
+# Bump on any change to the prompts below (stamped on results)
+PROMPT_VERSION = "structured-v1"
+
 SYSTEM = (
     "Eres un asistente clínico-legal en Chile. Usa SOLO los pasajes recuperados "
     "para evaluar Ley de Urgencia (riesgo de muerte o secuela funcional grave que "
@@ -13,6 +16,7 @@ SYSTEM_STRICT = (
     SYSTEM + "\n\nResponde EXACTAMENTE con este esquema JSON:"
     "\n{"
     '\n  "urgency_flag": "applies|uncertain|does_not_apply",'
+    '\n  "urgency_confidence": 0.0,'
     '\n  "diagnosis_hypotheses": [{"condition": "str", "confidence": 0.0}],'
     '\n  "rationale": "str",'
     '\n  "actions": ["str", "..."],'
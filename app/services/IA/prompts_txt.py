@@ -2,6 +2,10 @@
 Prompt templates for Gemini clinical-legal reasoning – TEXT ONLY VERSION.
 """
 
+# Bump on any change to the prompts below: cached results (ai_cache) are keyed
+# by it, so old answers are not reused for a different prompt
+PROMPT_VERSION = "txt-v1"
+
 SYSTEM = (
     "Eres un asistente clínico-legal en Chile. Usa SOLO los pasajes recuperados "
     "para evaluar Ley de Urgencia (riesgo de muerte o secuela funcional grave que "
@@ -32,3 +36,15 @@ Instrucciones:
 3) Acciones inmediatas (p. ej., activar 131 / activar Ley de Urgencia) si corresponde.
 4) Devuelve SOLO JSON válido del esquema indicado.
 """
+
+
+# Validated similar cases appended to PROMPT_TMPL as grounding (one
+# PRECEDENT_LINE each). Like the text itself they are case data: they share
+# PROMPT_VERSION, but changing these templates also needs a bump
+PRECEDENTS_TMPL = """\
+Casos previos similares, validados por residente y supervisor (úsalos como
+referencia, no los copies si el caso difiere):
+{precedents}
+"""
+
+PRECEDENT_LINE = '- (similitud {score:.2f}) {verdict}: """{diagnostic}"""'
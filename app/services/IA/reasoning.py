@@ -0,0 +1,253 @@
+"""
+Gemini reasoning engine for medical urgency evaluation.
+
+Every evaluation goes through the same pipeline: a PromptTemplate turns the
+input into a prompt, gemini_client asks the model for JSON, and
+`coerce_to_schema` normalizes the answer into an UrgencyOutput. Templates:
+
+- STRUCTURED: UrgencyInput fields (prompts.py), used by POST /gemini/reason.
+- TEXT: free clinical text such as an attention's diagnostic (prompts_txt.py),
+  used by the AI queue; runs the fast -> strong model cascade.
+- GROUNDED_TEXT: TEXT plus validated similar cases ({"text", "precedents"},
+  see similar_cases).
+
+Other inputs plug in as another PromptTemplate. The Gemini client is created
+on first use, so importing this module does not load the GenAI SDK.
+"""
+
+import re
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas.gemini import UrgencyOutput
+from app.services.IA import gemini_client, prompts, prompts_txt
+from app.services.IA.json_stream import FieldScanner, extract_json
+
+URGENCY_FLAGS = ("applies", "uncertain", "does_not_apply")
+
+AI_disabled = False
+
+
+class PromptTemplate:
+    """How to prompt the model for one kind of input."""
+
+    def __init__(
+        self,
+        name: str,
+        system: str,
+        build: Callable[[Any], str],
+        version: Optional[str] = None,
+        cascade: bool = False,
+    ):
+        self.name = name
+        self.system = system
+        # Input -> user prompt
+        self.build = build
+        # Stamped on results (UrgencyOutput.prompt_version)
+        self.version = version
+        # Whether the fast model answers first (see `reason`)
+        self.cascade = cascade
+
+
+def remove_triage_section(txt: str) -> str:
+    if not txt:
+        return txt
+
+    pattern = r"===== *TRIAGE *=====.*?(?======|$)"
+    cleaned = re.sub(pattern, "", txt, flags=re.IGNORECASE | re.DOTALL)
+
+    # Remove stray blank lines created by removal
+    cleaned = re.sub(r"\n{3,}", "\n\n", cleaned).strip()
+
+    return cleaned
+
+
+STRUCTURED = PromptTemplate(
+    "structured",
+    prompts.SYSTEM_STRICT,
+    lambda case: prompts.PROMPT_TMPL.format(**case),
+    version=prompts.PROMPT_VERSION,
+)
+TEXT = PromptTemplate(
+    "text",
+    prompts_txt.SYSTEM_STRICT,
+    lambda text: prompts_txt.PROMPT_TMPL.format(text=remove_triage_section(text)),
+    version=prompts_txt.PROMPT_VERSION,
+    cascade=True,
+)
+
+
+def _grounded_prompt(payload: Dict[str, Any]) -> str:
+    lines = [
+        prompts_txt.PRECEDENT_LINE.format(
+            score=case["score"],
+            verdict=(
+                "aplicó Ley de Urgencia"
+                if case["applies_urgency_law"]
+                else "no aplicó Ley de Urgencia"
+            ),
+            diagnostic=" ".join(remove_triage_section(case["diagnostic"]).split()),
+        )
+        for case in payload["precedents"]
+    ]
+    return TEXT.build(payload["text"]) + prompts_txt.PRECEDENTS_TMPL.format(
+        precedents="\n".join(lines)
+    )
+
+
+GROUNDED_TEXT = PromptTemplate(
+    "grounded_text",
+    prompts_txt.SYSTEM_STRICT,
+    _grounded_prompt,
+    version=prompts_txt.PROMPT_VERSION,
+    cascade=True,
+)
+
+
+def _confidence(raw: Any) -> float:
+    try:
+        value = float(raw)
+    except Exception:
+        value = 0.0
+    return max(0.0, min(1.0, value))
+
+
+def _normalize_hypotheses(raw: Any) -> List[Dict[str, Any]]:
+    if not raw:
+        return []
+    output = []
+    for item in raw:
+        if isinstance(item, dict):
+            cond = item.get("condition") or item.get("diagnosis") or item.get("name")
+            if cond:
+                output.append(
+                    {
+                        "condition": cond,
+                        "confidence": _confidence(
+                            item.get("confidence", item.get("score", 0.0))
+                        ),
+                    }
+                )
+    return output
+
+
+def _normalize_actions(raw: Any) -> List[str]:
+    if not isinstance(raw, list):
+        return []
+    return [str(x).strip() for x in raw if str(x).strip()]
+
+
+def coerce_to_schema(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Model answer -> valid UrgencyOutput fields, whatever the template."""
+    flag = raw.get("urgency_flag")
+    return {
+        "urgency_flag": flag if flag in URGENCY_FLAGS else "uncertain",
+        "urgency_confidence": _confidence(raw.get("urgency_confidence", 0.0)),
+        "diagnosis_hypotheses": _normalize_hypotheses(raw.get("diagnosis_hypotheses")),
+        "rationale": str(raw.get("rationale") or ""),
+        "actions": _normalize_actions(raw.get("actions")),
+    }
+
+
+def _mock_output(template: PromptTemplate) -> UrgencyOutput:
+    # Deterministic mock output for CI. Stamped like a real answer, so
+    # re-evaluation runs don't select it again and again
+    return UrgencyOutput(
+        urgency_flag="uncertain",
+        urgency_confidence=0.0,
+        diagnosis_hypotheses=[
+            {"condition": "Mock diagnosis (CI mode)", "confidence": 0.0}
+        ],
+        rationale="AI disabled in CI – using mock result.",
+        actions=["No AI actions generated (CI mode)"],
+        prompt_version=template.version,
+    )
+
+
+def _mock_mode() -> bool:
+    return AI_disabled or gemini_client.is_mock_mode()
+
+
+def _cascade_enabled() -> bool:
+    fast_model = settings.GEMINI_FAST_MODEL
+    return bool(fast_model) and fast_model != gemini_client.GEN_MODEL
+
+
+def model_signature() -> str:
+    """Models and threshold that determine the answer (part of cache keys)."""
+    if not _cascade_enabled():
+        return gemini_client.GEN_MODEL
+    return (
+        f"{settings.GEMINI_FAST_MODEL}>{gemini_client.GEN_MODEL}"
+        f"@{settings.GEMINI_CASCADE_THRESHOLD}"
+    )
+
+
+def _to_output(
+    template: PromptTemplate, response_text: str, model: str, tier: str
+) -> UrgencyOutput:
+    data = coerce_to_schema(extract_json(response_text))
+    return UrgencyOutput(
+        **data, model=model, tier=tier, prompt_version=template.version
+    )
+
+
+async def _ask(
+    template: PromptTemplate, prompt: str, model: str, tier: str
+) -> UrgencyOutput:
+    response_text = await gemini_client.generate_json(template.system, prompt, model)
+    return _to_output(template, response_text, model, tier)
+
+
+async def reason(payload: Any, template: PromptTemplate = TEXT) -> UrgencyOutput:
+    """
+    Evaluate `payload` (free text for TEXT, a dict of fields for STRUCTURED)
+    and return an UrgencyOutput.
+
+    Model cascade (templates with `cascade`): GEMINI_FAST_MODEL answers first;
+    its answer is kept unless it is "uncertain" or below
+    GEMINI_CASCADE_THRESHOLD, in which case the strong model (GEMINI_MODEL) is
+    asked. `tier` records which one answered.
+    """
+    if _mock_mode():
+        return _mock_output(template)
+
+    prompt = template.build(payload)
+    if template.cascade and _cascade_enabled():
+        output = await _ask(template, prompt, settings.GEMINI_FAST_MODEL, "fast")
+        if (
+            output.urgency_flag != "uncertain"
+            and output.urgency_confidence >= settings.GEMINI_CASCADE_THRESHOLD
+        ):
+            return output
+        print(
+            f"[Gemini] Escalating: fast model answered {output.urgency_flag} "
+            f"({output.urgency_confidence:.2f})"
+        )
+    return await _ask(template, prompt, gemini_client.GEN_MODEL, "strong")
+
+
+async def reason_stream(
+    payload: Any, template: PromptTemplate = STRUCTURED
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming version of `reason` (strong model only). Yields
+    ("field", {key: value}) for each top-level field as soon as the model
+    finishes it (urgency_flag and urgency_confidence come first), then
+    ("result", UrgencyOutput).
+    """
+    if _mock_mode():
+        yield "result", _mock_output(template)
+        return
+
+    model = gemini_client.GEN_MODEL
+    scanner = FieldScanner()
+    chunks: List[str] = []
+    async for chunk in gemini_client.stream_json(
+        template.system, template.build(payload), model
+    ):
+        chunks.append(chunk)
+        for key, value in scanner.feed(chunk):
+            yield "field", {key: value}
+
+    yield "result", _to_output(template, "".join(chunks), model, "strong")
@@ -0,0 +1,242 @@
+"""
+Bulk AI re-evaluation after a prompt or model change.
+
+A run (table `ai_reevaluation_run`) selects attentions by creation date
+range, prompt version and/or model, and feeds them to the AI queue as
+back-fill jobs (lowest priority, bounded by the workers' back-fill quota) at
+`rate_per_minute`, never with more than AI_REEVAL_MAX_PENDING of its jobs
+waiting. The keyset cursor (created_at, id) is checkpointed after every
+enqueued job, so an interrupted run resumes where it stopped. Progress and
+ETA come from the run's jobs. See
+db/migrations/20261019001600_ai_reevaluation.sql.
+
+    python -m app.cli ai-reevaluate --start 2026-01-01 --prompt-version none
+    python -m app.cli ai-reevaluate --resume 3
+    GET /v1/health/ai_reevaluations/3
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.supabase_client import supabase
+from app.services.IA import ai_queue
+from app.services.IA.limits import TokenBucket
+from app.services.IA.prompts_txt import PROMPT_VERSION
+from app.services.IA.reasoning import model_signature
+from app.services.scan_service import scan_rows
+
+# Value of `prompt_versions` that selects results without a stamped version
+UNVERSIONED = "none"
+
+# Tiers answered without a prompt (see rules and similar_cases)
+LOCAL_TIERS = ("rules", "precedent")
+
+FINISHED_JOB_STATUSES = ("done", "failed", "superseded")
+PENDING_JOB_STATUSES = ("queued", "running")
+
+
+def selection_filters(filters: dict) -> Callable:
+    """
+    Filters of a run: start_date / end_date (YYYY-MM-DD, on created_at),
+    prompt_versions and models (of the current result). Without versions or
+    models it selects every result not produced by the current
+    PROMPT_VERSION, except those of the local fast paths (rules, precedent),
+    which carry no prompt version and a re-evaluation would reproduce.
+    """
+    start_date = filters.get("start_date")
+    end_date = filters.get("end_date")
+    versions = filters.get("prompt_versions") or []
+    models = filters.get("models") or []
+
+    def apply(query):
+        query = query.eq("is_deleted", False).not_.is_("diagnostic", "null")
+        if start_date:
+            query = query.gte("created_at", f"{start_date}T00:00:00")
+        if end_date:
+            query = query.lte("created_at", f"{end_date}T23:59:59")
+        if versions:
+            named = [v for v in versions if v != UNVERSIONED]
+            conditions = []
+            if named:
+                conditions.append(f"ai_prompt_version.in.({','.join(named)})")
+            if UNVERSIONED in versions:
+                conditions.append("ai_prompt_version.is.null")
+            query = query.or_(",".join(conditions))
+        if models:
+            query = query.in_("ai_model", models)
+        if not versions and not models:
+            query = query.or_(
+                f"ai_prompt_version.is.null,ai_prompt_version.neq.{PROMPT_VERSION}"
+            ).or_(f"ai_tier.is.null,ai_tier.not.in.({','.join(LOCAL_TIERS)})")
+        return query
+
+    return apply
+
+
+def create_run(filters: dict, rate_per_minute: Optional[int] = None) -> dict:
+    apply = selection_filters(filters)
+    count = apply(
+        supabase.table("ClinicalAttention").select("id", count="exact").limit(1)
+    ).execute()
+    response = (
+        supabase.table("ai_reevaluation_run")
+        .insert(
+            {
+                "filters": filters,
+                "prompt_version": PROMPT_VERSION,
+                "model": model_signature(),
+                "rate_per_minute": rate_per_minute
+                or settings.AI_REEVAL_RATE_PER_MINUTE,
+                "total": count.count or 0,
+            }
+        )
+        .execute()
+    )
+    return response.data[0]
+
+
+def get_run(run_id: int) -> dict:
+    response = (
+        supabase.table("ai_reevaluation_run").select("*").eq("id", run_id).execute()
+    )
+    if not response.data:
+        raise LookupError(f"Re-evaluation run {run_id} not found")
+    return response.data[0]
+
+
+def list_runs(limit: int = 20) -> list[dict]:
+    response = (
+        supabase.table("ai_reevaluation_run")
+        .select("*")
+        .order("id", desc=True)
+        .limit(limit)
+        .execute()
+    )
+    return response.data or []
+
+
+def _update_run(run_id: int, values: dict) -> None:
+    values["updated_at"] = datetime.now(timezone.utc).isoformat()
+    supabase.table("ai_reevaluation_run").update(values).eq("id", run_id).execute()
+
+
+def _job_counts(run_id: int) -> dict:
+    response = supabase.rpc("ai_reevaluation_progress", {"p_run_id": run_id}).execute()
+    return {row["status"]: row["jobs"] for row in response.data or []}
+
+
+def execute(run_id: int, should_stop: Callable[[], bool] = lambda: False) -> dict:
+    """
+    Enqueue the run's remaining attentions from its checkpoint. Returns the
+    run; its status is "enqueued" when everything was queued, or "paused"
+    if `should_stop` returned True (resume with the same call).
+    """
+    run = get_run(run_id)
+    if run["status"] in ("enqueued", "cancelled"):
+        return run
+    if run["prompt_version"] != PROMPT_VERSION:
+        raise RuntimeError(
+            f"Run {run_id} targets prompt {run['prompt_version']}, "
+            f"but the current prompt is {PROMPT_VERSION}"
+        )
+
+    _update_run(run_id, {"status": "enqueuing", "last_error": None})
+    bucket = TokenBucket(run["rate_per_minute"], capacity=1)
+    apply = selection_filters(run["filters"])
+    start_after = None
+    if run["cursor_created_at"]:
+        start_after = (run["cursor_created_at"], run["cursor_id"])
+    enqueued = run["enqueued"]
+
+    def build_query():
+        return apply(
+            supabase.table("ClinicalAttention").select("id, created_at, diagnostic")
+        )
+
+    try:
+        for rows in scan_rows(build_query, start_after=start_after):
+            for row in rows:
+                _wait_for_room(run_id, bucket, should_stop)
+                if should_stop():
+                    _update_run(run_id, {"status": "paused"})
+                    return get_run(run_id)
+                ai_queue.enqueue(
+                    row["id"],
+                    row["diagnostic"],
+                    priority=ai_queue.PRIORITY_BACKFILL,
+                    reevaluation_run_id=run_id,
+                )
+                enqueued += 1
+                # Checkpoint: on resume the scan starts after this row
+                _update_run(
+                    run_id,
+                    {
+                        "enqueued": enqueued,
+                        "cursor_created_at": row["created_at"],
+                        "cursor_id": row["id"],
+                    },
+                )
+    except Exception as e:
+        _update_run(run_id, {"status": "failed", "last_error": str(e)[:2000]})
+        raise
+
+    _update_run(
+        run_id,
+        {
+            "status": "enqueued",
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+    return get_run(run_id)
+
+
+def _wait_for_room(
+    run_id: int, bucket: TokenBucket, should_stop: Callable[[], bool]
+) -> None:
+    """Rate limit, plus backpressure while the run has too many pending jobs."""
+    time.sleep(bucket.reserve(1))
+    while not should_stop():
+        counts = _job_counts(run_id)
+        pending = sum(counts.get(status, 0) for status in PENDING_JOB_STATUSES)
+        if pending < settings.AI_REEVAL_MAX_PENDING:
+            return
+        time.sleep(settings.AI_WORKER_POLL_SECONDS)
+
+
+def progress(run_id: int) -> dict:
+    """Run status with job counts, throughput and an ETA for the remainder."""
+    run = get_run(run_id)
+    counts = _job_counts(run_id)
+    finished = sum(counts.get(status, 0) for status in FINISHED_JOB_STATUSES)
+    total = run["total"]
+
+    started_at = datetime.fromisoformat(run["created_at"])
+    elapsed = (datetime.now(timezone.utc) - started_at).total_seconds()
+    per_minute = finished / elapsed * 60 if elapsed > 0 and finished else None
+    remaining = max(total - finished, 0)
+    eta_seconds = None
+    if remaining == 0:
+        eta_seconds = 0.0
+    elif per_minute:
+        eta_seconds = remaining / per_minute * 60
+
+    return {
+        "id": run["id"],
+        "status": run["status"],
+        "filters": run["filters"],
+        "prompt_version": run["prompt_version"],
+        "model": run["model"],
+        "total": total,
+        "enqueued": run["enqueued"],
+        "jobs": {
+            status: counts.get(status, 0)
+            for status in PENDING_JOB_STATUSES + FINISHED_JOB_STATUSES
+        },
+        "finished": finished,
+        "percent": round(100 * finished / total, 1) if total else 100.0,
+        "per_minute": round(per_minute, 2) if per_minute else None,
+        "eta_seconds": round(eta_seconds) if eta_seconds is not None else None,
+        "last_error": run["last_error"],
+    }
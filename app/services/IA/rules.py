@@ -0,0 +1,116 @@
+"""
+Rule-based fast path for unmistakable emergencies.
+
+Diagnostics that name one of KNOWN_DX (or a synonym / abbreviation from
+DX_SYNONYMS and AI_RULES_SYNONYMS) get an immediate UrgencyOutput from
+URGENT_RULE, without waiting on Gemini. Matching runs on accent-free,
+lowercase text with a single precompiled pattern; mentions preceded by a
+negation or a rule-out cue ("sin TEP", "descarta IAM", "d/c ACV") do not
+count.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.constants import DX_SYNONYMS, KNOWN_DX, URGENT_RULE
+from app.schemas.gemini import UrgencyOutput
+from app.services.IA.reasoning import remove_triage_section
+
+# Normalized tokens that, within NEGATION_WINDOW tokens before a mention,
+# turn it into a negated or merely suspected diagnosis
+NEGATION_CUES = frozenset(
+    {
+        "no",
+        "sin",
+        "descarta",
+        "descartar",
+        "descartado",
+        "descartada",
+        "descarte",
+        "dc",
+        "ro",
+        "sospecha",
+        "probable",
+        "posible",
+        "eventual",
+        "antecedente",
+        "antecedentes",
+        "historia",
+    }
+)
+NEGATION_WINDOW = 3
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accent-free text with single spaces between words."""
+    text = unicodedata.normalize("NFKD", remove_triage_section(text or ""))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    # "d/c" and "r/o" collapse into one token so they work as cues
+    text = re.sub(r"\b([dr])\s*/\s*([co])\b", r"\1\2", text)
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _synonyms() -> Dict[str, List[str]]:
+    synonyms = {dx: [dx, *DX_SYNONYMS.get(dx, [])] for dx in KNOWN_DX}
+    for dx, extra in settings.AI_RULES_SYNONYMS.items():
+        synonyms.setdefault(dx, [dx]).extend(extra)
+    return synonyms
+
+
+@lru_cache(maxsize=1)
+def _matcher() -> Tuple[re.Pattern, Dict[str, str]]:
+    term_to_dx: Dict[str, str] = {}
+    for dx, terms in _synonyms().items():
+        for term in terms:
+            term_to_dx.setdefault(normalize(term), dx)
+    # Longest first, so "iamcest" wins over "iam" and multi-word names over
+    # their prefixes
+    alternation = "|".join(
+        re.escape(term) for term in sorted(term_to_dx, key=len, reverse=True)
+    )
+    return re.compile(rf"\b(?:{alternation})\b"), term_to_dx
+
+
+def _negated(text: str, start: int) -> bool:
+    preceding = text[:start].split()[-NEGATION_WINDOW:]
+    return any(token in NEGATION_CUES for token in preceding)
+
+
+def match(text: str) -> Optional[Tuple[str, str]]:
+    """
+    First affirmed mention of an urgent KNOWN_DX in `text`, as
+    (diagnosis, matched term), or None.
+    """
+    pattern, term_to_dx = _matcher()
+    normalized = normalize(text)
+    for found in pattern.finditer(normalized):
+        dx = term_to_dx[found.group(0)]
+        if URGENT_RULE.get(dx) and not _negated(normalized, found.start()):
+            return dx, found.group(0)
+    return None
+
+
+def evaluate(text: str) -> Optional[UrgencyOutput]:
+    """UrgencyOutput from the rules, or None if no rule applies."""
+    if not settings.AI_RULES_ENABLED:
+        return None
+    found = match(text)
+    if found is None:
+        return None
+
+    dx, term = found
+    confidence = settings.AI_RULES_CONFIDENCE
+    return UrgencyOutput(
+        urgency_flag="applies",
+        urgency_confidence=confidence,
+        diagnosis_hypotheses=[{"condition": dx, "confidence": confidence}],
+        rationale=(
+            f"Evaluación por regla: el diagnóstico menciona '{term}' ({dx}), "
+            "cuadro que por sí solo califica como urgencia vital."
+        ),
+        actions=[],
+        tier="rules",
+    )
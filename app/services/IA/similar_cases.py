@@ -0,0 +1,335 @@
+"""
+Similar-case index over past diagnostics (local TF-IDF, no external service).
+
+Every attention's diagnostic is indexed as a TF-IDF vector of accent-free
+words and word pairs (rules.normalize), kept in memory with an inverted
+index, so a lookup only scores attentions sharing a term with the query.
+
+A case is a validated precedent when its final verdict (ai_result corrected
+by the resident and the supervisor, as in the attention detail) was reviewed
+by both and the insurer's `pertinencia`, if any, agrees with it. The AI
+pipeline (ai_task.evaluate) uses them in two ways:
+
+- Fast path: validated precedents above SIMILAR_CASES_FAST_PATH_SCORE that
+  all share the same verdict answer without calling Gemini (tier
+  "precedent").
+- Grounding: otherwise, the closest validated precedents above
+  SIMILAR_CASES_GROUNDING_SCORE go into the prompt (reasoning.GROUNDED_TEXT).
+
+The index is loaded on first use and then kept up to date incrementally:
+rows changed since the last sync are re-read at most every
+SIMILAR_CASES_REFRESH_SECONDS, and the API applies its own writes right away
+(upsert_rows). Like snapshot_service, each sync starts
+SIMILAR_CASES_OVERLAP_SECONDS before the newest updated_at seen: updated_at
+is the transaction start, so a row can commit after a sync with an older
+value. Re-applying a row is harmless.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.supabase_client import supabase
+from app.schemas.gemini import UrgencyOutput
+from app.services.IA.rules import normalize
+from app.services.scan_service import scan_rows
+from app.services.urgency import compute_urgency_law
+
+SCAN_COLUMNS = (
+    "id, id_episodio, created_at, updated_at, diagnostic, is_deleted, "
+    "ai_result, medic_approved, supervisor_approved, pertinencia"
+)
+
+# Words too common to say anything about a case. Negations ("no", "sin")
+# stay: with word pairs they tell "sin fiebre" from "fiebre"
+STOPWORDS = frozenset(
+    {
+        "a",
+        "al",
+        "con",
+        "de",
+        "del",
+        "e",
+        "el",
+        "en",
+        "es",
+        "la",
+        "las",
+        "le",
+        "lo",
+        "los",
+        "o",
+        "para",
+        "pero",
+        "por",
+        "que",
+        "se",
+        "su",
+        "sus",
+        "un",
+        "una",
+        "y",
+    }
+)
+
+# Recompute every document norm once the corpus size drifts this much from
+# the one the norms were computed with (IDF changes with it)
+NORM_DRIFT = 0.1
+
+
+def terms(text: str) -> Counter:
+    """Term frequencies of a text: words and consecutive word pairs."""
+    words = [w for w in normalize(text).split() if w not in STOPWORDS]
+    counts = Counter(words)
+    counts.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return counts
+
+
+def _verdict(row: dict) -> Optional[bool]:
+    return compute_urgency_law(
+        row.get("ai_result"), row.get("medic_approved"), row.get("supervisor_approved")
+    )
+
+
+def is_validated(row: dict, verdict: Optional[bool]) -> bool:
+    pertinencia = row.get("pertinencia")
+    return (
+        verdict is not None
+        and row.get("supervisor_approved") is not None
+        and (pertinencia is None or pertinencia == verdict)
+    )
+
+
+class SimilarCaseIndex:
+    """In-memory TF-IDF index with cosine similarity; thread-safe."""
+
+    def __init__(self):
+        self._cases: Dict[str, dict] = {}
+        self._vectors: Dict[str, Dict[str, float]] = {}
+        # term -> {case id: tf weight}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._norms: Dict[str, float] = {}
+        self._norms_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cases)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log((len(self._cases) + 1) / (df + 1)) + 1.0
+
+    def _norm(self, vector: Dict[str, float]) -> float:
+        return math.sqrt(sum((tf * self._idf(t)) ** 2 for t, tf in vector.items()))
+
+    def upsert(self, case_id: str, text: str, case: dict) -> None:
+        vector = {t: 1.0 + math.log(n) for t, n in terms(text).items()}
+        with self._lock:
+            self._remove(case_id)
+            if not vector:
+                return
+            self._cases[case_id] = case
+            self._vectors[case_id] = vector
+            for term, tf in vector.items():
+                self._postings[term][case_id] = tf
+            self._norms[case_id] = self._norm(vector)
+
+    def remove(self, case_id: str) -> None:
+        with self._lock:
+            self._remove(case_id)
+
+    def _remove(self, case_id: str) -> None:
+        vector = self._vectors.pop(case_id, None)
+        if vector is None:
+            return
+        self._cases.pop(case_id, None)
+        self._norms.pop(case_id, None)
+        for term in vector:
+            postings = self._postings[term]
+            postings.pop(case_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def _refresh_norms(self) -> None:
+        size = len(self._cases)
+        if abs(size - self._norms_size) <= NORM_DRIFT * self._norms_size:
+            return
+        self._norms = {cid: self._norm(v) for cid, v in self._vectors.items()}
+        self._norms_size = size
+
+    def search(
+        self,
+        text: str,
+        k: int = 5,
+        min_score: float = 0.0,
+        validated_only: bool = False,
+        exclude: Iterable[str] = (),
+    ) -> List[Tuple[float, dict]]:
+        """Up to `k` (score, case) pairs, most similar first."""
+        query = {t: 1.0 + math.log(n) for t, n in terms(text).items()}
+        excluded = set(exclude)
+        with self._lock:
+            self._refresh_norms()
+            weights = {t: tf * self._idf(t) for t, tf in query.items()}
+            query_norm = math.sqrt(sum(w * w for w in weights.values()))
+            if not query_norm:
+                return []
+
+            dots: Dict[str, float] = defaultdict(float)
+            for term, weight in weights.items():
+                idf = self._idf(term)
+                for case_id, tf in self._postings.get(term, {}).items():
+                    dots[case_id] += weight * tf * idf
+
+            results = []
+            for case_id, dot in dots.items():
+                case = self._cases[case_id]
+                if case_id in excluded or (validated_only and not case["validated"]):
+                    continue
+                score = min(dot / (query_norm * self._norms[case_id]), 1.0)
+                if score >= min_score:
+                    results.append((score, case))
+        results.sort(key=lambda item: item[0], reverse=True)
+        return results[:k]
+
+
+_index = SimilarCaseIndex()
+_sync_lock = threading.Lock()
+# Newest updated_at read so far
+_watermark: Optional[datetime] = None
+_synced_at: Optional[float] = None
+
+
+def _apply(rows: Iterable[dict]) -> None:
+    for row in rows:
+        case_id = str(row["id"])
+        if row.get("is_deleted") or not row.get("diagnostic"):
+            _index.remove(case_id)
+            continue
+        verdict = _verdict(row)
+        _index.upsert(
+            case_id,
+            row["diagnostic"],
+            {
+                "attention_id": case_id,
+                "id_episodio": row.get("id_episodio"),
+                "created_at": row.get("created_at"),
+                "diagnostic": row["diagnostic"],
+                "applies_urgency_law": verdict,
+                "validated": is_validated(row, verdict),
+            },
+        )
+
+
+def sync(force: bool = False) -> int:
+    """
+    Load the rows changed since the last sync, overlap included (every row
+    the first time), unless the last one was less than
+    SIMILAR_CASES_REFRESH_SECONDS ago.
+    Returns the number of rows read.
+    """
+    global _watermark, _synced_at
+    with _sync_lock:
+        if (
+            not force
+            and _synced_at is not None
+            and time.monotonic() - _synced_at < settings.SIMILAR_CASES_REFRESH_SECONDS
+        ):
+            return 0
+
+        since = None
+        if _watermark is not None:
+            since = (
+                _watermark - timedelta(seconds=settings.SIMILAR_CASES_OVERLAP_SECONDS)
+            ).isoformat()
+
+        def build_query():
+            query = supabase.table("ClinicalAttention").select(SCAN_COLUMNS)
+            if since:
+                query = query.gte("updated_at", since)
+            return query
+
+        count = 0
+        for rows in scan_rows(build_query, order_column="updated_at"):
+            _apply(rows)
+            _watermark = datetime.fromisoformat(rows[-1]["updated_at"])
+            count += len(rows)
+        _synced_at = time.monotonic()
+        if count:
+            print(f"[Similar Cases] Indexed {count} changed attentions")
+        return count
+
+
+def upsert_rows(rows: Iterable[dict] | None) -> None:
+    """
+    Apply attentions just written by this process, so they are searchable
+    before the next sync. Never fails; does nothing until the index is loaded.
+    """
+    if _synced_at is None:
+        return
+    try:
+        _apply(row for row in rows or [] if "diagnostic" in row)
+    except Exception as e:
+        print(f"[Similar Cases] Error indexing attentions: {e}")
+
+
+def search(
+    text: str,
+    k: int = 5,
+    min_score: float = 0.0,
+    validated_only: bool = False,
+    exclude: Iterable[str] = (),
+) -> List[dict]:
+    """Most similar past attentions to `text`, each with its `score`."""
+    sync()
+    return [
+        {**case, "score": round(score, 4)}
+        for score, case in _index.search(
+            text, k, min_score, validated_only, [str(e) for e in exclude]
+        )
+    ]
+
+
+def find_precedents(text: str, exclude: Optional[str] = None) -> List[dict]:
+    """Validated precedents close enough to ground (or answer) `text`."""
+    if not settings.SIMILAR_CASES_ENABLED:
+        return []
+    return search(
+        text,
+        k=settings.SIMILAR_CASES_GROUNDING_K,
+        min_score=settings.SIMILAR_CASES_GROUNDING_SCORE,
+        validated_only=True,
+        exclude=[exclude] if exclude else [],
+    )
+
+
+def precedent_output(precedents: List[dict]) -> Optional[UrgencyOutput]:
+    """
+    UrgencyOutput from the precedents when the closest ones are near
+    duplicates that agree on the verdict, or None.
+    """
+    threshold = settings.SIMILAR_CASES_FAST_PATH_SCORE
+    close = [p for p in precedents if threshold > 0 and p["score"] >= threshold]
+    if not close or len({p["applies_urgency_law"] for p in close}) != 1:
+        return None
+
+    top = close[0]
+    applies = top["applies_urgency_law"]
+    reference = top["id_episodio"] or top["attention_id"]
+    return UrgencyOutput(
+        urgency_flag="applies" if applies else "does_not_apply",
+        urgency_confidence=top["score"],
+        diagnosis_hypotheses=[],
+        rationale=(
+            f"Evaluación por precedente: el diagnóstico es casi idéntico "
+            f"(similitud {top['score']:.2f}) al del episodio {reference}, "
+            f"validado por residente y supervisor, en que "
+            f"{'aplicó' if applies else 'no aplicó'} la Ley de Urgencia."
+        ),
+        actions=[],
+        tier="precedent",
+    )
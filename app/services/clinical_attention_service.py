@@ -1,11 +1,13 @@
 import uuid
 from datetime import datetime
 from io import BytesIO
+from typing import Any, Callable
 from uuid import UUID
 
 import pandas as pd
-from fastapi import BackgroundTasks, HTTPException, UploadFile
+from fastapi import HTTPException, UploadFile
 
+from app.core.config import settings
 from app.core.supabase_client import supabase
 from app.schemas.clinical_attention import (
     ClinicalAttentionDetailResponse,
@@ -17,192 +19,206 @@ from app.schemas.clinical_attention import (
     OverwrittenBy,
     PatientDetail,
     PatientInfo,
+    SimilarCase,
     UpdateClinicalAttentionRequest,
 )
-from app.services.IA.ai_task import run_ai_reasoning_task
-
-
-def _compute_urgency_law(ai_result, medic_approved, supervisor_approved):
-    """
-    Compute the urgency law application based on AI result and approvals.
-
-    Logic:
-    - Start with ai_result
-    - If medic_approved is null, return null (pending)
-    - If medic_approved is True, keep ai_result; if False, invert it
-    - If supervisor_approved is False, invert the result again
-    """
-    if ai_result is None:
-        return None
-
-    does_urgency_law_apply = ai_result
-
-    if medic_approved is None:
-        does_urgency_law_apply = None
-    else:
-        does_urgency_law_apply = ai_result if medic_approved else not ai_result
-
-        if supervisor_approved is False:
-            does_urgency_law_apply = not does_urgency_law_apply
+from app.services import episode_service, events, metric_service
+from app.services.IA import ai_cache, ai_queue, ai_task, rules, similar_cases
+from app.services.urgency import compute_urgency_law
+
+IMPORT_UPDATE_BATCH_SIZE = 200
+
+# Campos cuyo cambio se notifica como evento "approval"
+APPROVAL_FIELDS = {"medic_approved", "supervisor_approved", "pertinencia"}
+
+LIST_SELECT_QUERY = (
+    "id,id_episodio, created_at, updated_at, applies_urgency_law, "
+    "diagnostic, ai_result, overwritten_by_id, medic_approved, "
+    "pertinencia, supervisor_approved, supervisor_observation, "
+    "is_closed, closed_at, closing_reason, "
+    "patient:patient_id(rut, first_name, last_name), "
+    "resident_doctor:resident_doctor_id(first_name, last_name), "
+    "supervisor_doctor:supervisor_doctor_id(first_name, last_name), "
+    "closed_by:closed_by_id(first_name, last_name)"
+)
 
-    return does_urgency_law_apply
+NO_MATCH_ID = "00000000-0000-0000-0000-000000000000"
 
 
-def list_attentions(
-    page: int,
-    page_size: int,
-    search: str | None,
-    order: str | None,
+def list_filters(
+    search: str | None = None,
     resident_doctor_id: str | UUID | None = None,
     patient_search: str | None = None,
     doctor_search: str | None = None,
     medic_approved: str | None = None,
     supervisor_approved: str | None = None,
     current_user_id: str | UUID | None = None,
-) -> dict:
-    try:
-        select_query = (
-            "id,id_episodio, created_at, updated_at, applies_urgency_law, "
-            "diagnostic, ai_result, overwritten_by_id, medic_approved, "
-            "pertinencia, supervisor_approved, supervisor_observation, "
-            "is_closed, closed_at, closing_reason, "
-            "patient:patient_id(rut, first_name, last_name), "
-            "resident_doctor:resident_doctor_id(first_name, last_name), "
-            "supervisor_doctor:supervisor_doctor_id(first_name, last_name), "
-            "closed_by:closed_by_id(first_name, last_name)"
+) -> Callable[[Any], Any]:
+    """
+    Resuelve una sola vez las búsquedas auxiliares de los filtros del listado
+    (rol del usuario, pacientes y médicos que coinciden) y retorna una función
+    que aplica esos filtros a una query de ClinicalAttention. La usan el
+    listado paginado, su conteo y las exportaciones.
+    """
+    # Role-based filtering for non-admin users
+    restrict_to_user = False
+    if current_user_id:
+        user_response = (
+            supabase.table("User")
+            .select("role")
+            .eq("id", str(current_user_id))
+            .execute()
+        )
+        if user_response.data and len(user_response.data) > 0:
+            restrict_to_user = user_response.data[0].get("role") != "Admin"
+
+    # Patient search filter - get matching patient IDs first
+    patient_ids = None
+    if patient_search:
+        patient_response = (
+            supabase.table("Patient")
+            .select("id")
+            .or_(
+                f"rut.ilike.%{patient_search}%,"
+                f"first_name.ilike.%{patient_search}%,"
+                f"last_name.ilike.%{patient_search}%"
+            )
+            .execute()
+        )
+        patient_ids = [str(p["id"]) for p in (patient_response.data or [])]
+        print(
+            f"Patient search '{patient_search}' found "
+            f"{len(patient_ids)} matching patients"
         )
 
-        query = supabase.table("ClinicalAttention").select(select_query)
+    # Doctor search filter - get matching doctor IDs first
+    doctor_ids = None
+    if doctor_search:
+        doctor_response = (
+            supabase.table("User")
+            .select("id")
+            .or_(
+                f"first_name.ilike.%{doctor_search}%,"
+                f"last_name.ilike.%{doctor_search}%"
+            )
+            .execute()
+        )
+        doctor_ids = [str(d["id"]) for d in (doctor_response.data or [])]
+        print(
+            f"Doctor search '{doctor_search}' found "
+            f"{len(doctor_ids)} matching doctors"
+        )
+
+    # General search filter (diagnostic or patient info)
+    search_patient_ids = None
+    if search:
+        search_patient_response = (
+            supabase.table("Patient")
+            .select("id")
+            .or_(
+                f"rut.ilike.%{search}%,"
+                f"first_name.ilike.%{search}%,"
+                f"last_name.ilike.%{search}%"
+            )
+            .execute()
+        )
+        search_patient_ids = [
+            str(p["id"]) for p in (search_patient_response.data or [])
+        ]
 
+    def apply(query):
         # Filter by is_deleted
         query = query.or_("is_deleted.is.null,is_deleted.eq.false")
 
         if resident_doctor_id:
             query = query.eq("resident_doctor_id", str(resident_doctor_id))
 
-        # Role-based filtering for non-admin users
-        if current_user_id:
-            # Get user's role
-            user_response = (
-                supabase.table("User")
-                .select("role")
-                .eq("id", str(current_user_id))
-                .execute()
+        # If not admin, show episodes where user is resident or supervisor
+        if restrict_to_user:
+            query = query.or_(
+                f"resident_doctor_id.eq.{current_user_id!s},"
+                f"supervisor_doctor_id.eq.{current_user_id!s}",
             )
 
-            if user_response.data and len(user_response.data) > 0:
-                user_role = user_response.data[0].get("role")
-
-                # If not admin, filter to show episodes where user is
-                # resident or supervisor
-                if user_role != "Admin":
-                    query = query.or_(
-                        f"resident_doctor_id.eq.{current_user_id!s},"
-                        f"supervisor_doctor_id.eq.{current_user_id!s}",
-                    )
-
-        # Initialize filter variables for reuse in count query
-        patient_ids = None
-        doctor_ids = None
-        search_patient_ids = None
-
-        # Patient search filter - get matching patient IDs first
-        if patient_search:
-            patient_response = (
-                supabase.table("Patient")
-                .select("id")
-                .or_(
-                    f"rut.ilike.%{patient_search}%,"
-                    f"first_name.ilike.%{patient_search}%,"
-                    f"last_name.ilike.%{patient_search}%"
-                )
-                .execute()
-            )
-            patient_ids = [p["id"] for p in (patient_response.data or [])]
-            print(
-                f"Patient search '{patient_search}' found "
-                f"{len(patient_ids)} matching patients"
-            )
+        if patient_ids is not None:
             if len(patient_ids) > 0:
-                # Convert UUIDs to strings and use 'in' filter
-                query = query.in_("patient_id", [str(pid) for pid in patient_ids])
+                query = query.in_("patient_id", patient_ids)
             else:
                 # No matching patients, return empty result
-                query = query.eq("id", "00000000-0000-0000-0000-000000000000")
-
-        # Doctor search filter - get matching doctor IDs first
-        if doctor_search:
-            doctor_response = (
-                supabase.table("User")
-                .select("id")
-                .or_(
-                    f"first_name.ilike.%{doctor_search}%,"
-                    f"last_name.ilike.%{doctor_search}%"
-                )
-                .execute()
-            )
-            doctor_ids = [d["id"] for d in (doctor_response.data or [])]
-            print(
-                f"Doctor search '{doctor_search}' found "
-                f"{len(doctor_ids)} matching doctors"
-            )
+                query = query.eq("id", NO_MATCH_ID)
+
+        if doctor_ids is not None:
             if len(doctor_ids) > 0:
                 # Search for either resident or supervisor matching the doctor IDs
-                doctor_id_strings = [str(did) for did in doctor_ids]
                 # Format: "column.in.(value1,value2,value3)"
-                in_clause = f"({','.join(doctor_id_strings)})"
+                in_clause = f"({','.join(doctor_ids)})"
                 query = query.or_(
                     f"resident_doctor_id.in.{in_clause},"
                     f"supervisor_doctor_id.in.{in_clause}"
                 )
             else:
                 # No matching doctors, return empty result
-                query = query.eq("id", "00000000-0000-0000-0000-000000000000")
+                query = query.eq("id", NO_MATCH_ID)
 
         # Medic approved filter
-        if medic_approved:
-            if medic_approved == "pending":
-                query = query.is_("medic_approved", "null")
-            elif medic_approved == "approved":
-                query = query.eq("medic_approved", True)
-            elif medic_approved == "rejected":
-                query = query.eq("medic_approved", False)
+        if medic_approved == "pending":
+            query = query.is_("medic_approved", "null")
+        elif medic_approved == "approved":
+            query = query.eq("medic_approved", True)
+        elif medic_approved == "rejected":
+            query = query.eq("medic_approved", False)
 
         # Supervisor approved filter
-        if supervisor_approved:
-            if supervisor_approved == "pending":
-                query = query.is_("supervisor_approved", "null")
-            elif supervisor_approved == "approved":
-                query = query.eq("supervisor_approved", True)
-            elif supervisor_approved == "rejected":
-                query = query.eq("supervisor_approved", False)
-
-        # General search filter (diagnostic or patient info)
-        if search:
-            # Get matching patient IDs
-            search_patient_response = (
-                supabase.table("Patient")
-                .select("id")
-                .or_(
-                    f"rut.ilike.%{search}%,"
-                    f"first_name.ilike.%{search}%,"
-                    f"last_name.ilike.%{search}%"
-                )
-                .execute()
-            )
-            search_patient_ids = [p["id"] for p in (search_patient_response.data or [])]
-
+        if supervisor_approved == "pending":
+            query = query.is_("supervisor_approved", "null")
+        elif supervisor_approved == "approved":
+            query = query.eq("supervisor_approved", True)
+        elif supervisor_approved == "rejected":
+            query = query.eq("supervisor_approved", False)
+
+        if search_patient_ids is not None:
             # Build OR filter: diagnostic OR patient_id in matching patients
             if len(search_patient_ids) > 0:
-                patient_id_strings = [str(pid) for pid in search_patient_ids]
                 query = query.or_(
                     f"diagnostic.ilike.%{search}%,"
-                    f"patient_id.in.({','.join(patient_id_strings)})"
+                    f"patient_id.in.({','.join(search_patient_ids)})"
                 )
             else:
                 # Only search in diagnostic
                 query = query.ilike("diagnostic", f"%{search}%")
 
+        return query
+
+    return apply
+
+
+def list_attentions(
+    page: int,
+    page_size: int,
+    search: str | None,
+    order: str | None,
+    resident_doctor_id: str | UUID | None = None,
+    patient_search: str | None = None,
+    doctor_search: str | None = None,
+    medic_approved: str | None = None,
+    supervisor_approved: str | None = None,
+    current_user_id: str | UUID | None = None,
+) -> dict:
+    try:
+        apply_filters = list_filters(
+            search=search,
+            resident_doctor_id=resident_doctor_id,
+            patient_search=patient_search,
+            doctor_search=doctor_search,
+            medic_approved=medic_approved,
+            supervisor_approved=supervisor_approved,
+            current_user_id=current_user_id,
+        )
+
+        query = apply_filters(
+            supabase.table("ClinicalAttention").select(LIST_SELECT_QUERY)
+        )
+
         if order:
             order_fields = order.split(",")
             for field in order_fields:
@@ -221,86 +237,9 @@ def list_attentions(
         data = response.data or []
 
         # Count Logic - apply same filters as main query
-        count_query = supabase.table("ClinicalAttention").select("id", count="exact")
-        count_query = count_query.or_("is_deleted.is.null,is_deleted.eq.false")
-
-        if resident_doctor_id:
-            count_query = count_query.eq("resident_doctor_id", str(resident_doctor_id))
-
-        # Role-based filtering for non-admin users (same as main query)
-        if current_user_id:
-            user_response = (
-                supabase.table("User")
-                .select("role")
-                .eq("id", str(current_user_id))
-                .execute()
-            )
-
-            if user_response.data and len(user_response.data) > 0:
-                user_role = user_response.data[0].get("role")
-
-                if user_role != "Admin":
-                    count_query = count_query.or_(
-                        f"resident_doctor_id.eq.{current_user_id!s},"
-                        f"supervisor_doctor_id.eq.{current_user_id!s}",
-                    )
-
-        # Use the same patient_ids from the search above
-        if patient_search:
-            if patient_ids is not None and len(patient_ids) > 0:
-                patient_id_strings = [str(pid) for pid in patient_ids]
-                count_query = count_query.in_("patient_id", patient_id_strings)
-                print(
-                    f"Count query: Applied patient_id filter with "
-                    f"{len(patient_ids)} IDs"
-                )
-            else:
-                count_query = count_query.eq(
-                    "id", "00000000-0000-0000-0000-000000000000"
-                )
-                print("Count query: No matching patients, returning empty")
-
-        # Use the same doctor_ids from the search above
-        if doctor_search:
-            if doctor_ids is not None and len(doctor_ids) > 0:
-                doctor_id_strings = [str(did) for did in doctor_ids]
-                in_clause = f"({','.join(doctor_id_strings)})"
-                count_query = count_query.or_(
-                    f"resident_doctor_id.in.{in_clause},"
-                    f"supervisor_doctor_id.in.{in_clause}"
-                )
-            else:
-                count_query = count_query.eq(
-                    "id", "00000000-0000-0000-0000-000000000000"
-                )
-
-        if medic_approved:
-            if medic_approved == "pending":
-                count_query = count_query.is_("medic_approved", "null")
-            elif medic_approved == "approved":
-                count_query = count_query.eq("medic_approved", True)
-            elif medic_approved == "rejected":
-                count_query = count_query.eq("medic_approved", False)
-
-        if supervisor_approved:
-            if supervisor_approved == "pending":
-                count_query = count_query.is_("supervisor_approved", "null")
-            elif supervisor_approved == "approved":
-                count_query = count_query.eq("supervisor_approved", True)
-            elif supervisor_approved == "rejected":
-                count_query = count_query.eq("supervisor_approved", False)
-
-        # Use the same general search logic from main query
-        if search:
-            if search_patient_ids is not None and len(search_patient_ids) > 0:
-                patient_id_strings = [str(pid) for pid in search_patient_ids]
-                count_query = count_query.or_(
-                    f"diagnostic.ilike.%{search}%,"
-                    f"patient_id.in.({','.join(patient_id_strings)})"
-                )
-            else:
-                count_query = count_query.ilike("diagnostic", f"%{search}%")
-
+        count_query = apply_filters(
+            supabase.table("ClinicalAttention").select("id", count="exact")
+        )
         count_response = count_query.execute()
         total_count = count_response.count or len(data)
         print(f"Count query result: total_count={total_count}, data_length={len(data)}")
@@ -325,7 +264,7 @@ def list_attentions(
             closed_by_data = item.get("closed_by") or {}
 
             # Compute urgency law based on AI result and approvals
-            computed_urgency_law = _compute_urgency_law(
+            computed_urgency_law = compute_urgency_law(
                 ai_result=item.get("ai_result"),
                 medic_approved=item.get("medic_approved"),
                 supervisor_approved=item.get("supervisor_approved"),
@@ -407,7 +346,7 @@ def get_attention_detail(attention_id: UUID) -> ClinicalAttentionDetailResponse:
         supervisor_data = safe_dict(item.get("supervisor_doctor"))
 
         # Compute urgency law based on AI result and approvals
-        computed_urgency_law = _compute_urgency_law(
+        computed_urgency_law = compute_urgency_law(
             ai_result=item.get("ai_result"),
             medic_approved=item.get("medic_approved"),
             supervisor_approved=item.get("supervisor_approved"),
@@ -449,9 +388,91 @@ def get_attention_detail(attention_id: UUID) -> ClinicalAttentionDetailResponse:
         raise
 
 
+def get_attention_by_episode(
+    id_episodio: str, source: str | None = None
+) -> ClinicalAttentionDetailResponse:
+    ref = episode_service.resolve_episode(id_episodio, source)
+    if ref is None:
+        raise LookupError("ClinicalAttention no encontrada")
+    return get_attention_detail(ref.attention_id)
+
+
+def _request_ai_evaluation(
+    attention_id: UUID | str, diagnostic: str, edit: bool = False
+) -> None:
+    """
+    Encola la evaluación de IA del diagnóstico; las ediciones van con menor
+    prioridad que las atenciones nuevas y con debounce.
+
+    Si una regla de KNOWN_DX aplica, su resultado se guarda al instante y la
+    IA solo lo confirma (o nada, con AI_RULES_CONFIRM_WITH_LLM=false). Si el
+    texto ya fue evaluado (p. ej. como borrador mientras se escribía), el
+    resultado del cache se guarda al instante y no se encola nada.
+
+    Nunca falla: la atención ya está guardada, y un error aquí no debe
+    convertirse en un 500 que lleve al cliente a reintentar (y duplicarla).
+    Una atención sin resultado la retoma `ai-reevaluate` (versión de prompt
+    nula).
+    """
+    try:
+        ai_output = rules.evaluate(diagnostic)
+        if ai_output is not None:
+            ai_task.save_result(attention_id, diagnostic, ai_output)
+            if not settings.AI_RULES_CONFIRM_WITH_LLM:
+                return
+        elif _attach_cached_evaluation(attention_id, diagnostic):
+            return
+
+        if edit:
+            ai_queue.enqueue(
+                attention_id,
+                diagnostic,
+                priority=ai_queue.PRIORITY_EDIT,
+                debounce=True,
+            )
+        else:
+            ai_queue.enqueue(attention_id, diagnostic)
+    except Exception as e:
+        print(f"Error solicitando la evaluación de IA de {attention_id}: {e}")
+
+
+def _attach_cached_evaluation(attention_id: UUID | str, diagnostic: str) -> bool:
+    if not ai_cache.enabled():
+        return False
+    try:
+        ai_output = ai_cache.get(ai_cache.cache_key(diagnostic))
+    except Exception as e:
+        # El cache es solo una optimización: se sigue con la cola
+        print(f"Error consultando el cache de IA: {e}")
+        return False
+    return ai_output is not None and ai_task.save_result(
+        attention_id, diagnostic, ai_output
+    )
+
+
+def find_similar_cases(
+    attention_id: UUID, k: int = 5, validated_only: bool = False
+) -> list[SimilarCase]:
+    """
+    Atenciones con diagnósticos más parecidos al de `attention_id` (índice
+    TF-IDF local, ver similar_cases), de mayor a menor similitud.
+    """
+    detail = get_attention_detail(attention_id)
+    if not detail.diagnostic:
+        return []
+    return [
+        SimilarCase(**case)
+        for case in similar_cases.search(
+            detail.diagnostic,
+            k=k,
+            validated_only=validated_only,
+            exclude=[attention_id],
+        )
+    ]
+
+
 def create_attention(
     payload: CreateClinicalAttentionRequest,
-    background_tasks: BackgroundTasks,
 ) -> ClinicalAttentionDetailResponse:
     try:
         if isinstance(payload.patient_id, dict):
@@ -503,9 +524,9 @@ def create_attention(
             raise HTTPException(
                 status_code=400, detail="Error al crear la atención clínica"
             )
-        background_tasks.add_task(
-            run_ai_reasoning_task, UUID(attention_id), payload.diagnostic
-        )
+        metric_service.invalidate_metrics_cache()
+        similar_cases.upsert_rows(insert_result.data)
+        _request_ai_evaluation(attention_id, payload.diagnostic)
         detail_result = get_attention_detail(UUID(attention_id))
         return detail_result
 
@@ -519,7 +540,6 @@ def create_attention(
 def update_attention(
     attention_id: UUID,
     payload: UpdateClinicalAttentionRequest,
-    background_tasks: BackgroundTasks,
     editor_id: UUID = None,
 ):
     try:
@@ -591,14 +611,24 @@ def update_attention(
         if not update_data:
             return attention_detail
 
-        supabase.table("ClinicalAttention").update(update_data).eq(
-            "id", str(attention_id)
-        ).execute()
+        update_response = (
+            supabase.table("ClinicalAttention")
+            .update(update_data)
+            .eq("id", str(attention_id))
+            .execute()
+        )
+
+        metric_service.invalidate_metrics_cache()
+        similar_cases.upsert_rows(update_response.data)
+        if APPROVAL_FIELDS & update_data.keys():
+            events.publish("approval", update_response.data)
+
+        if "id_episodio" in update_data or "patient_id" in update_data:
+            episode_service.invalidate_episode(attention_detail.id_episodio)
+            episode_service.invalidate_episode(update_data.get("id_episodio"))
 
         if should_ai_reevaluate:
-            background_tasks.add_task(
-                run_ai_reasoning_task, attention_id, payload.diagnostic
-            )
+            _request_ai_evaluation(attention_id, payload.diagnostic, edit=True)
 
         return get_attention_detail(attention_id)
 
@@ -645,6 +675,9 @@ def medic_approval(
 
         if not resp.data:
             raise HTTPException(status_code=400, detail="No se pudo actualizar")
+        metric_service.invalidate_metrics_cache()
+        similar_cases.upsert_rows(resp.data)
+        events.publish("approval", resp.data)
 
         return get_attention_detail(attention_id)
 
@@ -680,6 +713,8 @@ def delete_attention(attention_id: UUID, deleted_by_id: UUID):
             raise HTTPException(
                 status_code=400, detail="No se pudo eliminar la atención clínica"
             )
+        metric_service.invalidate_metrics_cache()
+        similar_cases.upsert_rows(response.data)
 
         return None
     except Exception as e:
@@ -713,76 +748,79 @@ def import_insurance_excel(insurance_company_id: int, file: UploadFile):
                 detail="El Excel debe incluir columnas: 'Episodio' y 'Validación'",
             )
 
-        updated_count = 0
-
+        # 1. Parsear filas del Excel
+        parsed_rows = []
         for idx, row in df.iterrows():
-            try:
-                episode = str(row[column_mapping["episodio"]]).strip()
-                validacion_value = (
-                    str(row[column_mapping["validacion"]]).strip().upper()
-                )
-
-                # Convert "PERTINENTE" / "NO PERTINENTE" to boolean
-                if validacion_value == "PERTINENTE":
-                    pertinencia = True
-                elif validacion_value == "NO PERTINENTE":
-                    pertinencia = False
-                else:
-                    # Try to parse as boolean/numeric for backwards compatibility
-                    try:
-                        pertinencia = bool(int(validacion_value))
-                    except (ValueError, TypeError):
-                        print(
-                            f"Skipping row {idx}: Invalid validacion value "
-                            f"'{validacion_value}'"
-                        )
-                        continue
-
-                print(
-                    f"Processing row {idx}: episode={episode}, "
-                    f"pertinencia={pertinencia}"
-                )
-
-                attention_resp = (
-                    supabase.table("ClinicalAttention")
-                    .select("id, patient_id, pertinencia")
-                    .eq("id_episodio", episode)
-                    .execute()
-                )
-
-                if not attention_resp.data:
-                    print(f"No clinical attention found for episode: {episode}")
-                    continue
-
-                attention = attention_resp.data[0]
-
-                patient_resp = (
-                    supabase.table("Patient")
-                    .select("insurance_company_id")
-                    .eq("id", attention["patient_id"])
-                    .single()
-                    .execute()
-                )
-
-                if not patient_resp.data:
-                    print(f"No patient found for attention: {attention['id']}")
-                    continue
-
-                if patient_resp.data["insurance_company_id"] != insurance_company_id:
-                    print(f"Insurance mismatch for episode {episode}")
+            episode = str(row[column_mapping["episodio"]]).strip()
+            validacion_value = str(row[column_mapping["validacion"]]).strip().upper()
+
+            # Convert "PERTINENTE" / "NO PERTINENTE" to boolean
+            if validacion_value == "PERTINENTE":
+                pertinencia = True
+            elif validacion_value == "NO PERTINENTE":
+                pertinencia = False
+            else:
+                # Try to parse as boolean/numeric for backwards compatibility
+                try:
+                    pertinencia = bool(int(validacion_value))
+                except (ValueError, TypeError):
+                    print(
+                        f"Skipping row {idx}: Invalid validacion value "
+                        f"'{validacion_value}'"
+                    )
                     continue
 
-                supabase.table("ClinicalAttention").update(
-                    {"pertinencia": pertinencia}
-                ).eq("id", attention["id"]).execute()
+            parsed_rows.append((idx, episode, pertinencia))
 
-                updated_count += 1
-            except Exception as row_error:
-                print(f"Error processing row {idx}: {str(row_error)}")
-                import traceback
+        # 2. Resolver todos los episodios en lote (index seek por lote)
+        episodes = episode_service.resolve_episodes(
+            [episode for _, episode, _ in parsed_rows]
+        )
 
-                print(traceback.format_exc())
-                # Continue with next row instead of failing completely
+        # 3. Agrupar atenciones por valor de pertinencia
+        ids_by_value: dict[bool, list[str]] = {True: [], False: []}
+        seen_ids: dict[str, bool] = {}
+        for idx, episode, pertinencia in parsed_rows:
+            ref = episodes.get(episode)
+            if ref is None:
+                print(f"No clinical attention found for episode: {episode}")
+                continue
+
+            if ref.insurance_company_id is None:
+                print(f"No patient found for attention: {ref.attention_id}")
+                continue
+
+            if ref.insurance_company_id != insurance_company_id:
+                print(f"Insurance mismatch for episode {episode}")
+                continue
+
+            # Si el episodio se repite en el archivo, gana la última fila
+            attention_id = str(ref.attention_id)
+            previous = seen_ids.get(attention_id)
+            if previous is not None:
+                ids_by_value[previous].remove(attention_id)
+            seen_ids[attention_id] = pertinencia
+            ids_by_value[pertinencia].append(attention_id)
+
+        # 4. Actualizar en lote
+        updated_count = 0
+        for pertinencia, attention_ids in ids_by_value.items():
+            for start in range(0, len(attention_ids), IMPORT_UPDATE_BATCH_SIZE):
+                batch = attention_ids[start : start + IMPORT_UPDATE_BATCH_SIZE]
+                try:
+                    supabase.table("ClinicalAttention").update(
+                        {"pertinencia": pertinencia}
+                    ).in_("id", batch).execute()
+                    updated_count += len(batch)
+                except Exception as batch_error:
+                    print(f"Error updating batch: {str(batch_error)}")
+                    import traceback
+
+                    print(traceback.format_exc())
+                    # Continue with next batch instead of failing completely
+
+        if updated_count:
+            metric_service.invalidate_metrics_cache()
 
         print(f"Import completed. Updated {updated_count} records")
         return updated_count
@@ -856,6 +894,7 @@ def close_episode(attention_id: UUID, closed_by_id: UUID, closing_reason: str):
 
         if not update_response.data:
             raise HTTPException(status_code=500, detail="Error al cerrar la atención")
+        events.publish("closure", update_response.data)
 
         return {"success": True, "message": "Atención cerrada exitosamente"}
 
@@ -930,6 +969,7 @@ def reopen_episode(attention_id: UUID, reopened_by_id: UUID):
 
         if not update_response.data:
             raise HTTPException(status_code=500, detail="Error al reabrir la atención")
+        events.publish("closure", update_response.data)
 
         return {"success": True, "message": "Atención reabierta exitosamente"}
 
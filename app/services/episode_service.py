@@ -0,0 +1,82 @@
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.supabase_client import supabase
+from app.schemas.clinical_attention import EpisodeRef
+
+# Máximo de episodios por filtro `in` para no exceder el largo de la URL
+RESOLVE_BATCH_SIZE = 200
+
+_episode_cache = LRUCache(maxsize=settings.EPISODE_CACHE_SIZE)
+
+
+def _normalize_episode(episode) -> str:
+    return str(episode).strip()
+
+
+def resolve_episodes(
+    episodes: list[str], source: str | None = None
+) -> dict[str, EpisodeRef]:
+    """
+    Resuelve números de episodio a (atención, paciente, aseguradora).
+
+    Usa el índice único (id_episodio, episode_source): cada lote es un index
+    seek en vez de una consulta por episodio. Los episodios frecuentes se
+    sirven desde un LRU en memoria. Los episodios no encontrados no se
+    incluyen en el resultado.
+    """
+    source = source or settings.EPISODE_DEFAULT_SOURCE
+    resolved: dict[str, EpisodeRef] = {}
+    pending: list[str] = []
+
+    for raw in episodes:
+        episode = _normalize_episode(raw)
+        if not episode or episode in resolved or episode in pending:
+            continue
+        cached = _episode_cache.get((source, episode))
+        if cached is not None:
+            resolved[episode] = cached
+        else:
+            pending.append(episode)
+
+    for start in range(0, len(pending), RESOLVE_BATCH_SIZE):
+        batch = pending[start : start + RESOLVE_BATCH_SIZE]
+        response = (
+            supabase.table("ClinicalAttention")
+            .select(
+                "id, id_episodio, episode_source, patient_id, "
+                "patient:patient_id(insurance_company_id)"
+            )
+            .eq("episode_source", source)
+            .in_("id_episodio", batch)
+            .execute()
+        )
+        for row in response.data or []:
+            patient_data = row.get("patient") or {}
+            ref = EpisodeRef(
+                id_episodio=row["id_episodio"],
+                episode_source=row.get("episode_source") or source,
+                attention_id=row["id"],
+                patient_id=row.get("patient_id"),
+                insurance_company_id=patient_data.get("insurance_company_id"),
+            )
+            resolved[ref.id_episodio] = ref
+            _episode_cache.set((source, ref.id_episodio), ref)
+
+    return resolved
+
+
+def resolve_episode(episode: str, source: str | None = None) -> EpisodeRef | None:
+    episode = _normalize_episode(episode)
+    return resolve_episodes([episode], source).get(episode)
+
+
+def invalidate_episode(episode: str | None, source: str | None = None) -> None:
+    """Elimina un episodio del LRU (p. ej. al cambiar su atención o paciente)."""
+    if episode is None:
+        return
+    source = source or settings.EPISODE_DEFAULT_SOURCE
+    _episode_cache.pop((source, _normalize_episode(episode)))
+
+
+def clear_episode_cache() -> None:
+    _episode_cache.clear()
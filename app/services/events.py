@@ -0,0 +1,212 @@
+"""
+Eventos de cambios en atenciones clínicas (resultado de IA, validaciones y
+cierre) para clientes suscritos por SSE (GET /v1/events/stream).
+
+Cada evento es compacto: tipo, ids de la atención y de sus médicos, y solo los
+campos que cambiaron, para que el cliente no tenga que repetir el detalle
+completo de la atención en un polling.
+
+`EventBroker` reparte los eventos a los suscriptores de este proceso. El
+backend decide de dónde vienen (EVENTS_BACKEND):
+
+- "memory": solo los eventos publicados en este mismo proceso (un nodo, sin
+  worker de IA aparte).
+- "postgres": se publican con pg_notify (RPC publish_attention_event) y cada
+  proceso de la API los recibe con LISTEN en EVENTS_DATABASE_URL, así llegan
+  también los del worker de IA y de otras réplicas.
+
+Otros backends (Redis, etc.) se agregan en BACKENDS con la misma interfaz.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+from app.core.config import settings
+
+EVENT_FIELDS = {
+    "ai_result": ("ai_result", "ai_confidence", "ai_tier", "applies_urgency_law"),
+    "approval": (
+        "medic_approved",
+        "supervisor_approved",
+        "pertinencia",
+        "applies_urgency_law",
+    ),
+    "closure": ("is_closed", "closing_reason", "closed_at"),
+}
+
+CHANNEL = "attention_events"
+
+
+class Subscription:
+    def __init__(self, match: Callable[[dict], bool], maxsize: int):
+        self.match = match
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, event: dict) -> None:
+        # Corre en el loop del suscriptor. Un cliente lento pierde los eventos
+        # más antiguos, no bloquea al resto
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """Suscriptores de este proceso; `dispatch` se puede llamar desde cualquier hilo."""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscriptions: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, match: Callable[[dict], bool]) -> Subscription:
+        subscription = Subscription(match, self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, event: dict) -> None:
+        with self._lock:
+            targets = [s for s in self._subscriptions if s.match(event)]
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # El loop del suscriptor ya cerró
+                self.unsubscribe(subscription)
+
+
+class MemoryBackend:
+    def __init__(self, broker: EventBroker):
+        self.broker = broker
+
+    def start(self) -> None:
+        pass
+
+    def publish(self, event: dict) -> None:
+        self.broker.dispatch(event)
+
+
+class PostgresBackend:
+    """pg_notify para publicar y un hilo con LISTEN para recibir."""
+
+    RECONNECT_SECONDS = 5.0
+
+    def __init__(self, broker: EventBroker):
+        self.broker = broker
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._listen_forever, name="events-listen", daemon=True
+                )
+                self._thread.start()
+
+    def publish(self, event: dict) -> None:
+        from app.core.supabase_client import supabase
+
+        supabase.rpc("publish_attention_event", {"p_event": event}).execute()
+
+    def _listen_forever(self) -> None:
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"Error escuchando eventos ({CHANNEL}): {e}")
+            time.sleep(self.RECONNECT_SECONDS)
+
+    def _listen(self) -> None:
+        import select
+
+        import psycopg2
+
+        if not settings.EVENTS_DATABASE_URL:
+            raise RuntimeError("EVENTS_BACKEND=postgres requiere EVENTS_DATABASE_URL")
+        conn = psycopg2.connect(settings.EVENTS_DATABASE_URL)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                if select.select([conn], [], [], 30.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self.broker.dispatch(json.loads(notify.payload))
+        finally:
+            conn.close()
+
+
+BACKENDS = {"memory": MemoryBackend, "postgres": PostgresBackend}
+
+broker = EventBroker()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = BACKENDS[settings.EVENTS_BACKEND](broker)
+        return _backend
+
+
+def attention_event(kind: str, row: dict) -> dict:
+    """Evento compacto a partir de la fila actualizada de ClinicalAttention."""
+    return {
+        "type": kind,
+        "attention_id": str(row["id"]),
+        "resident_doctor_id": row.get("resident_doctor_id"),
+        "supervisor_doctor_id": row.get("supervisor_doctor_id"),
+        "changes": {field: row.get(field) for field in EVENT_FIELDS[kind]},
+        "at": row.get("updated_at") or datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def publish(kind: str, rows: Iterable[dict] | None) -> None:
+    """
+    Publica un evento `kind` por cada fila actualizada. Nunca falla: un
+    evento perdido solo retrasa al cliente hasta su próxima recarga.
+    """
+    for row in rows or []:
+        try:
+            get_backend().publish(attention_event(kind, row))
+        except Exception as e:
+            print(f"Error publicando evento {kind}: {e}")
+
+
+def subscribe(
+    attention_ids: Iterable[str] = (), user_id: Optional[str] = None
+) -> Subscription:
+    """
+    Suscripción a las atenciones `attention_ids` y/o a todas aquellas donde
+    `user_id` es residente o supervisor. Debe llamarse dentro del event loop.
+    """
+    ids = {str(i) for i in attention_ids}
+
+    def match(event: dict) -> bool:
+        return event["attention_id"] in ids or (
+            user_id is not None
+            and user_id
+            in (event.get("resident_doctor_id"), event.get("supervisor_doctor_id"))
+        )
+
+    get_backend().start()
+    return broker.subscribe(match)
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    broker.unsubscribe(subscription)
@@ -0,0 +1,190 @@
+"""
+Exportaciones CSV/XLSX de atenciones clínicas y métricas.
+
+Las filas salen de un scan keyset (`scan_rows`) y se escriben bloque a bloque:
+ni la consulta ni el archivo completo viven en memoria. Los endpoints las
+devuelven con StreamingResponse (transfer-encoding chunked).
+"""
+
+import csv
+import io
+import tempfile
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from openpyxl import Workbook
+
+from app.core.supabase_client import supabase
+from app.schemas.metric import MetricStats
+from app.services import clinical_attention_service
+from app.services.scan_service import scan_rows
+from app.services.urgency import compute_urgency_law
+
+# Tamaño de los trozos al transmitir el XLSX ya escrito
+XLSX_CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _yes_no(value: Optional[bool]) -> str:
+    if value is None:
+        return ""
+    return "SI" if value else "NO"
+
+
+def _full_name(person: Optional[dict]) -> str:
+    person = person or {}
+    return f"{person.get('first_name') or ''} {person.get('last_name') or ''}".strip()
+
+
+def _pertinencia(value: Optional[bool]) -> str:
+    # Mismos valores que lee import_insurance_excel
+    if value is None:
+        return ""
+    return "PERTINENTE" if value else "NO PERTINENTE"
+
+
+ATTENTION_COLUMNS: List[tuple[str, Callable[[dict], object]]] = [
+    ("Episodio", lambda r: r.get("id_episodio") or ""),
+    ("Fecha creación", lambda r: r.get("created_at") or ""),
+    ("RUT paciente", lambda r: (r.get("patient") or {}).get("rut") or ""),
+    ("Paciente", lambda r: _full_name(r.get("patient"))),
+    ("Residente", lambda r: _full_name(r.get("resident_doctor"))),
+    ("Supervisor", lambda r: _full_name(r.get("supervisor_doctor"))),
+    ("Diagnóstico", lambda r: r.get("diagnostic") or ""),
+    ("Resultado IA", lambda r: _yes_no(r.get("ai_result"))),
+    ("Validación residente", lambda r: _yes_no(r.get("medic_approved"))),
+    ("Validación supervisor", lambda r: _yes_no(r.get("supervisor_approved"))),
+    (
+        "Ley de urgencia",
+        lambda r: _yes_no(
+            compute_urgency_law(
+                r.get("ai_result"),
+                r.get("medic_approved"),
+                r.get("supervisor_approved"),
+            )
+        ),
+    ),
+    ("Validación", lambda r: _pertinencia(r.get("pertinencia"))),
+    ("Cerrado", lambda r: _yes_no(r.get("is_closed"))),
+    ("Motivo cierre", lambda r: r.get("closing_reason") or ""),
+]
+
+METRIC_COLUMNS: List[tuple[str, Callable[[MetricStats], object]]] = [
+    ("ID", lambda m: m.id),
+    ("Nombre", lambda m: m.name),
+    ("Total episodios", lambda m: m.total_episodes),
+    ("Ley de urgencia", lambda m: m.total_urgency_law),
+    ("% Ley de urgencia rechazada", lambda m: m.percent_urgency_law_rejected),
+    ("IA dijo SI", lambda m: m.total_ai_yes),
+    ("% IA SI rechazada", lambda m: m.percent_ai_yes_rejected),
+    ("IA NO y médico SI", lambda m: m.total_ai_no_medic_yes),
+    ("% IA NO y médico SI rechazada", lambda m: m.percent_ai_no_medic_yes_rejected),
+]
+
+
+def attention_chunks(
+    apply_filters: Callable, start_date: Optional[str], end_date: Optional[str]
+) -> Iterator[List[list]]:
+    """
+    Bloques de filas (ya formateadas) de las atenciones que cumplen los
+    filtros del listado, más un rango de created_at.
+    """
+
+    def build_query():
+        query = apply_filters(
+            supabase.table("ClinicalAttention").select(
+                clinical_attention_service.LIST_SELECT_QUERY
+            )
+        )
+        if start_date:
+            query = query.gte("created_at", f"{start_date}T00:00:00")
+        if end_date:
+            query = query.lte("created_at", f"{end_date}T23:59:59")
+        return query
+
+    for rows in scan_rows(build_query):
+        yield [[extract(row) for _, extract in ATTENTION_COLUMNS] for row in rows]
+
+
+def metric_chunks(metrics: List[MetricStats]) -> Iterator[List[list]]:
+    yield [[extract(m) for _, extract in METRIC_COLUMNS] for m in metrics]
+
+
+def stream_csv(headers: List[str], chunks: Iterable[List[list]]) -> Iterator[bytes]:
+    """Escribe un bloque CSV por bloque de filas (con BOM para Excel)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write("\ufeff")
+    writer.writerow(headers)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_xlsx(
+    headers: List[str], chunks: Iterable[List[list]], sheet_title: str
+) -> Iterator[bytes]:
+    """
+    Escribe el XLSX con openpyxl en modo write-only (memoria constante, las
+    filas van a archivos temporales) y luego lo transmite por trozos.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(headers)
+    for rows in chunks:
+        for row in rows:
+            sheet.append(row)
+
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(XLSX_CHUNK_SIZE):
+            yield chunk
+
+
+def export_stream(
+    export_format: str,
+    headers: List[str],
+    chunks: Iterable[List[list]],
+    sheet_title: str,
+) -> Iterator[bytes]:
+    if export_format == "xlsx":
+        return stream_xlsx(headers, chunks, sheet_title)
+    return stream_csv(headers, chunks)
+
+
+def export_attentions(
+    export_format: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    **filters,
+) -> Iterator[bytes]:
+    """
+    Exporta las atenciones con los mismos filtros que `list_attentions`. Las
+    búsquedas auxiliares de los filtros se resuelven aquí, antes de empezar a
+    transmitir, para que sus errores no corten una respuesta a medias.
+    """
+    apply_filters = clinical_attention_service.list_filters(**filters)
+    return export_stream(
+        export_format,
+        [header for header, _ in ATTENTION_COLUMNS],
+        attention_chunks(apply_filters, start_date, end_date),
+        "Atenciones",
+    )
+
+
+def export_metrics(export_format: str, metrics: List[MetricStats]) -> Iterator[bytes]:
+    return export_stream(
+        export_format,
+        [header for header, _ in METRIC_COLUMNS],
+        metric_chunks(metrics),
+        "Métricas",
+    )
@@ -0,0 +1,216 @@
+"""
+Kernel columnar para los KPI de métricas.
+
+Cada atención se reduce a tres columnas tri-estado (applies_urgency_law,
+ai_result, pertinencia) y un código de grupo. Un solo np.bincount sobre
+`grupo * 27 + celda` produce un cubo de conteos (grupo × urgencia × IA ×
+pertinencia) del que salen las cuatro familias de KPI de todos los grupos a
+la vez. Los cubos se pueden sumar, así que los scans por bloques mantienen
+memoria constante.
+"""
+
+from typing import Callable, Hashable, Iterable, List, Optional
+
+import numpy as np
+
+# Codificación tri-estado
+NULL, FALSE, TRUE = 0, 1, 2
+_TRISTATE = {None: NULL, False: FALSE, True: TRUE}
+# (urgencia, IA, pertinencia) -> celda, para empaquetar dicts en una pasada
+_CELL_OF = {
+    (u, a, p): cu * 9 + ca * 3 + cp
+    for u, cu in _TRISTATE.items()
+    for a, ca in _TRISTATE.items()
+    for p, cp in _TRISTATE.items()
+}
+
+# Celdas por grupo: 3 (urgencia) × 3 (IA) × 3 (pertinencia)
+CELLS = 27
+
+# Conteos crudos que alimentan MetricStats (mismo orden que las RPC)
+COUNT_FIELDS = (
+    "total_episodes",
+    "total_urgency_law",
+    "urgency_law_rejected",
+    "total_ai_yes",
+    "ai_yes_rejected",
+    "total_ai_no_medic_yes",
+    "ai_no_medic_yes_rejected",
+)
+
+# Matriz de confusión IA (ai_result) vs. aseguradora (pertinencia)
+CONFUSION_FIELDS = (
+    "true_positive",
+    "false_positive",
+    "false_negative",
+    "true_negative",
+    "pending",
+    "without_ai",
+)
+
+
+def encode_tristate(values: Iterable, count: int = -1) -> np.ndarray:
+    """Codifica None/False/True como 0/1/2 (cualquier otro valor cuenta como None)."""
+    return np.fromiter(
+        (_TRISTATE.get(v, NULL) for v in values), dtype=np.int8, count=count
+    )
+
+
+def cell_index(urgency: np.ndarray, ai: np.ndarray, pert: np.ndarray) -> np.ndarray:
+    return urgency.astype(np.int32) * 9 + ai.astype(np.int32) * 3 + pert
+
+
+def cubes_to_counts(cells: np.ndarray) -> np.ndarray:
+    """
+    Convierte cubos (n_grupos, 27) en conteos (n_grupos, 7) en el orden de
+    COUNT_FIELDS.
+    """
+    cube = cells.reshape(-1, 3, 3, 3)  # grupo, urgencia, IA, pertinencia
+    urgency_yes = cube[:, TRUE]
+    # Nota: pertinencia None se considera pendiente, no rechazado.
+    return np.stack(
+        [
+            # 1. Total episodios
+            cube.sum(axis=(1, 2, 3)),
+            # 2. Ley de urgencia aplicada, y rechazados por la aseguradora
+            urgency_yes.sum(axis=(1, 2)),
+            urgency_yes[:, :, FALSE].sum(axis=1),
+            # 3. IA dijo SI
+            cube[:, :, TRUE].sum(axis=(1, 2)),
+            cube[:, :, TRUE, FALSE].sum(axis=1),
+            # 4. IA dijo NO y Médico dijo SI
+            urgency_yes[:, FALSE].sum(axis=1),
+            urgency_yes[:, FALSE, FALSE],
+        ],
+        axis=1,
+    )
+
+
+def cubes_to_confusion(cells: np.ndarray) -> np.ndarray:
+    """
+    Convierte cubos (n_grupos, 27) en la matriz de confusión IA vs.
+    pertinencia (n_grupos, 6) en el orden de CONFUSION_FIELDS. Positivo =
+    aplica la ley de urgencia / la aseguradora la considera pertinente.
+    """
+    ai_pert = cells.reshape(-1, 3, 3, 3).sum(axis=1)  # grupo, IA, pertinencia
+    return np.stack(
+        [
+            ai_pert[:, TRUE, TRUE],
+            ai_pert[:, TRUE, FALSE],
+            ai_pert[:, FALSE, TRUE],
+            ai_pert[:, FALSE, FALSE],
+            # IA con resultado, aseguradora aún sin pertinencia
+            ai_pert[:, FALSE:, NULL].sum(axis=1),
+            # Sin resultado de IA
+            ai_pert[:, NULL].sum(axis=1),
+        ],
+        axis=1,
+    )
+
+
+class GroupedCounts:
+    """
+    Cubos de conteo por grupo, acumulables bloque a bloque.
+
+    `add_columns` es el camino vectorizado; `add_rows` empaqueta filas de
+    PostgREST (dicts) en columnas y lo llama.
+    """
+
+    def __init__(self):
+        self._index: dict = {}
+        self._keys: List[Hashable] = []
+        self._cells = np.zeros((0, CELLS), dtype=np.int64)
+
+    def encode_keys(self, keys: Iterable[Optional[Hashable]], count: int) -> np.ndarray:
+        """Códigos de grupo para `add_columns` (None = -1, se omite)."""
+        index = self._index
+        known = len(index)
+        # None vive en el índice con código -1, por eso los nuevos usan len - 1
+        index.setdefault(None, -1)
+        codes = np.fromiter(
+            (index.setdefault(k, len(index) - 1) for k in keys),
+            dtype=np.int32,
+            count=count,
+        )
+        if len(index) > known:
+            self._keys = [k for k in index if k is not None]
+        return codes
+
+    def add_columns(
+        self,
+        codes: np.ndarray,
+        urgency: np.ndarray,
+        ai: np.ndarray,
+        pert: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Suma un bloque ya codificado (códigos de `encode_keys`). Códigos
+        negativos se ignoran. `weights` permite sumar filas ya agregadas
+        (p. ej. celdas del rollup con su cantidad de episodios).
+        """
+        self.add_cells(codes, cell_index(urgency, ai, pert), weights)
+
+    def add_cells(
+        self,
+        codes: np.ndarray,
+        cells: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+    ) -> None:
+        """Como `add_columns`, con la celda (0-26) ya calculada por fila."""
+        valid = codes >= 0
+        if not valid.all():
+            codes, cells = codes[valid], cells[valid]
+            weights = weights[valid] if weights is not None else None
+
+        n_groups = len(self._keys)
+        flat = codes.astype(np.int64) * CELLS + cells
+        block = np.bincount(flat, weights=weights, minlength=n_groups * CELLS)
+        block = block.astype(np.int64).reshape(-1, CELLS)
+
+        if self._cells.shape[0] < n_groups:
+            grown = np.zeros((n_groups, CELLS), dtype=np.int64)
+            grown[: self._cells.shape[0]] = self._cells
+            self._cells = grown
+        self._cells += block[:n_groups]
+
+    def add_rows(
+        self,
+        rows: List[dict],
+        group_of: Callable[[dict], Optional[Hashable]] = lambda row: 0,
+    ) -> None:
+        """Empaqueta filas (dicts) y las suma. group_of None = omitir la fila."""
+        n = len(rows)
+        if n == 0:
+            return
+        codes = self.encode_keys(map(group_of, rows), n)
+        cell_of = _CELL_OF.get
+        cells = np.fromiter(
+            (
+                cell_of(
+                    (
+                        r.get("applies_urgency_law"),
+                        r.get("ai_result"),
+                        r.get("pertinencia"),
+                    ),
+                    NULL,
+                )
+                for r in rows
+            ),
+            dtype=np.int8,
+            count=n,
+        )
+        self.add_cells(codes, cells)
+
+    def cubes(self) -> dict:
+        """{grupo: cubo (27,)} para cálculos distintos de COUNT_FIELDS."""
+        return dict(zip(self._keys, self._cells))
+
+    def counts(self) -> dict:
+        """{grupo: {campo: conteo}} para todos los grupos vistos."""
+        if not self._keys:
+            return {}
+        matrix = cubes_to_counts(self._cells).tolist()
+        return {
+            key: dict(zip(COUNT_FIELDS, row)) for key, row in zip(self._keys, matrix)
+        }
@@ -1,7 +1,54 @@
-from typing import List, Optional
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+from uuid import UUID
 
+import numpy as np
+
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.supabase_client import supabase
-from app.schemas.metric import MetricStats
+from app.schemas.metric import (
+    AgreementResponse,
+    AgreementStats,
+    CalibrationBin,
+    ConfusionMatrix,
+    MetricSeriesPoint,
+    MetricSeriesResponse,
+    MetricStats,
+)
+from app.services import snapshot_service
+from app.services.metric_kernel import (
+    CONFUSION_FIELDS,
+    COUNT_FIELDS,
+    GroupedCounts,
+    cubes_to_confusion,
+    encode_tristate,
+)
+from app.services.scan_service import scan_rows
+
+# Columnas mínimas para calcular métricas desde un scan
+SCAN_COLUMNS = "id, created_at, applies_urgency_law, ai_result, pertinencia"
+
+# Máximo de IDs por filtro `in` para no exceder el largo de la URL
+ID_BATCH_SIZE = 200
+
+# Deciles de ai_confidence para la calibración (igual que ai_confidence_bin())
+CALIBRATION_BINS = 10
+
+# Resultados por (scope, entity_id, start_date, end_date)
+_metrics_cache = TTLCache(
+    ttl=settings.METRICS_CACHE_TTL_SECONDS,
+    stale_ttl=settings.METRICS_CACHE_STALE_SECONDS,
+)
+
+
+def invalidate_metrics_cache() -> None:
+    """
+    Descarta las métricas cacheadas. Lo llaman las escrituras de atenciones
+    clínicas; cualquier cambio puede afectar al listado de usuarios, al
+    residente y a la aseguradora del paciente.
+    """
+    _metrics_cache.invalidate()
 
 
 def _calculate_percentage(part: int, total: int) -> float:
@@ -10,120 +57,195 @@ def _calculate_percentage(part: int, total: int) -> float:
     return round((part / total) * 100, 1)
 
 
-def _process_rows_to_stats(
-    rows: List[dict], entity_id: str | int, entity_name: str
+def _stats_from_counts(
+    counts: dict, entity_id: str | int, entity_name: str
 ) -> MetricStats:
     """
-    Recibe una lista de atenciones (filas) y calcula las métricas solicitadas.
+    Arma un MetricStats a partir de conteos ya agregados (por SQL o Python).
+    Solo calcula los porcentajes finales.
     """
-    total_episodes = len(rows)
-    urgency_law_rows = [r for r in rows if r.get("applies_urgency_law") is True]
-    total_urgency_law = len(urgency_law_rows)
-
-    # De estos, cuántos fueron rechazados (pertinencia == False)
-    # Nota: pertinencia None se considera pendiente, no rechazado.
-    urgency_law_rejected = len(
-        [r for r in urgency_law_rows if r.get("pertinencia") is False]
-    )
-
-    # 3. IA dijo SI
-    ai_yes_rows = [r for r in rows if r.get("ai_result") is True]
-    total_ai_yes = len(ai_yes_rows)
-    ai_yes_rejected = len([r for r in ai_yes_rows if r.get("pertinencia") is False])
-
-    # 4. IA dijo NO y Médico dijo SI
-    # ai_result False AND applies_urgency_law True
-    ai_no_medic_yes_rows = [
-        r
-        for r in rows
-        if r.get("ai_result") is False and r.get("applies_urgency_law") is True
-    ]
-    total_ai_no_medic_yes = len(ai_no_medic_yes_rows)
-    ai_no_medic_yes_rejected = len(
-        [r for r in ai_no_medic_yes_rows if r.get("pertinencia") is False]
-    )
+    total_urgency_law = counts.get("total_urgency_law") or 0
+    total_ai_yes = counts.get("total_ai_yes") or 0
+    total_ai_no_medic_yes = counts.get("total_ai_no_medic_yes") or 0
 
     return MetricStats(
         id=entity_id,
         name=entity_name,
-        total_episodes=total_episodes,
+        total_episodes=counts.get("total_episodes") or 0,
         total_urgency_law=total_urgency_law,
         percent_urgency_law_rejected=_calculate_percentage(
-            urgency_law_rejected, total_urgency_law
+            counts.get("urgency_law_rejected") or 0, total_urgency_law
         ),
         total_ai_yes=total_ai_yes,
-        percent_ai_yes_rejected=_calculate_percentage(ai_yes_rejected, total_ai_yes),
+        percent_ai_yes_rejected=_calculate_percentage(
+            counts.get("ai_yes_rejected") or 0, total_ai_yes
+        ),
         total_ai_no_medic_yes=total_ai_no_medic_yes,
         percent_ai_no_medic_yes_rejected=_calculate_percentage(
-            ai_no_medic_yes_rejected, total_ai_no_medic_yes
+            counts.get("ai_no_medic_yes_rejected") or 0, total_ai_no_medic_yes
         ),
     )
 
 
-def get_base_query(start_date: Optional[str], end_date: Optional[str]):
+def _process_rows_to_stats(
+    rows: List[dict], entity_id: str | int, entity_name: str
+) -> MetricStats:
+    """
+    Recibe una lista de atenciones (filas) y calcula las métricas solicitadas.
+    """
+    accumulator = StatsAccumulator()
+    accumulator.add_rows(rows)
+    return accumulator.to_stats(entity_id, entity_name)
+
+
+class StatsAccumulator:
+    """
+    Acumula conteos de KPI bloque a bloque (kernel columnar), para procesar
+    scans grandes sin mantener las filas en memoria.
+    """
+
+    def __init__(self):
+        self._grouped = GroupedCounts()
+
+    def add_rows(self, rows: List[dict]) -> None:
+        self._grouped.add_rows(rows)
+
+    @property
+    def counts(self) -> dict:
+        return self._grouped.counts().get(0, dict.fromkeys(COUNT_FIELDS, 0))
+
+    def to_stats(self, entity_id: str | int, entity_name: str) -> MetricStats:
+        return _stats_from_counts(self.counts, entity_id, entity_name)
+
+
+def _date_bounds(
+    start_date: Optional[str], end_date: Optional[str]
+) -> tuple[Optional[str], Optional[str]]:
+    """Convierte fechas YYYY-MM-DD en los límites de created_at (inclusive)."""
+    start = f"{start_date}T00:00:00" if start_date else None
+    end = f"{end_date}T23:59:59" if end_date else None
+    return start, end
+
+
+def get_base_query(
+    start_date: Optional[str], end_date: Optional[str], columns: str = SCAN_COLUMNS
+):
     """Helper para iniciar la query de atenciones con filtros de fecha"""
-    query = supabase.table("ClinicalAttention").select(
-        "id, created_at, applies_urgency_law, ai_result, "
-        "pertinencia, resident_doctor_id, "
-        "resident_doctor:resident_doctor_id(first_name, last_name), "
-        "patient:patient_id(insurance_company_id)"
-    )
+    query = supabase.table("ClinicalAttention").select(columns)
 
-    if start_date:
-        query = query.gte("created_at", f"{start_date}T00:00:00")
-    if end_date:
-        query = query.lte("created_at", f"{end_date}T23:59:59")
+    start, end = _date_bounds(start_date, end_date)
+    if start:
+        query = query.gte("created_at", start)
+    if end:
+        query = query.lte("created_at", end)
 
     return query
 
 
-# --- USER METRICS ---
+def _scan_stats(build_query, accumulator: StatsAccumulator) -> StatsAccumulator:
+    """Recorre la query en bloques (keyset) sumando conteos al acumulador."""
+    for rows in scan_rows(build_query):
+        accumulator.add_rows(rows)
+    return accumulator
 
 
-def get_all_users_metrics(
+def _use_rollup() -> bool:
+    # El backend duckdb responde las mismas consultas del rollup localmente
+    return settings.METRICS_BACKEND in ("rollup", "duckdb")
+
+
+def _use_snapshot() -> bool:
+    return settings.METRICS_BACKEND == "duckdb"
+
+
+def _rollup_rpc(name: str, params: dict) -> List[dict]:
+    """Llama una RPC metrics_rollup_* en Supabase o en el snapshot DuckDB."""
+    if _use_snapshot():
+        return snapshot_service.rollup_rpc(name, params)
+    return supabase.rpc(name, params).execute().data or []
+
+
+def _rollup_counts(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    resident_doctor_id: Optional[str] = None,
+    insurance_company_id: Optional[int] = None,
+) -> dict:
+    """Suma las filas del rollup diario que cumplen los filtros (RPC)."""
+    data = _rollup_rpc(
+        "metrics_rollup_counts",
+        {
+            "p_start": start_date,
+            "p_end": end_date,
+            "p_resident_doctor_id": resident_doctor_id,
+            "p_insurance_company_id": insurance_company_id,
+        },
+    )
+    return data[0] if data else {}
+
+
+def rebuild_rollup(
     start_date: Optional[str] = None, end_date: Optional[str] = None
-) -> List[MetricStats]:
+) -> int:
     """
-    1. Obtiene TODOS los usuarios activos (Médicos/Supervisores) de la tabla User.
-    2. Obtiene TODAS las atenciones en el rango de fechas.
-    3. Mapea atenciones a usuarios y calcula stats (incluyendo
-       los que tienen 0 episodios).
+    Recalcula el rollup diario de métricas para el rango (o completo).
+    Retorna la cantidad de filas de rollup generadas.
     """
+    response = supabase.rpc(
+        "rebuild_metrics_rollup", {"p_start": start_date, "p_end": end_date}
+    ).execute()
+    invalidate_metrics_cache()
+    return response.data or 0
+
 
-    # 1. Obtener lista base de usuarios (Solo Residentes y Supervisores activos)
-    users_resp = (
-        supabase.table("User")
-        .select("id, first_name, last_name, role")
-        .eq("is_deleted", False)
-        .execute()
+# --- USER METRICS ---
+
+
+def get_all_users_metrics(
+    start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> List[MetricStats]:
+    return _metrics_cache.get_or_compute(
+        ("users", None, start_date, end_date),
+        lambda: _compute_all_users_metrics(start_date, end_date),
     )
-    all_users = users_resp.data or []
 
-    # Inicializar estructura de agrupación para TODOS los usuarios con lista vacía
-    grouped = {}
-    for u in all_users:
-        uid = u["id"]
-        full_name = f"{u.get('first_name', '')} {u.get('last_name', '')}".strip()
-        grouped[uid] = {"name": full_name, "rows": []}
 
-    # 2. Obtener atenciones
-    query = get_base_query(start_date, end_date)
-    response = query.execute()
-    attentions = response.data or []
+def get_single_user_metrics(
+    user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> MetricStats:
+    return _metrics_cache.get_or_compute(
+        ("user", user_id, start_date, end_date),
+        lambda: _compute_single_user_metrics(user_id, start_date, end_date),
+    )
 
-    # 3. Asignar atenciones a cada usuario
-    for row in attentions:
-        doc_id = row.get("resident_doctor_id")
 
-        # Si el doctor existe en nuestra lista base, agregamos la fila
-        if doc_id and doc_id in grouped:
-            grouped[doc_id]["rows"].append(row)
+def _compute_all_users_metrics(
+    start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> List[MetricStats]:
+    """
+    Métricas de TODOS los usuarios activos (incluyendo los que tienen 0
+    episodios).
+
+    Los conteos se agregan en Postgres con un GROUP BY por residente, sobre el
+    rollup diario (`metrics_rollup_user_counts`) o sobre las atenciones
+    (`metrics_user_counts`), así que solo viaja una fila por usuario.
+    """
+    if _use_rollup():
+        data = _rollup_rpc(
+            "metrics_rollup_user_counts", {"p_start": start_date, "p_end": end_date}
+        )
+    else:
+        start, end = _date_bounds(start_date, end_date)
+        data = (
+            supabase.rpc("metrics_user_counts", {"p_start": start, "p_end": end})
+            .execute()
+            .data
+        )
 
-    # 4. Calcular métricas finales (esto incluirá a usuarios con 0 atenciones)
     results = []
-    for doc_id, info in grouped.items():
-        stats = _process_rows_to_stats(info["rows"], doc_id, info["name"])
-        results.append(stats)
+    for row in data or []:
+        full_name = f"{row.get('first_name') or ''} {row.get('last_name') or ''}"
+        results.append(_stats_from_counts(row, row["id"], full_name.strip()))
 
     # Ordenar por nombre para presentación limpia
     results.sort(key=lambda x: x.name)
@@ -131,7 +253,7 @@ def get_all_users_metrics(
     return results
 
 
-def get_single_user_metrics(
+def _compute_single_user_metrics(
     user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None
 ) -> MetricStats:
     """
@@ -140,88 +262,505 @@ def get_single_user_metrics(
 
     # 1. Primero obtener información del usuario para asegurar el Nombre correcto
     #    independientemente de si tiene atenciones o no.
-    user_resp = (
-        supabase.table("User")
-        .select("first_name, last_name")
-        .eq("id", user_id)
-        .execute()
-    )
+    user_name = _entity_names("users", {user_id}).get(user_id, "Usuario Desconocido")
 
-    user_name = "Usuario Desconocido"
-    if user_resp.data and len(user_resp.data) > 0:
-        first_name = user_resp.data[0].get("first_name", "")
-        last_name = user_resp.data[0].get("last_name", "")
-        user_name = f"{first_name} {last_name}".strip()
+    # 2. Sumar el rollup diario del usuario
+    if _use_rollup():
+        counts = _rollup_counts(start_date, end_date, resident_doctor_id=user_id)
+        return _stats_from_counts(counts, user_id, user_name)
 
-    # 2. Obtener atenciones
-    query = get_base_query(start_date, end_date).eq("resident_doctor_id", user_id)
-    response = query.execute()
-    data = response.data or []
+    # 2b. Sin rollup: recorrer atenciones en bloques (sin truncar en max-rows)
+    accumulator = _scan_stats(
+        lambda: get_base_query(start_date, end_date).eq("resident_doctor_id", user_id),
+        StatsAccumulator(),
+    )
 
-    # 3. Procesar (incluso si data es [], devolverá stats en 0 con el nombre correcto)
-    return _process_rows_to_stats(data, user_id, user_name)
+    # 3. Procesar (incluso sin atenciones, devolverá stats en 0 con el nombre)
+    return accumulator.to_stats(user_id, user_name)
 
 
 # --- INSURANCE METRICS ---
 
 
+def get_all_insurance_metrics(
+    start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> List[MetricStats]:
+    return _metrics_cache.get_or_compute(
+        ("insurances", None, start_date, end_date),
+        lambda: _compute_all_insurance_metrics(start_date, end_date),
+    )
+
+
 def get_insurance_metrics(
     company_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None
 ) -> MetricStats:
-    # PASO 1: Obtener la aseguradora para el nombre
-    company_resp = (
-        supabase.table("insurance_company")
-        .select("nombre_juridico")
-        .eq("id", company_id)
-        .execute()
+    return _metrics_cache.get_or_compute(
+        ("insurance", company_id, start_date, end_date),
+        lambda: _compute_insurance_metrics(company_id, start_date, end_date),
     )
 
+
+def _compute_all_insurance_metrics(
+    start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> List[MetricStats]:
+    """
+    Métricas de TODAS las aseguradoras (incluyendo las que tienen 0 episodios)
+    en una sola pasada. La agrupación se hace en Postgres a través del join
+    con Patient.
+    """
+    if _use_rollup():
+        data = _rollup_rpc(
+            "metrics_rollup_insurance_counts",
+            {"p_start": start_date, "p_end": end_date},
+        )
+    else:
+        start, end = _date_bounds(start_date, end_date)
+        data = (
+            supabase.rpc("metrics_insurance_counts", {"p_start": start, "p_end": end})
+            .execute()
+            .data
+        )
+
+    results = [
+        _stats_from_counts(row, row["id"], row.get("nombre_juridico") or "Desconocida")
+        for row in data or []
+    ]
+    results.sort(key=lambda x: x.name)
+    return results
+
+
+def _compute_insurance_metrics(
+    company_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> MetricStats:
+    # PASO 1: Obtener la aseguradora para el nombre
     # Si la aseguradora no existe o falla
-    company_name = "Desconocida"
-    if company_resp.data and len(company_resp.data) > 0:
-        company_name = company_resp.data[0].get("nombre_juridico")
-
-    # PASO 2: Obtener todos los IDs de pacientes que pertenecen a esta aseguradora
-    patients_resp = (
-        supabase.table("Patient")
-        .select("id")
-        .eq("insurance_company_id", company_id)
-        .execute()
+    company_name = _entity_names("insurance_companies", {str(company_id)}).get(
+        str(company_id), "Desconocida"
+    )
+
+    # PASO 2: Sumar el rollup diario de la aseguradora
+    if _use_rollup():
+        counts = _rollup_counts(start_date, end_date, insurance_company_id=company_id)
+        return _stats_from_counts(counts, company_id, company_name)
+
+    # PASO 2b: Sin rollup, recorrer las atenciones filtrando por la aseguradora
+    # del paciente con un inner join (sin listas de IDs de pacientes).
+    accumulator = _scan_stats(
+        lambda: get_base_query(
+            start_date,
+            end_date,
+            columns=f"{SCAN_COLUMNS}, patient:patient_id!inner(insurance_company_id)",
+        ).eq("patient.insurance_company_id", company_id),
+        StatsAccumulator(),
+    )
+
+    # PASO 3: Procesar estadísticas
+    return accumulator.to_stats(company_id, company_name)
+
+
+# --- SERIES ---
+
+
+def _bucket_start(day: date, bucket: str) -> date:
+    """Inicio del bucket que contiene `day` (semanas ISO, desde el lunes)."""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _iter_buckets(start: date, end: date, bucket: str) -> Iterator[date]:
+    current = _bucket_start(start, bucket)
+    while current <= end:
+        yield current
+        if bucket == "week":
+            current += timedelta(days=7)
+        elif bucket == "month":
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=1)
+
+
+def _row_day(created_at: str) -> date:
+    """Día UTC de un created_at (mismo criterio que el rollup)."""
+    moment = datetime.fromisoformat(created_at)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def _series_scan_query(
+    scope: str,
+    ids: Optional[List[str]],
+    start_date: Optional[str],
+    end_date: Optional[str],
+):
+    if scope == "users":
+        query = get_base_query(
+            start_date, end_date, columns=f"{SCAN_COLUMNS}, resident_doctor_id"
+        )
+        return query.in_("resident_doctor_id", ids) if ids else query
+
+    query = get_base_query(
+        start_date,
+        end_date,
+        columns=f"{SCAN_COLUMNS}, patient:patient_id!inner(insurance_company_id)",
+    )
+    return query.in_("patient.insurance_company_id", ids) if ids else query
+
+
+def _series_entity(row: dict, scope: str) -> Optional[str]:
+    if scope == "users":
+        entity = row.get("resident_doctor_id")
+    else:
+        entity = (row.get("patient") or {}).get("insurance_company_id")
+    return str(entity) if entity is not None else None
+
+
+def _scan_series_counts(
+    scope: str,
+    bucket: str,
+    ids: Optional[List[str]],
+    start_date: Optional[str],
+    end_date: Optional[str],
+) -> dict:
+    """
+    Sin rollup: una sola pasada keyset sobre las atenciones, acumulando
+    conteos por (bucket, entidad).
+    """
+    grouped = GroupedCounts()
+
+    def group_of(row: dict):
+        entity = _series_entity(row, scope)
+        if entity is None:
+            return None
+        return (_bucket_start(_row_day(row["created_at"]), bucket), entity)
+
+    for rows in scan_rows(lambda: _series_scan_query(scope, ids, start_date, end_date)):
+        grouped.add_rows(rows, group_of)
+    return grouped.counts()
+
+
+def _entity_names(scope: str, entity_ids: set) -> dict:
+    """{id (texto): nombre} de usuarios o aseguradoras."""
+    ids = sorted(entity_ids)
+    if _use_snapshot():
+        return snapshot_service.entity_names(scope, ids)
+
+    names = {}
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        batch = ids[start : start + ID_BATCH_SIZE]
+        if scope == "users":
+            response = (
+                supabase.table("User")
+                .select("id, first_name, last_name")
+                .in_("id", batch)
+                .execute()
+            )
+            for u in response.data or []:
+                full_name = f"{u.get('first_name') or ''} {u.get('last_name') or ''}"
+                names[str(u["id"])] = full_name.strip()
+        else:
+            response = (
+                supabase.table("insurance_company")
+                .select("id, nombre_juridico")
+                .in_("id", batch)
+                .execute()
+            )
+            for c in response.data or []:
+                names[str(c["id"])] = c.get("nombre_juridico")
+    return names
+
+
+def _series_ids(scope: str, ids: List[str]) -> List[str]:
+    """IDs del filtro de la serie, validados y sin repetir."""
+    normalized = set()
+    for raw in ids:
+        value = str(raw).strip()
+        try:
+            if scope == "users":
+                normalized.add(str(UUID(value)))
+            else:
+                normalized.add(str(int(value)))
+        except ValueError:
+            kind = "usuario" if scope == "users" else "aseguradora"
+            raise ValueError(f"ID de {kind} inválido: {value!r}") from None
+    return sorted(normalized)
+
+
+def get_metrics_series(
+    scope: str,
+    bucket: str,
+    ids: Optional[List[str]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> MetricSeriesResponse:
+    """
+    Serie de métricas por bucket. Lanza ValueError (400 en el endpoint) si
+    algún ID no es un UUID de usuario o un ID numérico de aseguradora.
+    """
+    ids = _series_ids(scope, ids) if ids else None
+    return _metrics_cache.get_or_compute(
+        (f"series:{scope}:{bucket}", tuple(ids or ()), start_date, end_date),
+        lambda: _compute_metrics_series(scope, bucket, ids, start_date, end_date),
     )
 
-    patient_ids = [p["id"] for p in (patients_resp.data or [])]
-
-    # Si la aseguradora no tiene pacientes, retornamos métricas en 0 inmediatamente
-    if not patient_ids:
-        return MetricStats(
-            id=company_id,
-            name=company_name,
-            total_episodes=0,
-            total_urgency_law=0,
-            percent_urgency_law_rejected=0.0,
-            total_ai_yes=0,
-            percent_ai_yes_rejected=0.0,
-            total_ai_no_medic_yes=0,
-            percent_ai_no_medic_yes_rejected=0.0,
+
+def _compute_metrics_series(
+    scope: str,
+    bucket: str,
+    ids: Optional[List[str]],
+    start_date: Optional[str],
+    end_date: Optional[str],
+) -> MetricSeriesResponse:
+    """
+    MetricStats por bucket de created_at (día, semana o mes) para los
+    usuarios o aseguradoras seleccionados (o todos). Todos los buckets salen
+    de una sola consulta al rollup (o de un solo scan), no de una consulta
+    por bucket.
+    """
+    if _use_rollup():
+        data = _rollup_rpc(
+            "metrics_rollup_series",
+            {
+                "p_bucket": bucket,
+                "p_scope": scope,
+                "p_start": start_date,
+                "p_end": end_date,
+                "p_ids": ids,
+            },
         )
+        counts_by_key = {
+            (date.fromisoformat(row["bucket_start"]), row["entity_id"]): row
+            for row in data
+        }
+    else:
+        counts_by_key = _scan_series_counts(scope, bucket, ids, start_date, end_date)
+
+    entity_ids = set(ids or ()) | {entity for _, entity in counts_by_key}
+    names = _entity_names(scope, entity_ids)
+    default_name = "Usuario Desconocido" if scope == "users" else "Desconocida"
+
+    # Con rango completo se incluyen también los buckets sin episodios
+    if start_date and end_date:
+        buckets = list(
+            _iter_buckets(
+                date.fromisoformat(start_date), date.fromisoformat(end_date), bucket
+            )
+        )
+    else:
+        buckets = sorted({bucket_start for bucket_start, _ in counts_by_key})
 
-    # PASO 3: Buscar las atenciones clínicas que pertenezcan a esos pacientes
-    query = (
-        supabase.table("ClinicalAttention")
-        .select(
-            "id, created_at, applies_urgency_law, "
-            "ai_result, pertinencia, resident_doctor_id"
+    points = []
+    for bucket_start in buckets:
+        bucket_entities = ids or sorted(
+            entity for b, entity in counts_by_key if b == bucket_start
         )
-        .in_("patient_id", patient_ids)
+        metrics = []
+        for entity in bucket_entities:
+            entity_id = int(entity) if scope != "users" else entity
+            metrics.append(
+                _stats_from_counts(
+                    counts_by_key.get((bucket_start, entity), {}),
+                    entity_id,
+                    names.get(entity) or default_name,
+                )
+            )
+        points.append(MetricSeriesPoint(bucket_start=bucket_start, metrics=metrics))
+
+    return MetricSeriesResponse(
+        scope=scope,
+        bucket=bucket,
+        start_date=start_date,
+        end_date=end_date,
+        points=points,
     )
 
-    if start_date:
-        query = query.gte("created_at", f"{start_date}T00:00:00")
-    if end_date:
-        query = query.lte("created_at", f"{end_date}T23:59:59")
 
-    response = query.execute()
-    data = response.data or []
+# --- AGREEMENT (IA vs. aseguradora) ---
+
+
+def get_agreement_metrics(
+    group_by: str,
+    bucket: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> AgreementResponse:
+    return _metrics_cache.get_or_compute(
+        (f"agreement:{group_by}:{bucket}", None, start_date, end_date),
+        lambda: _compute_agreement_metrics(group_by, bucket, start_date, end_date),
+    )
+
+
+def _ratio(part: int, total: int) -> Optional[float]:
+    if total == 0:
+        return None
+    return round(part / total, 3)
+
+
+def _agreement_cells(
+    group_by: str,
+    bucket: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+) -> List[dict]:
+    """Celdas (entidad, bucket, ai_result, pertinencia, decil) agregadas en SQL."""
+    if _use_rollup():
+        return _rollup_rpc(
+            "metrics_rollup_agreement",
+            {
+                "p_scope": group_by,
+                "p_bucket": bucket,
+                "p_start": start_date,
+                "p_end": end_date,
+            },
+        )
+
+    start, end = _date_bounds(start_date, end_date)
+    response = supabase.rpc(
+        "metrics_agreement",
+        {"p_scope": group_by, "p_bucket": bucket, "p_start": start, "p_end": end},
+    ).execute()
+    return response.data or []
 
-    # PASO 4: Procesar estadísticas
-    return _process_rows_to_stats(data, company_id, company_name)
+
+def _agreement_stats(
+    cubes_by_bin: dict, confidence_sums: dict, entity_id, name, bucket_start
+) -> AgreementStats:
+    """
+    Arma un AgreementStats a partir de los cubos de conteo de cada decil
+    (None = sin confianza) de una entidad/bucket.
+    """
+    bins = list(cubes_by_bin)
+    confusion_rows = cubes_to_confusion(
+        np.stack([cubes_by_bin[b] for b in bins])
+    ).tolist()
+    by_bin = {
+        b: dict(zip(CONFUSION_FIELDS, row)) for b, row in zip(bins, confusion_rows)
+    }
+    confusion = {
+        field: sum(row[field] for row in by_bin.values()) for field in CONFUSION_FIELDS
+    }
+
+    tp, fp = confusion["true_positive"], confusion["false_positive"]
+    fn, tn = confusion["false_negative"], confusion["true_negative"]
+    decided = tp + fp + fn + tn
+
+    calibration = []
+    calibration_error = 0.0
+    calibrated = 0
+    for index in range(CALIBRATION_BINS):
+        row = by_bin.get(index, dict.fromkeys(CONFUSION_FIELDS, 0))
+        bin_decided = (
+            row["true_positive"]
+            + row["false_positive"]
+            + row["false_negative"]
+            + row["true_negative"]
+        )
+        agreed = row["true_positive"] + row["true_negative"]
+        mean_confidence = (
+            confidence_sums.get(index, 0.0) / bin_decided if bin_decided else None
+        )
+        agreement_rate = _ratio(agreed, bin_decided)
+        if bin_decided:
+            calibration_error += bin_decided * abs(
+                agreed / bin_decided - mean_confidence
+            )
+            calibrated += bin_decided
+        calibration.append(
+            CalibrationBin(
+                lower=index / CALIBRATION_BINS,
+                upper=(index + 1) / CALIBRATION_BINS,
+                episodes=bin_decided,
+                mean_confidence=(
+                    round(mean_confidence, 3) if mean_confidence is not None else None
+                ),
+                agreement_rate=agreement_rate,
+            )
+        )
+
+    return AgreementStats(
+        id=entity_id,
+        name=name,
+        bucket_start=bucket_start,
+        confusion=ConfusionMatrix(**confusion),
+        precision=_ratio(tp, tp + fp),
+        recall=_ratio(tp, tp + fn),
+        accuracy=_ratio(tp + tn, decided),
+        calibration=calibration,
+        expected_calibration_error=(
+            round(calibration_error / calibrated, 3) if calibrated else None
+        ),
+    )
+
+
+def _compute_agreement_metrics(
+    group_by: str,
+    bucket: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+) -> AgreementResponse:
+    """
+    Concordancia de la IA (ai_result, ai_confidence) con la pertinencia de la
+    aseguradora por residente, aseguradora o global, opcionalmente por bucket
+    de fecha. Postgres agrega las celdas; el kernel de conteos arma los cubos
+    y de ahí salen la matriz de confusión, precision/recall y la calibración.
+    """
+    cells = _agreement_cells(group_by, bucket, start_date, end_date)
+
+    grouped = GroupedCounts()
+    confidence_sums: dict = {}
+    n = len(cells)
+    if n:
+        keys = [
+            (c["entity_id"], c.get("bucket_start"), c.get("confidence_bin"))
+            for c in cells
+        ]
+        grouped.add_columns(
+            grouped.encode_keys(keys, n),
+            np.zeros(n, dtype=np.int8),
+            encode_tristate((c.get("ai_result") for c in cells), n),
+            encode_tristate((c.get("pertinencia") for c in cells), n),
+            weights=np.array([c["episodes"] for c in cells], dtype=np.float64),
+        )
+        # La confianza media de cada decil solo considera episodios decididos
+        for (entity, bucket_start, confidence_bin), c in zip(keys, cells):
+            if c.get("ai_result") is None or c.get("pertinencia") is None:
+                continue
+            sums = confidence_sums.setdefault((entity, bucket_start), {})
+            sums[confidence_bin] = sums.get(confidence_bin, 0.0) + (
+                c.get("confidence_sum") or 0.0
+            )
+
+    groups: dict = {}
+    for (entity, bucket_start, confidence_bin), cube in grouped.cubes().items():
+        groups.setdefault((entity, bucket_start), {})[confidence_bin] = cube
+
+    if group_by == "all":
+        names = {"all": "Todas"}
+    else:
+        names = _entity_names(group_by, {entity for entity, _ in groups})
+    default_name = "Usuario Desconocido" if group_by == "users" else "Desconocida"
+
+    metrics = []
+    for (entity, bucket_start), cubes_by_bin in groups.items():
+        entity_id = int(entity) if group_by == "insurance_companies" else entity
+        metrics.append(
+            _agreement_stats(
+                cubes_by_bin,
+                confidence_sums.get((entity, bucket_start), {}),
+                entity_id if group_by != "all" else None,
+                names.get(entity) or default_name,
+                date.fromisoformat(bucket_start) if bucket_start else None,
+            )
+        )
+    metrics.sort(key=lambda m: (m.name or "", m.bucket_start or date.min))
+
+    return AgreementResponse(
+        group_by=group_by,
+        bucket=bucket,
+        start_date=start_date,
+        end_date=end_date,
+        metrics=metrics,
+    )
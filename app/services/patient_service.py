@@ -3,6 +3,7 @@ from uuid import UUID
 
 from app.core.supabase_client import supabase
 from app.schemas.patient import PatientCreate, PatientUpdate
+from app.services import episode_service, metric_service
 
 
 def list_patients(
@@ -144,6 +145,11 @@ def update_patient(patient_id: UUID, payload: PatientUpdate) -> dict:
         if not response.data:
             raise Exception("No se pudo actualizar el paciente")
 
+        # Los episodios y las métricas cacheadas dependen de la aseguradora
+        if "insurance_company_id" in update_data:
+            episode_service.clear_episode_cache()
+            metric_service.invalidate_metrics_cache()
+
         return response.data[0]
     except Exception as e:
         print(f"Error updating patient: {e}")
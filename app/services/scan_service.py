@@ -0,0 +1,45 @@
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+def scan_rows(
+    build_query: Callable[[], Any],
+    chunk_size: int | None = None,
+    order_column: str = "created_at",
+    start_after: Optional[Tuple[Any, Any]] = None,
+) -> Iterator[List[dict]]:
+    """
+    Recorre una consulta de PostgREST en bloques de tamaño fijo usando keyset
+    pagination sobre (order_column, id).
+
+    `build_query` debe devolver una query NUEVA (con select y filtros, sin
+    order/range) cada vez que se llama; el select debe incluir `order_column`
+    e `id`. A diferencia de un solo `.execute()`, el resultado no se trunca en el
+    `max-rows` de PostgREST y solo un bloque vive en memoria a la vez.
+
+    `start_after` = (order_column, id) retoma el recorrido después de esa
+    fila (p. ej. desde un checkpoint).
+    """
+    chunk_size = chunk_size or settings.SCAN_CHUNK_SIZE
+    last_key = start_after
+
+    while True:
+        query = build_query()
+        if last_key is not None:
+            value, row_id = last_key
+            query = query.or_(
+                f'{order_column}.gt."{value}",'
+                f'and({order_column}.eq."{value}",id.gt.{row_id})'
+            )
+        query = query.order(order_column).order("id").limit(chunk_size)
+
+        rows = query.execute().data or []
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < chunk_size:
+            return
+        last_key = (rows[-1][order_column], rows[-1]["id"])
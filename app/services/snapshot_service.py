@@ -0,0 +1,360 @@
+"""
+Snapshot columnar local (Parquet) de las tablas de métricas y motor DuckDB
+embebido sobre él.
+
+`sync_snapshot()` copia ClinicalAttention, Patient, User e insurance_company a
+`SNAPSHOT_DIR/<tabla>.parquet`, solo con las columnas que usan las métricas
+(SNAPSHOT_TABLES: nada de RUT, correos ni diagnósticos), de forma
+incremental por `updated_at` (keyset sobre (updated_at, id)), y se programa
+con cron o similar:
+
+    */15 * * * * poetry run python -m app.cli snapshot-sync
+
+Con `METRICS_BACKEND=duckdb`, metric_service responde las mismas consultas
+que el rollup de Postgres (`metrics_rollup_*`) con DuckDB sobre esos
+archivos, sin conexión a Supabase.
+
+pyarrow y duckdb se importan solo al usar este módulo, así el resto de la API
+no paga su carga.
+"""
+
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.supabase_client import supabase
+from app.services.scan_service import scan_rows
+
+# Columnas copiadas por tabla: las que leen ROLLUP_VIEW, ROLLUP_QUERIES y
+# entity_names, más id y updated_at para la sync. Los archivos locales no
+# están cifrados, así que no se copia ningún otro dato de pacientes o usuarios
+SNAPSHOT_TABLES = {
+    "ClinicalAttention": (
+        "id",
+        "updated_at",
+        "created_at",
+        "patient_id",
+        "resident_doctor_id",
+        "applies_urgency_law",
+        "ai_result",
+        "ai_confidence",
+        "pertinencia",
+    ),
+    "Patient": ("id", "updated_at", "insurance_company_id"),
+    "User": ("id", "updated_at", "first_name", "last_name", "is_deleted"),
+    "insurance_company": ("id", "updated_at", "nombre_juridico"),
+}
+
+STATE_FILE = "_state.json"
+
+# Columnas que se guardan como timestamp UTC (sin zona) en vez de texto
+TIMESTAMP_COLUMNS = ("created_at", "updated_at", "closed_at", "deleted_at")
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError(
+            "El snapshot Parquet requiere pyarrow (pip install pyarrow)"
+        ) from e
+    return pa, pc, pq
+
+
+def _snapshot_dir() -> Path:
+    return Path(settings.SNAPSHOT_DIR)
+
+
+def _table_path(table: str) -> Path:
+    return _snapshot_dir() / f"{table}.parquet"
+
+
+def _load_state() -> dict:
+    path = _snapshot_dir() / STATE_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def _save_state(state: dict) -> None:
+    path = _snapshot_dir() / STATE_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, path)
+
+
+def _to_arrow(rows: List[dict]):
+    """Filas de PostgREST -> tabla Arrow, con los timestamps ya parseados."""
+    pa, pc, _ = _arrow()
+    table = pa.Table.from_pylist(rows)
+    for name in TIMESTAMP_COLUMNS:
+        index = table.schema.get_field_index(name)
+        if index < 0 or not pa.types.is_string(table.schema.field(index).type):
+            continue
+        try:
+            parsed = pc.cast(table[name], pa.timestamp("us", tz="UTC"))
+        except pa.ArrowInvalid:
+            continue
+        table = table.set_column(
+            index, name, parsed.cast(pa.timestamp("us"))  # UTC sin zona
+        )
+    return table
+
+
+def sync_table(table: str, full: bool = False) -> int:
+    """
+    Trae las filas de `table` con updated_at >= última sync (menos
+    SNAPSHOT_OVERLAP_SECONDS) y las fusiona por `id` en su archivo Parquet.
+    Retorna la cantidad de filas traídas.
+
+    Las filas borradas físicamente solo desaparecen con `full=True`; las
+    tablas de la app usan borrado lógico (is_deleted), que sí se propaga.
+    """
+    pa, pc, pq = _arrow()
+    path = _table_path(table)
+    state = _load_state()
+    columns = SNAPSHOT_TABLES[table]
+
+    since = None
+    if not full and path.exists() and state.get(table):
+        watermark = datetime.fromisoformat(state[table])
+        since = (
+            watermark - timedelta(seconds=settings.SNAPSHOT_OVERLAP_SECONDS)
+        ).isoformat()
+
+    def build_query():
+        query = supabase.table(table).select(", ".join(columns))
+        if since:
+            query = query.gte("updated_at", since)
+        return query
+
+    chunks = []
+    last_updated_at = None
+    for rows in scan_rows(build_query, order_column="updated_at"):
+        chunks.append(_to_arrow(rows))
+        last_updated_at = rows[-1]["updated_at"]
+
+    if not chunks:
+        return 0
+
+    delta = pa.concat_tables(chunks, promote_options="permissive")
+    if since is not None:
+        # Archivos de versiones anteriores pueden traer más columnas
+        current = pq.read_table(path)
+        current = current.select([c for c in current.column_names if c in columns])
+        unchanged = current.filter(
+            pc.invert(pc.is_in(current["id"], value_set=delta["id"]))
+        )
+        merged = pa.concat_tables([unchanged, delta], promote_options="permissive")
+    else:
+        merged = delta
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(merged, tmp)
+    os.replace(tmp, path)
+
+    state[table] = last_updated_at
+    _save_state(state)
+    return delta.num_rows
+
+
+def sync_snapshot(full: bool = False) -> dict:
+    """Sincroniza todas las tablas del snapshot. Retorna filas traídas por tabla."""
+    return {table: sync_table(table, full=full) for table in SNAPSHOT_TABLES}
+
+
+# --- MOTOR DUCKDB ---
+
+# Mismas columnas que metrics_daily_rollup, una fila por atención
+ROLLUP_VIEW = """
+create view metrics_daily_rollup as
+select
+    cast(ca.created_at as date) as day,
+    ca.resident_doctor_id,
+    p.insurance_company_id,
+    ca.applies_urgency_law,
+    ca.ai_result,
+    ca.pertinencia,
+    case
+        when ca.ai_confidence is null then null
+        else least(greatest(floor(ca.ai_confidence * 10), 0), 9)::smallint
+    end as confidence_bin,
+    1 as episodes,
+    coalesce(ca.ai_confidence, 0) as confidence_sum
+from "ClinicalAttention" ca
+left join "Patient" p on p.id = ca.patient_id
+"""
+
+_COUNTS = """
+    coalesce(sum(r.episodes), 0) as total_episodes,
+    coalesce(sum(r.episodes) filter (
+        where r.applies_urgency_law is true
+    ), 0) as total_urgency_law,
+    coalesce(sum(r.episodes) filter (
+        where r.applies_urgency_law is true and r.pertinencia is false
+    ), 0) as urgency_law_rejected,
+    coalesce(sum(r.episodes) filter (
+        where r.ai_result is true
+    ), 0) as total_ai_yes,
+    coalesce(sum(r.episodes) filter (
+        where r.ai_result is true and r.pertinencia is false
+    ), 0) as ai_yes_rejected,
+    coalesce(sum(r.episodes) filter (
+        where r.ai_result is false and r.applies_urgency_law is true
+    ), 0) as total_ai_no_medic_yes,
+    coalesce(sum(r.episodes) filter (
+        where r.ai_result is false
+          and r.applies_urgency_law is true
+          and r.pertinencia is false
+    ), 0) as ai_no_medic_yes_rejected
+"""
+
+_IN_RANGE = """
+    (cast($p_start as date) is null or r.day >= cast($p_start as date))
+    and (cast($p_end as date) is null or r.day <= cast($p_end as date))
+"""
+
+_ENTITY = """
+    case $p_scope
+        when 'users' then cast(r.resident_doctor_id as varchar)
+        when 'insurance_companies' then cast(r.insurance_company_id as varchar)
+        else 'all'
+    end
+"""
+
+# Equivalentes DuckDB de las RPC metrics_rollup_* (mismos parámetros y filas)
+ROLLUP_QUERIES = {
+    "metrics_rollup_counts": f"""
+        select {_COUNTS}
+        from metrics_daily_rollup r
+        where {_IN_RANGE}
+          and (cast($p_resident_doctor_id as varchar) is null
+               or r.resident_doctor_id = $p_resident_doctor_id)
+          and (cast($p_insurance_company_id as bigint) is null
+               or r.insurance_company_id = $p_insurance_company_id)
+    """,
+    "metrics_rollup_user_counts": f"""
+        select u.id, u.first_name, u.last_name, {_COUNTS}
+        from "User" u
+        left join metrics_daily_rollup r
+            on r.resident_doctor_id = u.id and {_IN_RANGE}
+        where u.is_deleted = false
+        group by u.id, u.first_name, u.last_name
+    """,
+    "metrics_rollup_insurance_counts": f"""
+        select ic.id, ic.nombre_juridico, {_COUNTS}
+        from insurance_company ic
+        left join metrics_daily_rollup r
+            on r.insurance_company_id = ic.id and {_IN_RANGE}
+        group by ic.id, ic.nombre_juridico
+    """,
+    "metrics_rollup_series": f"""
+        select
+            cast(date_trunc($p_bucket, r.day) as date) as bucket_start,
+            {_ENTITY} as entity_id,
+            {_COUNTS}
+        from metrics_daily_rollup r
+        where {_IN_RANGE}
+          and {_ENTITY} is not null
+          and (cast($p_ids as varchar[]) is null
+               or list_contains(cast($p_ids as varchar[]), {_ENTITY}))
+        group by 1, 2
+        having sum(r.episodes) > 0
+        order by 1, 2
+    """,
+    "metrics_rollup_agreement": f"""
+        select
+            {_ENTITY} as entity_id,
+            case
+                when $p_bucket is null then null
+                else cast(date_trunc($p_bucket, r.day) as date)
+            end as bucket_start,
+            r.ai_result,
+            r.pertinencia,
+            r.confidence_bin,
+            sum(r.episodes) as episodes,
+            sum(r.confidence_sum) as confidence_sum
+        from metrics_daily_rollup r
+        where {_IN_RANGE}
+          and {_ENTITY} is not null
+        group by 1, 2, 3, 4, 5
+    """,
+}
+
+
+def connect():
+    """
+    Conexión DuckDB en memoria con una vista por tabla del snapshot y la
+    vista metrics_daily_rollup.
+    """
+    try:
+        import duckdb
+    except ImportError as e:
+        raise RuntimeError(
+            "METRICS_BACKEND=duckdb requiere duckdb (pip install duckdb)"
+        ) from e
+
+    con = duckdb.connect()
+    for table in SNAPSHOT_TABLES:
+        path = _table_path(table)
+        if not path.exists():
+            raise RuntimeError(
+                f"Falta el snapshot de {table}; ejecuta "
+                "`python -m app.cli snapshot-sync`"
+            )
+        escaped = str(path).replace("'", "''")
+        con.execute(
+            f"create view \"{table}\" as select * from read_parquet('{escaped}')"
+        )
+    con.execute(ROLLUP_VIEW)
+    return con
+
+
+def _jsonable(value):
+    # Mismos tipos que devuelve PostgREST (fechas como texto ISO)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def query(sql: str, params: Optional[dict] = None) -> List[dict]:
+    con = connect()
+    try:
+        cursor = con.execute(sql, params or {})
+        columns = [column[0] for column in cursor.description]
+        return [
+            {column: _jsonable(value) for column, value in zip(columns, row)}
+            for row in cursor.fetchall()
+        ]
+    finally:
+        con.close()
+
+
+def rollup_rpc(name: str, params: dict) -> List[dict]:
+    """Responde una RPC metrics_rollup_* desde el snapshot local."""
+    return query(ROLLUP_QUERIES[name], params)
+
+
+def entity_names(scope: str, ids: List[str]) -> dict:
+    """{id: nombre} de usuarios o aseguradoras desde el snapshot."""
+    if scope == "users":
+        sql = """
+            select cast(id as varchar) as id,
+                   trim(coalesce(first_name, '') || ' ' || coalesce(last_name, ''))
+                       as name
+            from "User"
+            where list_contains(cast($ids as varchar[]), cast(id as varchar))
+        """
+    else:
+        sql = """
+            select cast(id as varchar) as id, nombre_juridico as name
+            from insurance_company
+            where list_contains(cast($ids as varchar[]), cast(id as varchar))
+        """
+    return {row["id"]: row["name"] for row in query(sql, {"ids": list(ids)})}
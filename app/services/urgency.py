@@ -0,0 +1,31 @@
+"""
+Final urgency law verdict of an attention: the AI result as corrected by the
+resident and the supervisor. Shared by the attention service, the exports
+and the similar-case index.
+"""
+
+
+def compute_urgency_law(ai_result, medic_approved, supervisor_approved):
+    """
+    Compute the urgency law application based on AI result and approvals.
+
+    Logic:
+    - Start with ai_result
+    - If medic_approved is null, return null (pending)
+    - If medic_approved is True, keep ai_result; if False, invert it
+    - If supervisor_approved is False, invert the result again
+    """
+    if ai_result is None:
+        return None
+
+    does_urgency_law_apply = ai_result
+
+    if medic_approved is None:
+        does_urgency_law_apply = None
+    else:
+        does_urgency_law_apply = ai_result if medic_approved else not ai_result
+
+        if supervisor_approved is False:
+            does_urgency_law_apply = not does_urgency_law_apply
+
+    return does_urgency_law_apply
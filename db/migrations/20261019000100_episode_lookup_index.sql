@@ -0,0 +1,18 @@
+-- Índice de búsqueda por número de episodio (id_episodio).
+--
+-- Las importaciones de aseguradoras y las integraciones con el HIS resuelven
+-- atenciones por id_episodio. Cada sistema de origen tiene su propia
+-- numeración, así que la unicidad se define por (id_episodio, episode_source).
+--
+-- Antes de aplicar, verificar que no existan duplicados:
+--   select id_episodio, count(*) from "ClinicalAttention"
+--   where id_episodio is not null group by 1 having count(*) > 1;
+
+alter table "ClinicalAttention"
+    add column if not exists episode_source text not null default 'local';
+
+-- id_episodio va primero para que las búsquedas sin origen también sean
+-- index seeks.
+create unique index if not exists clinical_attention_episode_key
+    on "ClinicalAttention" (id_episodio, episode_source)
+    where id_episodio is not null;
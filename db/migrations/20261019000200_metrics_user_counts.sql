@@ -0,0 +1,60 @@
+-- Agregación de métricas por residente en el servidor.
+--
+-- Devuelve una fila de conteos por usuario (incluyendo los que no tienen
+-- atenciones en el rango). Python solo calcula los porcentajes finales.
+
+create or replace function metrics_user_counts(
+    p_start timestamptz default null,
+    p_end timestamptz default null
+)
+returns table (
+    id uuid,
+    first_name text,
+    last_name text,
+    total_episodes bigint,
+    total_urgency_law bigint,
+    urgency_law_rejected bigint,
+    total_ai_yes bigint,
+    ai_yes_rejected bigint,
+    total_ai_no_medic_yes bigint,
+    ai_no_medic_yes_rejected bigint
+)
+language sql
+stable
+as $$
+    select
+        u.id,
+        u.first_name,
+        u.last_name,
+        count(ca.id) as total_episodes,
+        count(ca.id) filter (
+            where ca.applies_urgency_law is true
+        ) as total_urgency_law,
+        count(ca.id) filter (
+            where ca.applies_urgency_law is true and ca.pertinencia is false
+        ) as urgency_law_rejected,
+        count(ca.id) filter (
+            where ca.ai_result is true
+        ) as total_ai_yes,
+        count(ca.id) filter (
+            where ca.ai_result is true and ca.pertinencia is false
+        ) as ai_yes_rejected,
+        count(ca.id) filter (
+            where ca.ai_result is false and ca.applies_urgency_law is true
+        ) as total_ai_no_medic_yes,
+        count(ca.id) filter (
+            where ca.ai_result is false
+              and ca.applies_urgency_law is true
+              and ca.pertinencia is false
+        ) as ai_no_medic_yes_rejected
+    from "User" u
+    left join "ClinicalAttention" ca
+        on ca.resident_doctor_id = u.id
+       and (p_start is null or ca.created_at >= p_start)
+       and (p_end is null or ca.created_at <= p_end)
+    where u.is_deleted = false
+    group by u.id, u.first_name, u.last_name;
+$$;
+
+create index if not exists clinical_attention_resident_created_at
+    on "ClinicalAttention" (resident_doctor_id, created_at);
@@ -0,0 +1,8 @@
+-- Índices para recorrer ClinicalAttention con keyset pagination sobre
+-- (created_at, id), con y sin filtro por residente o paciente.
+
+create index if not exists clinical_attention_created_at_id
+    on "ClinicalAttention" (created_at, id);
+
+create index if not exists clinical_attention_patient_created_at
+    on "ClinicalAttention" (patient_id, created_at, id);
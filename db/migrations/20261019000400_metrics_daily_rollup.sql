@@ -0,0 +1,325 @@
+-- Rollup diario de métricas.
+--
+-- Una fila por combinación (día, residente, aseguradora, applies_urgency_law,
+-- ai_result, veredicto calculado, pertinencia) con la cantidad de episodios.
+-- Los triggers lo mantienen al día con cada escritura de ClinicalAttention
+-- (creación, edición, resultado de la IA, importación de pertinencia) y con
+-- los cambios de aseguradora de un paciente. rebuild_metrics_rollup() lo
+-- recalcula para backfills (`python -m app.cli rebuild-rollup`).
+--
+-- Los días se calculan en UTC, igual que los filtros de fecha de la API.
+
+-- Mismo cálculo que clinical_attention_service._compute_urgency_law
+create or replace function compute_urgency_law(
+    p_ai_result boolean,
+    p_medic_approved boolean,
+    p_supervisor_approved boolean
+)
+returns boolean
+language sql
+immutable
+as $$
+    select case
+        when p_ai_result is null or p_medic_approved is null then null
+        else (case when p_medic_approved then p_ai_result else not p_ai_result end)
+             <> (p_supervisor_approved is false)
+    end;
+$$;
+
+create table if not exists metrics_daily_rollup (
+    day date not null,
+    resident_doctor_id uuid,
+    insurance_company_id bigint,
+    applies_urgency_law boolean,
+    ai_result boolean,
+    computed_verdict boolean,
+    pertinencia boolean,
+    episodes integer not null default 0,
+    constraint metrics_daily_rollup_key unique nulls not distinct (
+        day,
+        resident_doctor_id,
+        insurance_company_id,
+        applies_urgency_law,
+        ai_result,
+        computed_verdict,
+        pertinencia
+    )
+);
+
+create index if not exists metrics_daily_rollup_resident_day
+    on metrics_daily_rollup (resident_doctor_id, day);
+
+create index if not exists metrics_daily_rollup_insurer_day
+    on metrics_daily_rollup (insurance_company_id, day);
+
+
+create or replace function metrics_rollup_apply(
+    r "ClinicalAttention",
+    p_insurance_company_id bigint,
+    p_delta integer
+)
+returns void
+language sql
+as $$
+    insert into metrics_daily_rollup (
+        day,
+        resident_doctor_id,
+        insurance_company_id,
+        applies_urgency_law,
+        ai_result,
+        computed_verdict,
+        pertinencia,
+        episodes
+    )
+    values (
+        (r.created_at at time zone 'UTC')::date,
+        r.resident_doctor_id,
+        p_insurance_company_id,
+        r.applies_urgency_law,
+        r.ai_result,
+        compute_urgency_law(r.ai_result, r.medic_approved, r.supervisor_approved),
+        r.pertinencia,
+        p_delta
+    )
+    on conflict on constraint metrics_daily_rollup_key
+    do update set episodes = metrics_daily_rollup.episodes + excluded.episodes;
+$$;
+
+
+create or replace function metrics_rollup_attention_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform metrics_rollup_apply(
+            old,
+            (select insurance_company_id from "Patient" where id = old.patient_id),
+            -1
+        );
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform metrics_rollup_apply(
+            new,
+            (select insurance_company_id from "Patient" where id = new.patient_id),
+            1
+        );
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists clinical_attention_metrics_rollup_insert_delete
+    on "ClinicalAttention";
+create trigger clinical_attention_metrics_rollup_insert_delete
+    after insert or delete on "ClinicalAttention"
+    for each row execute function metrics_rollup_attention_trigger();
+
+drop trigger if exists clinical_attention_metrics_rollup_update
+    on "ClinicalAttention";
+create trigger clinical_attention_metrics_rollup_update
+    after update on "ClinicalAttention"
+    for each row
+    when (
+        (
+            old.created_at,
+            old.resident_doctor_id,
+            old.patient_id,
+            old.applies_urgency_law,
+            old.ai_result,
+            old.medic_approved,
+            old.supervisor_approved,
+            old.pertinencia
+        ) is distinct from (
+            new.created_at,
+            new.resident_doctor_id,
+            new.patient_id,
+            new.applies_urgency_law,
+            new.ai_result,
+            new.medic_approved,
+            new.supervisor_approved,
+            new.pertinencia
+        )
+    )
+    execute function metrics_rollup_attention_trigger();
+
+
+create or replace function metrics_rollup_patient_trigger()
+returns trigger
+language plpgsql
+as $$
+declare
+    r "ClinicalAttention";
+begin
+    for r in select * from "ClinicalAttention" where patient_id = new.id loop
+        perform metrics_rollup_apply(r, old.insurance_company_id, -1);
+        perform metrics_rollup_apply(r, new.insurance_company_id, 1);
+    end loop;
+    return null;
+end;
+$$;
+
+drop trigger if exists patient_metrics_rollup_update on "Patient";
+create trigger patient_metrics_rollup_update
+    after update of insurance_company_id on "Patient"
+    for each row
+    when (old.insurance_company_id is distinct from new.insurance_company_id)
+    execute function metrics_rollup_patient_trigger();
+
+
+-- Recalcula el rollup para un rango de días (o completo si no hay rango).
+-- Bloquea las escrituras del rollup mientras corre, así los triggers de
+-- transacciones concurrentes se aplican después del recálculo.
+create or replace function rebuild_metrics_rollup(
+    p_start date default null,
+    p_end date default null
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_rows integer;
+begin
+    lock table metrics_daily_rollup in share row exclusive mode;
+
+    delete from metrics_daily_rollup
+    where (p_start is null or day >= p_start)
+      and (p_end is null or day <= p_end);
+
+    insert into metrics_daily_rollup (
+        day,
+        resident_doctor_id,
+        insurance_company_id,
+        applies_urgency_law,
+        ai_result,
+        computed_verdict,
+        pertinencia,
+        episodes
+    )
+    select
+        (ca.created_at at time zone 'UTC')::date,
+        ca.resident_doctor_id,
+        p.insurance_company_id,
+        ca.applies_urgency_law,
+        ca.ai_result,
+        compute_urgency_law(ca.ai_result, ca.medic_approved, ca.supervisor_approved),
+        ca.pertinencia,
+        count(*)
+    from "ClinicalAttention" ca
+    left join "Patient" p on p.id = ca.patient_id
+    where (p_start is null or (ca.created_at at time zone 'UTC')::date >= p_start)
+      and (p_end is null or (ca.created_at at time zone 'UTC')::date <= p_end)
+    group by 1, 2, 3, 4, 5, 6, 7;
+
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
+
+
+-- KPIs sobre el rollup. Los filtros de conteo son los mismos que
+-- metrics_user_counts y metric_service._count_rows.
+
+create or replace function metrics_rollup_user_counts(
+    p_start date default null,
+    p_end date default null
+)
+returns table (
+    id uuid,
+    first_name text,
+    last_name text,
+    total_episodes bigint,
+    total_urgency_law bigint,
+    urgency_law_rejected bigint,
+    total_ai_yes bigint,
+    ai_yes_rejected bigint,
+    total_ai_no_medic_yes bigint,
+    ai_no_medic_yes_rejected bigint
+)
+language sql
+stable
+as $$
+    select
+        u.id,
+        u.first_name,
+        u.last_name,
+        coalesce(sum(r.episodes), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.applies_urgency_law is true and r.pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is true and r.pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is false and r.applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is false
+              and r.applies_urgency_law is true
+              and r.pertinencia is false
+        ), 0)::bigint
+    from "User" u
+    left join metrics_daily_rollup r
+        on r.resident_doctor_id = u.id
+       and (p_start is null or r.day >= p_start)
+       and (p_end is null or r.day <= p_end)
+    where u.is_deleted = false
+    group by u.id, u.first_name, u.last_name;
+$$;
+
+create or replace function metrics_rollup_counts(
+    p_start date default null,
+    p_end date default null,
+    p_resident_doctor_id uuid default null,
+    p_insurance_company_id bigint default null
+)
+returns table (
+    total_episodes bigint,
+    total_urgency_law bigint,
+    urgency_law_rejected bigint,
+    total_ai_yes bigint,
+    ai_yes_rejected bigint,
+    total_ai_no_medic_yes bigint,
+    ai_no_medic_yes_rejected bigint
+)
+language sql
+stable
+as $$
+    select
+        coalesce(sum(r.episodes), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.applies_urgency_law is true and r.pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is true and r.pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is false and r.applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is false
+              and r.applies_urgency_law is true
+              and r.pertinencia is false
+        ), 0)::bigint
+    from metrics_daily_rollup r
+    where (p_start is null or r.day >= p_start)
+      and (p_end is null or r.day <= p_end)
+      and (p_resident_doctor_id is null
+           or r.resident_doctor_id = p_resident_doctor_id)
+      and (p_insurance_company_id is null
+           or r.insurance_company_id = p_insurance_company_id);
+$$;
+
+select rebuild_metrics_rollup();
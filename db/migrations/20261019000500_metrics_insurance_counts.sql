@@ -0,0 +1,110 @@
+-- Métricas de todas las aseguradoras en una sola pasada.
+--
+-- La agrupación por aseguradora se resuelve en el servidor a través del
+-- join con Patient, sin enviar listas de IDs de pacientes en la URL.
+
+create index if not exists patient_insurance_company
+    on "Patient" (insurance_company_id);
+
+-- Sobre las atenciones (METRICS_BACKEND=raw)
+create or replace function metrics_insurance_counts(
+    p_start timestamptz default null,
+    p_end timestamptz default null
+)
+returns table (
+    id bigint,
+    nombre_juridico text,
+    total_episodes bigint,
+    total_urgency_law bigint,
+    urgency_law_rejected bigint,
+    total_ai_yes bigint,
+    ai_yes_rejected bigint,
+    total_ai_no_medic_yes bigint,
+    ai_no_medic_yes_rejected bigint
+)
+language sql
+stable
+as $$
+    select
+        ic.id,
+        ic.nombre_juridico,
+        count(ca.id) as total_episodes,
+        count(ca.id) filter (
+            where ca.applies_urgency_law is true
+        ) as total_urgency_law,
+        count(ca.id) filter (
+            where ca.applies_urgency_law is true and ca.pertinencia is false
+        ) as urgency_law_rejected,
+        count(ca.id) filter (
+            where ca.ai_result is true
+        ) as total_ai_yes,
+        count(ca.id) filter (
+            where ca.ai_result is true and ca.pertinencia is false
+        ) as ai_yes_rejected,
+        count(ca.id) filter (
+            where ca.ai_result is false and ca.applies_urgency_law is true
+        ) as total_ai_no_medic_yes,
+        count(ca.id) filter (
+            where ca.ai_result is false
+              and ca.applies_urgency_law is true
+              and ca.pertinencia is false
+        ) as ai_no_medic_yes_rejected
+    from insurance_company ic
+    left join "Patient" p on p.insurance_company_id = ic.id
+    left join "ClinicalAttention" ca
+        on ca.patient_id = p.id
+       and (p_start is null or ca.created_at >= p_start)
+       and (p_end is null or ca.created_at <= p_end)
+    group by ic.id, ic.nombre_juridico;
+$$;
+
+-- Sobre el rollup diario (METRICS_BACKEND=rollup)
+create or replace function metrics_rollup_insurance_counts(
+    p_start date default null,
+    p_end date default null
+)
+returns table (
+    id bigint,
+    nombre_juridico text,
+    total_episodes bigint,
+    total_urgency_law bigint,
+    urgency_law_rejected bigint,
+    total_ai_yes bigint,
+    ai_yes_rejected bigint,
+    total_ai_no_medic_yes bigint,
+    ai_no_medic_yes_rejected bigint
+)
+language sql
+stable
+as $$
+    select
+        ic.id,
+        ic.nombre_juridico,
+        coalesce(sum(r.episodes), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.applies_urgency_law is true and r.pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is true and r.pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is false and r.applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(r.episodes) filter (
+            where r.ai_result is false
+              and r.applies_urgency_law is true
+              and r.pertinencia is false
+        ), 0)::bigint
+    from insurance_company ic
+    left join metrics_daily_rollup r
+        on r.insurance_company_id = ic.id
+       and (p_start is null or r.day >= p_start)
+       and (p_end is null or r.day <= p_end)
+    group by ic.id, ic.nombre_juridico;
+$$;
@@ -0,0 +1,71 @@
+-- Serie temporal de métricas: conteos por (bucket, entidad) en una sola
+-- consulta sobre el rollup diario.
+--
+-- p_bucket: 'day' | 'week' | 'month' (semanas ISO, comienzan el lunes)
+-- p_scope: 'users' (residente) | 'insurance_companies' (aseguradora)
+-- p_ids: filtra entidades (como texto); null = todas
+
+create or replace function metrics_rollup_series(
+    p_bucket text,
+    p_scope text,
+    p_start date default null,
+    p_end date default null,
+    p_ids text[] default null
+)
+returns table (
+    bucket_start date,
+    entity_id text,
+    total_episodes bigint,
+    total_urgency_law bigint,
+    urgency_law_rejected bigint,
+    total_ai_yes bigint,
+    ai_yes_rejected bigint,
+    total_ai_no_medic_yes bigint,
+    ai_no_medic_yes_rejected bigint
+)
+language sql
+stable
+as $$
+    with scoped as (
+        select
+            date_trunc(p_bucket, r.day)::date as bucket_start,
+            case
+                when p_scope = 'users' then r.resident_doctor_id::text
+                else r.insurance_company_id::text
+            end as entity_id,
+            r.*
+        from metrics_daily_rollup r
+        where (p_start is null or r.day >= p_start)
+          and (p_end is null or r.day <= p_end)
+    )
+    select
+        bucket_start,
+        entity_id,
+        sum(episodes)::bigint,
+        coalesce(sum(episodes) filter (
+            where applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(episodes) filter (
+            where applies_urgency_law is true and pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(episodes) filter (
+            where ai_result is true
+        ), 0)::bigint,
+        coalesce(sum(episodes) filter (
+            where ai_result is true and pertinencia is false
+        ), 0)::bigint,
+        coalesce(sum(episodes) filter (
+            where ai_result is false and applies_urgency_law is true
+        ), 0)::bigint,
+        coalesce(sum(episodes) filter (
+            where ai_result is false
+              and applies_urgency_law is true
+              and pertinencia is false
+        ), 0)::bigint
+    from scoped
+    where entity_id is not null
+      and (p_ids is null or entity_id = any(p_ids))
+    group by bucket_start, entity_id
+    having sum(episodes) > 0
+    order by bucket_start, entity_id;
+$$;
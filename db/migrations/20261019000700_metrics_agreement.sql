@@ -0,0 +1,269 @@
+-- Concordancia IA vs. aseguradora y calibración de ai_confidence.
+--
+-- El rollup diario gana una dimensión `confidence_bin` (decil de
+-- ai_confidence) y la suma de confianzas de cada celda, así la matriz de
+-- confusión (ai_result × pertinencia) y la calibración por decil salen de la
+-- misma tabla que el resto de las métricas.
+
+-- Decil de confianza 0..9 (1.0 cae en el último); null sin confianza.
+-- Mismo cálculo que metric_service.CALIBRATION_BINS.
+create or replace function ai_confidence_bin(p_confidence double precision)
+returns smallint
+language sql
+immutable
+as $$
+    select case
+        when p_confidence is null then null
+        else least(greatest(floor(p_confidence * 10), 0), 9)::smallint
+    end;
+$$;
+
+alter table metrics_daily_rollup
+    add column if not exists confidence_bin smallint,
+    add column if not exists confidence_sum double precision not null default 0;
+
+alter table metrics_daily_rollup
+    drop constraint if exists metrics_daily_rollup_key;
+alter table metrics_daily_rollup
+    add constraint metrics_daily_rollup_key unique nulls not distinct (
+        day,
+        resident_doctor_id,
+        insurance_company_id,
+        applies_urgency_law,
+        ai_result,
+        computed_verdict,
+        pertinencia,
+        confidence_bin
+    );
+
+
+create or replace function metrics_rollup_apply(
+    r "ClinicalAttention",
+    p_insurance_company_id bigint,
+    p_delta integer
+)
+returns void
+language sql
+as $$
+    insert into metrics_daily_rollup (
+        day,
+        resident_doctor_id,
+        insurance_company_id,
+        applies_urgency_law,
+        ai_result,
+        computed_verdict,
+        pertinencia,
+        confidence_bin,
+        episodes,
+        confidence_sum
+    )
+    values (
+        (r.created_at at time zone 'UTC')::date,
+        r.resident_doctor_id,
+        p_insurance_company_id,
+        r.applies_urgency_law,
+        r.ai_result,
+        compute_urgency_law(r.ai_result, r.medic_approved, r.supervisor_approved),
+        r.pertinencia,
+        ai_confidence_bin(r.ai_confidence),
+        p_delta,
+        p_delta * coalesce(r.ai_confidence, 0)
+    )
+    on conflict on constraint metrics_daily_rollup_key
+    do update set
+        episodes = metrics_daily_rollup.episodes + excluded.episodes,
+        confidence_sum = metrics_daily_rollup.confidence_sum + excluded.confidence_sum;
+$$;
+
+
+-- ai_confidence ahora también mueve filas del rollup
+drop trigger if exists clinical_attention_metrics_rollup_update
+    on "ClinicalAttention";
+create trigger clinical_attention_metrics_rollup_update
+    after update on "ClinicalAttention"
+    for each row
+    when (
+        (
+            old.created_at,
+            old.resident_doctor_id,
+            old.patient_id,
+            old.applies_urgency_law,
+            old.ai_result,
+            old.ai_confidence,
+            old.medic_approved,
+            old.supervisor_approved,
+            old.pertinencia
+        ) is distinct from (
+            new.created_at,
+            new.resident_doctor_id,
+            new.patient_id,
+            new.applies_urgency_law,
+            new.ai_result,
+            new.ai_confidence,
+            new.medic_approved,
+            new.supervisor_approved,
+            new.pertinencia
+        )
+    )
+    execute function metrics_rollup_attention_trigger();
+
+
+create or replace function rebuild_metrics_rollup(
+    p_start date default null,
+    p_end date default null
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_rows integer;
+begin
+    lock table metrics_daily_rollup in share row exclusive mode;
+
+    delete from metrics_daily_rollup
+    where (p_start is null or day >= p_start)
+      and (p_end is null or day <= p_end);
+
+    insert into metrics_daily_rollup (
+        day,
+        resident_doctor_id,
+        insurance_company_id,
+        applies_urgency_law,
+        ai_result,
+        computed_verdict,
+        pertinencia,
+        confidence_bin,
+        episodes,
+        confidence_sum
+    )
+    select
+        (ca.created_at at time zone 'UTC')::date,
+        ca.resident_doctor_id,
+        p.insurance_company_id,
+        ca.applies_urgency_law,
+        ca.ai_result,
+        compute_urgency_law(ca.ai_result, ca.medic_approved, ca.supervisor_approved),
+        ca.pertinencia,
+        ai_confidence_bin(ca.ai_confidence),
+        count(*),
+        coalesce(sum(ca.ai_confidence), 0)
+    from "ClinicalAttention" ca
+    left join "Patient" p on p.id = ca.patient_id
+    where (p_start is null or (ca.created_at at time zone 'UTC')::date >= p_start)
+      and (p_end is null or (ca.created_at at time zone 'UTC')::date <= p_end)
+    group by 1, 2, 3, 4, 5, 6, 7, 8;
+
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
+
+
+-- Celdas de concordancia por (entidad, bucket, ai_result, pertinencia,
+-- confidence_bin). El cálculo de la matriz de confusión, precision/recall y
+-- calibración se hace en metric_service con el kernel de conteos.
+--
+-- p_scope: 'users' | 'insurance_companies' | 'all'
+-- p_bucket: 'day' | 'week' | 'month' | null (todo el rango en un bucket)
+
+-- Sobre el rollup diario (METRICS_BACKEND=rollup)
+create or replace function metrics_rollup_agreement(
+    p_scope text,
+    p_bucket text default null,
+    p_start date default null,
+    p_end date default null
+)
+returns table (
+    entity_id text,
+    bucket_start date,
+    ai_result boolean,
+    pertinencia boolean,
+    confidence_bin smallint,
+    episodes bigint,
+    confidence_sum double precision
+)
+language sql
+stable
+as $$
+    with scoped as (
+        select
+            case p_scope
+                when 'users' then r.resident_doctor_id::text
+                when 'insurance_companies' then r.insurance_company_id::text
+                else 'all'
+            end as entity_id,
+            case
+                when p_bucket is null then null
+                else date_trunc(p_bucket, r.day)::date
+            end as bucket_start,
+            r.*
+        from metrics_daily_rollup r
+        where (p_start is null or r.day >= p_start)
+          and (p_end is null or r.day <= p_end)
+    )
+    select
+        entity_id,
+        bucket_start,
+        ai_result,
+        pertinencia,
+        confidence_bin,
+        sum(episodes)::bigint,
+        sum(confidence_sum)
+    from scoped
+    where entity_id is not null
+    group by 1, 2, 3, 4, 5
+    having sum(episodes) > 0;
+$$;
+
+-- Sobre las atenciones (METRICS_BACKEND=raw)
+create or replace function metrics_agreement(
+    p_scope text,
+    p_bucket text default null,
+    p_start timestamptz default null,
+    p_end timestamptz default null
+)
+returns table (
+    entity_id text,
+    bucket_start date,
+    ai_result boolean,
+    pertinencia boolean,
+    confidence_bin smallint,
+    episodes bigint,
+    confidence_sum double precision
+)
+language sql
+stable
+as $$
+    with scoped as (
+        select
+            case p_scope
+                when 'users' then ca.resident_doctor_id::text
+                when 'insurance_companies' then p.insurance_company_id::text
+                else 'all'
+            end as entity_id,
+            case
+                when p_bucket is null then null
+                else date_trunc(p_bucket, ca.created_at at time zone 'UTC')::date
+            end as bucket_start,
+            ca.ai_result,
+            ca.pertinencia,
+            ca.ai_confidence
+        from "ClinicalAttention" ca
+        left join "Patient" p on p.id = ca.patient_id
+        where (p_start is null or ca.created_at >= p_start)
+          and (p_end is null or ca.created_at <= p_end)
+    )
+    select
+        entity_id,
+        bucket_start,
+        ai_result,
+        pertinencia,
+        ai_confidence_bin(ai_confidence),
+        count(*),
+        coalesce(sum(ai_confidence), 0)
+    from scoped
+    where entity_id is not null
+    group by 1, 2, 3, 4, 5;
+$$;
+
+select rebuild_metrics_rollup();
@@ -0,0 +1,51 @@
+-- updated_at mantenido por trigger en las tablas del snapshot Parquet
+-- (snapshot_service), que las copia de forma incremental con keyset sobre
+-- (updated_at, id).
+
+create or replace function set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+alter table "ClinicalAttention"
+    add column if not exists updated_at timestamptz not null default now();
+alter table "Patient"
+    add column if not exists updated_at timestamptz not null default now();
+alter table "User"
+    add column if not exists updated_at timestamptz not null default now();
+alter table insurance_company
+    add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists clinical_attention_set_updated_at on "ClinicalAttention";
+create trigger clinical_attention_set_updated_at
+    before update on "ClinicalAttention"
+    for each row execute function set_updated_at();
+
+drop trigger if exists patient_set_updated_at on "Patient";
+create trigger patient_set_updated_at
+    before update on "Patient"
+    for each row execute function set_updated_at();
+
+drop trigger if exists user_set_updated_at on "User";
+create trigger user_set_updated_at
+    before update on "User"
+    for each row execute function set_updated_at();
+
+drop trigger if exists insurance_company_set_updated_at on insurance_company;
+create trigger insurance_company_set_updated_at
+    before update on insurance_company
+    for each row execute function set_updated_at();
+
+create index if not exists clinical_attention_updated_at_id
+    on "ClinicalAttention" (updated_at, id);
+create index if not exists patient_updated_at_id
+    on "Patient" (updated_at, id);
+create index if not exists user_updated_at_id
+    on "User" (updated_at, id);
+create index if not exists insurance_company_updated_at_id
+    on insurance_company (updated_at, id);
@@ -0,0 +1,118 @@
+-- Cola durable de evaluaciones de IA (reemplaza BackgroundTasks).
+--
+-- create_attention / update_attention insertan un job; los workers
+-- (`python -m app.cli ai-worker`) los reclaman con claim_ai_jobs, que usa
+-- FOR UPDATE SKIP LOCKED para que varios workers no tomen el mismo job. Un
+-- job reclamado queda invisible hasta locked_until; si el worker muere, vuelve
+-- a estar disponible al vencer ese plazo (visibility timeout).
+
+create table if not exists ai_job (
+    id bigint generated always as identity primary key,
+    attention_id uuid not null
+        references "ClinicalAttention" (id) on delete cascade,
+    diagnostic text not null,
+    status text not null default 'queued'
+        check (status in ('queued', 'running', 'done', 'failed')),
+    attempts integer not null default 0,
+    max_attempts integer not null default 5,
+    run_at timestamptz not null default now(),
+    locked_by text,
+    locked_until timestamptz,
+    last_error text,
+    created_at timestamptz not null default now(),
+    finished_at timestamptz
+);
+
+create index if not exists ai_job_pending
+    on ai_job (run_at, id)
+    where status in ('queued', 'running');
+
+create index if not exists ai_job_attention
+    on ai_job (attention_id);
+
+
+create or replace function claim_ai_jobs(
+    p_worker text,
+    p_limit integer,
+    p_visibility_seconds integer
+)
+returns setof ai_job
+language plpgsql
+as $$
+begin
+    -- Jobs cuyo worker murió sin reintentos disponibles
+    update ai_job
+    set status = 'failed',
+        last_error = coalesce(last_error, 'visibility timeout'),
+        locked_by = null,
+        locked_until = null,
+        finished_at = now()
+    where status = 'running'
+      and locked_until < now()
+      and attempts >= max_attempts;
+
+    return query
+    update ai_job j
+    set status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = p_worker,
+        locked_until = now() + make_interval(secs => p_visibility_seconds)
+    where j.id in (
+        select id
+        from ai_job
+        where (status = 'queued' and run_at <= now())
+           or (status = 'running' and locked_until < now())
+        order by run_at, id
+        limit p_limit
+        for update skip locked
+    )
+    returning j.*;
+end;
+$$;
+
+
+-- Registra un intento fallido: vuelve a la cola con backoff o queda 'failed'
+-- si agotó los intentos. Solo aplica si el job sigue en manos de p_worker.
+create or replace function fail_ai_job(
+    p_id bigint,
+    p_worker text,
+    p_error text,
+    p_retry_in_seconds double precision
+)
+returns text
+language sql
+as $$
+    update ai_job
+    set status = case when attempts >= max_attempts then 'failed' else 'queued' end,
+        run_at = now() + make_interval(secs => p_retry_in_seconds),
+        locked_by = null,
+        locked_until = null,
+        last_error = p_error,
+        finished_at = case when attempts >= max_attempts then now() end
+    where id = p_id
+      and locked_by = p_worker
+      and status = 'running'
+    returning status;
+$$;
+
+
+-- Profundidad y antigüedad de la cola, por estado (sin los 'done')
+create or replace function ai_job_queue_stats()
+returns table (
+    status text,
+    jobs bigint,
+    ready bigint,
+    oldest_age_seconds double precision
+)
+language sql
+stable
+as $$
+    select
+        status,
+        count(*),
+        count(*) filter (where status = 'queued' and run_at <= now()),
+        extract(epoch from now() - min(created_at))
+    from ai_job
+    where status <> 'done'
+    group by status;
+$$;
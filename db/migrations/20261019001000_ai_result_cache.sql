@@ -0,0 +1,42 @@
+-- Cache persistente de evaluaciones de IA, direccionada por contenido.
+--
+-- key = sha256(modelo, versión del prompt, diagnóstico normalizado); ver
+-- app/services/IA/ai_cache.py. Textos iguales (plantillas, re-guardados,
+-- cambios solo de espacios) reutilizan el UrgencyOutput en vez de volver a
+-- llamar a Gemini. Cambiar de modelo o de PROMPT_VERSION genera claves nuevas;
+-- las filas viejas se pueden borrar por model / prompt_version.
+
+create table if not exists ai_result_cache (
+    key text primary key,
+    model text not null,
+    prompt_version text not null,
+    output jsonb not null,
+    hits bigint not null default 0,
+    last_hit_at timestamptz,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists ai_result_cache_version
+    on ai_result_cache (model, prompt_version);
+
+
+create or replace function touch_ai_result_cache(p_key text)
+returns void
+language sql
+as $$
+    update ai_result_cache
+    set hits = hits + 1,
+        last_hit_at = now()
+    where key = p_key;
+$$;
+
+
+-- Totales para la tasa de aciertos (cada entrada corresponde a un miss)
+create or replace function ai_result_cache_stats()
+returns table (entries bigint, hits bigint)
+language sql
+stable
+as $$
+    select count(*), coalesce(sum(hits), 0)::bigint
+    from ai_result_cache;
+$$;
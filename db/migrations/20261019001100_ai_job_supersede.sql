@@ -0,0 +1,201 @@
+-- Evaluaciones de IA sin resultados obsoletos al editar el diagnóstico.
+--
+-- * Debounce: a lo más un job 'queued' por atención. enqueue_ai_job reemplaza
+--   el texto del job pendiente y posterga su run_at (hasta un máximo desde
+--   que se encoló), así cinco ediciones seguidas son una sola llamada.
+-- * Single-flight: claim_ai_jobs no toma un job de una atención que ya tiene
+--   otro en curso; uno vencido con un job más nuevo en cola pasa a
+--   'superseded' en vez de reintentarse.
+-- * Escrituras protegidas: ClinicalAttention.diagnostic_hash = md5 del
+--   diagnóstico; el worker solo guarda el resultado si el hash sigue siendo
+--   el del texto que evaluó (ver ai_task.save_result).
+
+alter table "ClinicalAttention"
+    add column if not exists diagnostic_hash text
+        generated always as (md5(diagnostic)) stored;
+
+alter table ai_job drop constraint if exists ai_job_status_check;
+alter table ai_job add constraint ai_job_status_check
+    check (status in ('queued', 'running', 'done', 'failed', 'superseded'));
+
+-- Deja un solo job en cola por atención antes de crear el índice único
+update ai_job j
+set status = 'superseded',
+    finished_at = now()
+where j.status = 'queued'
+  and exists (
+      select 1
+      from ai_job newer
+      where newer.attention_id = j.attention_id
+        and newer.status = 'queued'
+        and newer.id > j.id
+  );
+
+create unique index if not exists ai_job_one_queued
+    on ai_job (attention_id)
+    where status = 'queued';
+
+create index if not exists ai_job_attention_running
+    on ai_job (attention_id)
+    where status = 'running';
+
+
+create or replace function enqueue_ai_job(
+    p_attention_id uuid,
+    p_diagnostic text,
+    p_max_attempts integer,
+    p_delay_seconds double precision default 0,
+    p_max_delay_seconds double precision default 0
+)
+returns bigint
+language sql
+as $$
+    insert into ai_job (attention_id, diagnostic, max_attempts, run_at)
+    values (
+        p_attention_id,
+        p_diagnostic,
+        p_max_attempts,
+        now() + make_interval(secs => p_delay_seconds)
+    )
+    on conflict (attention_id) where status = 'queued'
+    do update set
+        diagnostic = excluded.diagnostic,
+        attempts = 0,
+        max_attempts = excluded.max_attempts,
+        last_error = null,
+        run_at = least(
+            excluded.run_at,
+            greatest(
+                ai_job.created_at + make_interval(secs => p_max_delay_seconds),
+                now()
+            )
+        )
+    returning id;
+$$;
+
+
+create or replace function claim_ai_jobs(
+    p_worker text,
+    p_limit integer,
+    p_visibility_seconds integer
+)
+returns setof ai_job
+language plpgsql
+as $$
+begin
+    -- Jobs vencidos cuyo texto ya fue reemplazado por uno más nuevo en cola
+    update ai_job j
+    set status = 'superseded',
+        locked_by = null,
+        locked_until = null,
+        finished_at = now()
+    where j.status = 'running'
+      and j.locked_until < now()
+      and exists (
+          select 1
+          from ai_job q
+          where q.attention_id = j.attention_id
+            and q.status = 'queued'
+      );
+
+    -- Jobs cuyo worker murió sin reintentos disponibles
+    update ai_job
+    set status = 'failed',
+        last_error = coalesce(last_error, 'visibility timeout'),
+        locked_by = null,
+        locked_until = null,
+        finished_at = now()
+    where status = 'running'
+      and locked_until < now()
+      and attempts >= max_attempts;
+
+    return query
+    update ai_job j
+    set status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = p_worker,
+        locked_until = now() + make_interval(secs => p_visibility_seconds)
+    where j.id in (
+        select c.id
+        from ai_job c
+        where ((c.status = 'queued' and c.run_at <= now())
+               or (c.status = 'running' and c.locked_until < now()))
+          -- Single-flight: nada mientras otro job de la atención está en curso
+          and not exists (
+              select 1
+              from ai_job r
+              where r.attention_id = c.attention_id
+                and r.status = 'running'
+                and r.locked_until >= now()
+          )
+        order by c.run_at, c.id
+        limit p_limit
+        for update skip locked
+    )
+    returning j.*;
+end;
+$$;
+
+
+-- Como antes, pero si ya hay un job más nuevo en cola para la atención el
+-- intento fallido no se reintenta: queda 'superseded'.
+create or replace function fail_ai_job(
+    p_id bigint,
+    p_worker text,
+    p_error text,
+    p_retry_in_seconds double precision
+)
+returns text
+language sql
+as $$
+    with next as (
+        select
+            j.id,
+            case
+                when exists (
+                    select 1
+                    from ai_job q
+                    where q.attention_id = j.attention_id
+                      and q.status = 'queued'
+                ) then 'superseded'
+                when j.attempts >= j.max_attempts then 'failed'
+                else 'queued'
+            end as status
+        from ai_job j
+        where j.id = p_id
+          and j.locked_by = p_worker
+          and j.status = 'running'
+    )
+    update ai_job j
+    set status = next.status,
+        run_at = now() + make_interval(secs => p_retry_in_seconds),
+        locked_by = null,
+        locked_until = null,
+        last_error = p_error,
+        finished_at = case when next.status <> 'queued' then now() end
+    from next
+    where j.id = next.id
+    returning j.status;
+$$;
+
+
+-- Los 'superseded' tampoco cuentan como pendientes
+create or replace function ai_job_queue_stats()
+returns table (
+    status text,
+    jobs bigint,
+    ready bigint,
+    oldest_age_seconds double precision
+)
+language sql
+stable
+as $$
+    select
+        status,
+        count(*),
+        count(*) filter (where status = 'queued' and run_at <= now()),
+        extract(epoch from now() - min(created_at))
+    from ai_job
+    where status not in ('done', 'superseded')
+    group by status;
+$$;
@@ -0,0 +1,147 @@
+-- Prioridades en la cola de IA: 0 = atención nueva, 1 = edición del
+-- diagnóstico, 2 = back-fill / re-evaluación masiva.
+--
+-- claim_ai_jobs ordena por prioridad efectiva (la prioridad baja un nivel por
+-- cada p_aging_seconds de espera, así un back-fill no espera para siempre) y
+-- respeta cupos por clase (p_class_limits[prioridad + 1]: cuántos jobs de esa
+-- clase puede tomar el worker), para que un back-fill de miles de episodios
+-- nunca ocupe los slots que necesita una atención recién creada.
+
+alter table ai_job
+    add column if not exists priority smallint not null default 0
+        check (priority between 0 and 2);
+
+
+drop function if exists enqueue_ai_job(
+    uuid, text, integer, double precision, double precision
+);
+
+create or replace function enqueue_ai_job(
+    p_attention_id uuid,
+    p_diagnostic text,
+    p_max_attempts integer,
+    p_priority smallint default 0,
+    p_delay_seconds double precision default 0,
+    p_max_delay_seconds double precision default 0
+)
+returns bigint
+language sql
+as $$
+    insert into ai_job (attention_id, diagnostic, max_attempts, priority, run_at)
+    values (
+        p_attention_id,
+        p_diagnostic,
+        p_max_attempts,
+        p_priority,
+        now() + make_interval(secs => p_delay_seconds)
+    )
+    on conflict (attention_id) where status = 'queued'
+    do update set
+        diagnostic = excluded.diagnostic,
+        attempts = 0,
+        max_attempts = excluded.max_attempts,
+        -- Una atención nueva editada antes de evaluarse sigue siendo nueva
+        priority = least(ai_job.priority, excluded.priority),
+        last_error = null,
+        run_at = least(
+            excluded.run_at,
+            greatest(
+                ai_job.created_at + make_interval(secs => p_max_delay_seconds),
+                now()
+            )
+        )
+    returning id;
+$$;
+
+
+drop function if exists claim_ai_jobs(text, integer, integer);
+
+create or replace function claim_ai_jobs(
+    p_worker text,
+    p_limit integer,
+    p_visibility_seconds integer,
+    p_class_limits integer[] default null,
+    p_aging_seconds double precision default 60
+)
+returns setof ai_job
+language plpgsql
+as $$
+declare
+    v_limits integer[] := coalesce(
+        p_class_limits, array[p_limit, p_limit, p_limit]
+    );
+    v_job ai_job;
+    v_claimed integer := 0;
+begin
+    -- Jobs vencidos cuyo texto ya fue reemplazado por uno más nuevo en cola
+    update ai_job j
+    set status = 'superseded',
+        locked_by = null,
+        locked_until = null,
+        finished_at = now()
+    where j.status = 'running'
+      and j.locked_until < now()
+      and exists (
+          select 1
+          from ai_job q
+          where q.attention_id = j.attention_id
+            and q.status = 'queued'
+      );
+
+    -- Jobs cuyo worker murió sin reintentos disponibles
+    update ai_job
+    set status = 'failed',
+        last_error = coalesce(last_error, 'visibility timeout'),
+        locked_by = null,
+        locked_until = null,
+        finished_at = now()
+    where status = 'running'
+      and locked_until < now()
+      and attempts >= max_attempts;
+
+    -- De a un job (p_limit es a lo más la concurrencia del worker), para
+    -- descontar el cupo de su clase antes de elegir el siguiente
+    while v_claimed < p_limit loop
+        select c.*
+        into v_job
+        from ai_job c
+        where ((c.status = 'queued' and c.run_at <= now())
+               or (c.status = 'running' and c.locked_until < now()))
+          and coalesce(v_limits[c.priority + 1], 0) > 0
+          -- Single-flight: nada mientras otro job de la atención está en curso
+          and not exists (
+              select 1
+              from ai_job r
+              where r.attention_id = c.attention_id
+                and r.status = 'running'
+                and r.locked_until >= now()
+          )
+        order by
+            greatest(
+                c.priority - floor(
+                    extract(epoch from now() - c.run_at)
+                    / greatest(p_aging_seconds, 1)
+                ),
+                0
+            ),
+            c.run_at,
+            c.id
+        limit 1
+        for update skip locked;
+
+        exit when not found;
+
+        update ai_job
+        set status = 'running',
+            attempts = attempts + 1,
+            locked_by = p_worker,
+            locked_until = now() + make_interval(secs => p_visibility_seconds)
+        where id = v_job.id
+        returning * into v_job;
+
+        v_limits[v_job.priority + 1] := v_limits[v_job.priority + 1] - 1;
+        v_claimed := v_claimed + 1;
+        return next v_job;
+    end loop;
+end;
+$$;
@@ -0,0 +1,40 @@
+-- Devuelve un job reclamado a la cola sin gastar un intento: el worker lo usa
+-- cuando el circuit breaker de Gemini está abierto, para no agotar los
+-- reintentos de todos los jobs durante una caída del proveedor. Si ya hay un
+-- job más nuevo en cola para la atención, este queda 'superseded'.
+create or replace function release_ai_job(
+    p_id bigint,
+    p_worker text,
+    p_delay_seconds double precision
+)
+returns text
+language sql
+as $$
+    with next as (
+        select
+            j.id,
+            case
+                when exists (
+                    select 1
+                    from ai_job q
+                    where q.attention_id = j.attention_id
+                      and q.status = 'queued'
+                ) then 'superseded'
+                else 'queued'
+            end as status
+        from ai_job j
+        where j.id = p_id
+          and j.locked_by = p_worker
+          and j.status = 'running'
+    )
+    update ai_job j
+    set status = next.status,
+        attempts = greatest(j.attempts - 1, 0),
+        run_at = now() + make_interval(secs => p_delay_seconds),
+        locked_by = null,
+        locked_until = null,
+        finished_at = case when next.status = 'superseded' then now() end
+    from next
+    where j.id = next.id
+    returning j.status;
+$$;
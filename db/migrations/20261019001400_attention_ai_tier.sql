@@ -0,0 +1,7 @@
+-- Qué respondió la evaluación de IA guardada: el modelo y el nivel de la
+-- cascada ('fast' / 'strong') o 'rules' para el fast path por reglas. Sirve
+-- para medir cuántos casos escalan al modelo fuerte.
+alter table "ClinicalAttention"
+    add column if not exists ai_model text,
+    add column if not exists ai_tier text
+        check (ai_tier in ('fast', 'strong', 'rules'));
@@ -0,0 +1,10 @@
+-- Eventos de cambios en atenciones para EVENTS_BACKEND=postgres: la app
+-- publica con esta RPC y cada proceso de la API escucha el canal con LISTEN
+-- (ver app/services/events.py). El payload de pg_notify tiene un máximo de
+-- 8000 bytes; los eventos son compactos (ids y campos cambiados).
+create or replace function publish_attention_event(p_event jsonb)
+returns void
+language sql
+as $$
+    select pg_notify('attention_events', p_event::text);
+$$;
@@ -0,0 +1,104 @@
+-- Re-evaluaciones masivas de IA tras cambiar el prompt o el modelo.
+--
+-- Una corrida (ai_reevaluation_run) selecciona atenciones por rango de fechas,
+-- versión de prompt o modelo y las encola como back-fill (prioridad 2) a un
+-- ritmo controlado; el cursor (created_at, id) guarda hasta dónde se encoló,
+-- así una corrida interrumpida se retoma sin repetir. Los jobs llevan el id de
+-- la corrida para medir avance y ETA. Cada resultado guarda la versión de
+-- prompt que lo generó en ClinicalAttention.ai_prompt_version.
+
+alter table "ClinicalAttention"
+    add column if not exists ai_prompt_version text;
+
+create index if not exists clinical_attention_ai_prompt_version
+    on "ClinicalAttention" (ai_prompt_version);
+
+create table if not exists ai_reevaluation_run (
+    id bigint generated always as identity primary key,
+    status text not null default 'enqueuing'
+        check (status in ('enqueuing', 'paused', 'enqueued', 'failed', 'cancelled')),
+    filters jsonb not null default '{}'::jsonb,
+    -- Versión de prompt y modelos con que se re-evalúa
+    prompt_version text not null,
+    model text not null,
+    rate_per_minute integer not null,
+    total integer not null default 0,
+    enqueued integer not null default 0,
+    cursor_created_at timestamptz,
+    cursor_id uuid,
+    last_error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now(),
+    finished_at timestamptz
+);
+
+alter table ai_job
+    add column if not exists reevaluation_run_id bigint
+        references ai_reevaluation_run (id) on delete set null;
+
+create index if not exists ai_job_reevaluation_run
+    on ai_job (reevaluation_run_id, status)
+    where reevaluation_run_id is not null;
+
+
+drop function if exists enqueue_ai_job(
+    uuid, text, integer, smallint, double precision, double precision
+);
+
+create or replace function enqueue_ai_job(
+    p_attention_id uuid,
+    p_diagnostic text,
+    p_max_attempts integer,
+    p_priority smallint default 0,
+    p_delay_seconds double precision default 0,
+    p_max_delay_seconds double precision default 0,
+    p_reevaluation_run_id bigint default null
+)
+returns bigint
+language sql
+as $$
+    insert into ai_job (
+        attention_id, diagnostic, max_attempts, priority, run_at,
+        reevaluation_run_id
+    )
+    values (
+        p_attention_id,
+        p_diagnostic,
+        p_max_attempts,
+        p_priority,
+        now() + make_interval(secs => p_delay_seconds),
+        p_reevaluation_run_id
+    )
+    on conflict (attention_id) where status = 'queued'
+    do update set
+        diagnostic = excluded.diagnostic,
+        attempts = 0,
+        max_attempts = excluded.max_attempts,
+        -- Una atención nueva editada antes de evaluarse sigue siendo nueva
+        priority = least(ai_job.priority, excluded.priority),
+        last_error = null,
+        run_at = least(
+            excluded.run_at,
+            greatest(
+                ai_job.created_at + make_interval(secs => p_max_delay_seconds),
+                now()
+            )
+        ),
+        reevaluation_run_id = coalesce(
+            excluded.reevaluation_run_id, ai_job.reevaluation_run_id
+        )
+    returning id;
+$$;
+
+
+-- Jobs de una corrida por estado (para avance y ETA)
+create or replace function ai_reevaluation_progress(p_run_id bigint)
+returns table (status text, jobs bigint, last_finished_at timestamptz)
+language sql
+stable
+as $$
+    select status, count(*), max(finished_at)
+    from ai_job
+    where reevaluation_run_id = p_run_id
+    group by status;
+$$;
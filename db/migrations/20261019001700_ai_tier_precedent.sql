@@ -0,0 +1,9 @@
+-- Nivel 'precedent': resultado tomado de atenciones casi idénticas ya
+-- validadas por residente y supervisor (índice de casos similares), sin
+-- llamar a Gemini.
+alter table "ClinicalAttention"
+    drop constraint if exists "ClinicalAttention_ai_tier_check";
+
+alter table "ClinicalAttention"
+    add constraint "ClinicalAttention_ai_tier_check"
+        check (ai_tier in ('fast', 'strong', 'rules', 'precedent'));
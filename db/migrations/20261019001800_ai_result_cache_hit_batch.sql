@@ -0,0 +1,14 @@
+-- Aciertos del cache de IA acumulados por proceso: cada proceso suma sus
+-- aciertos por clave y los escribe juntos cada AI_CACHE_HIT_FLUSH_SECONDS,
+-- en vez de un UPDATE por acierto sobre las claves más usadas.
+-- p_hits = {"<key>": <aciertos>, ...}
+create or replace function touch_ai_result_cache_batch(p_hits jsonb)
+returns void
+language sql
+as $$
+    update ai_result_cache c
+    set hits = c.hits + h.value::bigint,
+        last_hit_at = now()
+    from jsonb_each_text(p_hits) h
+    where c.key = h.key;
+$$;
@@ -0,0 +1,48 @@
+import time
+
+from app.services.IA import ai_cache
+
+
+def test_cache_key_ignores_whitespace_and_triage():
+    text = "Dolor torácico   intenso\n\ny sudoración"
+    variants = [
+        text,
+        "  Dolor torácico intenso y sudoración  ",
+        "Dolor torácico\tintenso\ny sudoración\n",
+        text + "\n\n===== TRIAGE =====\nESI 2, FC 110",
+    ]
+    keys = {ai_cache.cache_key(v) for v in variants}
+    assert len(keys) == 1
+    assert ai_cache.cache_key("Dolor abdominal") not in keys
+
+
+def test_hits_are_written_in_batches(monkeypatch):
+    calls = []
+
+    class FakeSupabase:
+        def rpc(self, name, params):
+            calls.append((name, params))
+            return self
+
+        def execute(self):
+            return None
+
+    monkeypatch.setattr(ai_cache, "supabase", FakeSupabase())
+    monkeypatch.setattr(ai_cache.settings, "AI_CACHE_HIT_FLUSH_SECONDS", 3600.0)
+    monkeypatch.setattr(ai_cache, "_flushed_at", time.monotonic())
+    key = ai_cache.cache_key("Dolor torácico")
+    ai_cache._lru.set(
+        key,
+        ai_cache.UrgencyOutput(
+            urgency_flag="applies", diagnosis_hypotheses=[], rationale="", actions=[]
+        ),
+    )
+
+    for _ in range(3):
+        assert ai_cache.get(key).urgency_flag == "applies"
+    assert calls == []
+
+    ai_cache.flush_hits()
+    assert calls == [("touch_ai_result_cache_batch", {"p_hits": {key: 3}})]
+    ai_cache.flush_hits()
+    assert len(calls) == 1
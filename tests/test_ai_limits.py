@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from app.services.IA.limits import CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+def test_token_bucket_makes_callers_wait_past_capacity():
+    bucket = TokenBucket(rate_per_minute=60)  # 1 per second, burst of 60
+    assert all(bucket.reserve(1) == 0 for _ in range(60))
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_circuit_breaker_opens_and_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state()["state"] == "open"
+
+    breaker.before_call()  # Reset elapsed: this call is the probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state()["state"] == "closed"
+    breaker.before_call()
+
+
+def test_cancelled_probe_releases_the_breaker(monkeypatch):
+    from app.services.IA import gemini_client
+
+    class HangingModels:
+        async def generate_content(self, **kwargs):
+            await asyncio.sleep(3600)
+
+    class FakeClient:
+        def __init__(self):
+            self.aio = type("Aio", (), {"models": HangingModels()})()
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    monkeypatch.setattr(gemini_client, "breaker", breaker)
+    monkeypatch.setattr(gemini_client, "get_client", lambda: FakeClient())
+
+    async def cancel_probe():
+        probe = asyncio.create_task(gemini_client.generate_json("s", "p"))
+        await asyncio.sleep(0.05)
+        assert breaker.state()["state"] == "half_open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(cancel_probe())
+    assert breaker.before_call() is True  # A new probe may go through
+
+
+def test_abandoned_stream_probe_releases_the_breaker(monkeypatch):
+    from app.services.IA import gemini_client
+
+    class Chunk:
+        text = "{"
+        usage_metadata = None
+
+    class StreamingModels:
+        async def generate_content_stream(self, **kwargs):
+            async def chunks():
+                while True:
+                    yield Chunk()
+
+            return chunks()
+
+    class FakeClient:
+        def __init__(self):
+            self.aio = type("Aio", (), {"models": StreamingModels()})()
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    monkeypatch.setattr(gemini_client, "breaker", breaker)
+    monkeypatch.setattr(gemini_client, "get_client", lambda: FakeClient())
+
+    async def disconnect():
+        stream = gemini_client.stream_json("s", "p")
+        assert await stream.__anext__() == "{"
+        await stream.aclose()  # Client went away mid-stream
+
+    asyncio.run(disconnect())
+    assert breaker.before_call() is True
@@ -0,0 +1,25 @@
+from app.services.IA import rules
+
+
+def test_matches_known_dx_synonyms_and_abbreviations():
+    assert rules.match("Paciente con IAMCEST de pared inferior")[0] == (
+        "Infarto agudo al miocardio"
+    )
+    assert rules.match("TROMBOEMBOLIA PULMONAR masiva")[0] == (
+        "Tromboembolismo pulmonar"
+    )
+    assert rules.match("Choque septico de foco urinario")[0] == "Shock séptico"
+    assert rules.match("===== TRIAGE =====\nIAM") is None
+
+
+def test_ignores_negated_or_suspected_mentions():
+    assert rules.match("Dolor torácico, se descarta IAM") is None
+    assert rules.match("Disnea, d/c TEP") is None
+    assert rules.match("Antecedente de ACV isquémico, consulta por tos") is None
+    assert rules.match("Dolor abdominal inespecífico") is None
+
+
+def test_evaluate_returns_urgent_output():
+    output = rules.evaluate("Politraumatizado tras accidente de tránsito")
+    assert output.urgency_flag == "applies"
+    assert output.diagnosis_hypotheses[0].condition == "Politraumatismo"
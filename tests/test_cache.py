@@ -0,0 +1,73 @@
+import threading
+
+from app.core.cache import LRUCache, TTLCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now the most recent entry
+
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_pop_and_clear():
+    cache = LRUCache(maxsize=4)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_ttl_cache_single_flight_shares_one_computation():
+    cache = TTLCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("k", compute))
+        )
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait(timeout=5)
+    for t in threads[1:]:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert len(calls) == 1
+    assert results == ["value"] * 5
+
+
+def test_ttl_cache_invalidate_forces_recompute():
+    cache = TTLCache(ttl=60)
+    values = iter([1, 2])
+
+    assert cache.get_or_compute("k", lambda: next(values)) == 1
+    assert cache.get_or_compute("k", lambda: next(values)) == 1
+
+    cache.invalidate(lambda key: key == "k")
+
+    assert cache.get_or_compute("k", lambda: next(values)) == 2
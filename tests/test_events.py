@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+from app.services import events
+
+ROW = {
+    "id": "a1",
+    "resident_doctor_id": "r1",
+    "supervisor_doctor_id": "s1",
+    "ai_result": True,
+    "ai_confidence": 0.9,
+    "ai_tier": "fast",
+    "applies_urgency_law": True,
+    "diagnostic": "no se envía",
+}
+
+
+def test_events_reach_matching_subscribers_across_threads():
+    async def scenario():
+        by_id = events.subscribe(["a1"])
+        by_user = events.subscribe(user_id="s1")
+        other = events.subscribe(["a2"], user_id="r9")
+        try:
+            publisher = threading.Thread(
+                target=events.publish, args=("ai_result", [ROW])
+            )
+            publisher.start()
+            publisher.join()
+            first = await asyncio.wait_for(by_id.queue.get(), 1)
+            second = await asyncio.wait_for(by_user.queue.get(), 1)
+            await asyncio.sleep(0)
+            return first, second, other.queue.empty()
+        finally:
+            for subscription in (by_id, by_user, other):
+                events.unsubscribe(subscription)
+
+    first, second, other_empty = asyncio.run(scenario())
+    assert first == second
+    assert first["type"] == "ai_result"
+    assert first["changes"] == {
+        "ai_result": True,
+        "ai_confidence": 0.9,
+        "ai_tier": "fast",
+        "applies_urgency_law": True,
+    }
+    assert other_empty
@@ -0,0 +1,31 @@
+import json
+
+from app.services.IA.json_stream import FieldScanner, extract_json
+
+
+def test_field_scanner_emits_fields_as_soon_as_complete():
+    doc = json.dumps(
+        {
+            "urgency_flag": "applies",
+            "urgency_confidence": 0.92,
+            "diagnosis_hypotheses": [{"condition": "IAM, {dx}", "confidence": 0.8}],
+            "rationale": 'dolor "opresivo": sí, irradiado',
+            "actions": ["ECG", "Troponinas"],
+        }
+    )
+    scanner = FieldScanner()
+    seen = []
+    for start in range(0, len(doc), 5):
+        for key, value in scanner.feed(doc[start : start + 5]):
+            seen.append((key, value, start))
+
+    assert [key for key, _, _ in seen] == list(json.loads(doc))
+    flag_at = next(at for key, _, at in seen if key == "urgency_confidence")
+    assert flag_at < doc.index('"rationale"')
+    assert dict((k, v) for k, v, _ in seen) == json.loads(doc)
+
+
+def test_extract_json_ignores_surrounding_text():
+    assert extract_json('```json\n{"a": {"b": 1}}\n```') == {"a": {"b": 1}}
+    assert extract_json('nota {no es json} y luego {"a": 1} fin') == {"a": 1}
+    assert extract_json("sin json") == {}
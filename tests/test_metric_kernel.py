@@ -0,0 +1,77 @@
+import itertools
+
+import numpy as np
+
+from app.services.metric_kernel import (
+    CONFUSION_FIELDS,
+    GroupedCounts,
+    cubes_to_confusion,
+    encode_tristate,
+)
+
+VALUES = (None, False, True)
+
+
+def naive_counts(rows):
+    urgency = [r for r in rows if r["applies_urgency_law"] is True]
+    ai_yes = [r for r in rows if r["ai_result"] is True]
+    ai_no_medic_yes = [r for r in urgency if r["ai_result"] is False]
+    return {
+        "total_episodes": len(rows),
+        "total_urgency_law": len(urgency),
+        "urgency_law_rejected": sum(r["pertinencia"] is False for r in urgency),
+        "total_ai_yes": len(ai_yes),
+        "ai_yes_rejected": sum(r["pertinencia"] is False for r in ai_yes),
+        "total_ai_no_medic_yes": len(ai_no_medic_yes),
+        "ai_no_medic_yes_rejected": sum(
+            r["pertinencia"] is False for r in ai_no_medic_yes
+        ),
+    }
+
+
+def test_grouped_counts_match_naive_counts_across_chunks():
+    rows = [
+        {
+            "group": group,
+            "applies_urgency_law": u,
+            "ai_result": a,
+            "pertinencia": p,
+        }
+        for group in ("a", "b", None)
+        for u, a, p in itertools.product(VALUES, repeat=3)
+    ]
+    grouped = GroupedCounts()
+    grouped.add_rows(rows[:20], lambda r: r["group"])
+    grouped.add_rows(rows[20:], lambda r: r["group"])
+
+    counts = grouped.counts()
+
+    assert set(counts) == {"a", "b"}  # rows without a group are skipped
+    for group in ("a", "b"):
+        expected = naive_counts([r for r in rows if r["group"] == group])
+        assert counts[group] == expected
+
+
+def test_weighted_cells_give_confusion_matrix():
+    grouped = GroupedCounts()
+    codes = grouped.encode_keys(["a", "a", "a", "b"], 4)
+    grouped.add_columns(
+        codes,
+        encode_tristate([None] * 4),
+        encode_tristate([True, True, False, None]),
+        encode_tristate([True, False, None, None]),
+        weights=np.array([5, 2, 3, 7], dtype=np.float64),
+    )
+
+    cubes = grouped.cubes()
+    confusion = cubes_to_confusion(np.stack([cubes["a"], cubes["b"]])).tolist()
+
+    assert dict(zip(CONFUSION_FIELDS, confusion[0])) == {
+        "true_positive": 5,
+        "false_positive": 2,
+        "false_negative": 0,
+        "true_negative": 0,
+        "pending": 3,
+        "without_ai": 0,
+    }
+    assert confusion[1][CONFUSION_FIELDS.index("without_ai")] == 7
@@ -0,0 +1,17 @@
+import pytest
+
+from app.services import metric_service
+
+
+def test_series_ids_are_validated_per_scope():
+    user_id = "0b6f3c1e-8a43-4f7e-9d0e-2a1b3c4d5e6f"
+    assert metric_service._series_ids("users", [user_id, user_id.upper()]) == [user_id]
+    assert metric_service._series_ids("insurance_companies", ["7", " 07", "3"]) == [
+        "3",
+        "7",
+    ]
+
+    with pytest.raises(ValueError, match="ID de aseguradora inválido: 'abc'"):
+        metric_service.get_metrics_series("insurance_companies", "month", ["abc"])
+    with pytest.raises(ValueError, match="ID de usuario inválido: '12'"):
+        metric_service.get_metrics_series("users", "month", ["12"])
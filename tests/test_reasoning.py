@@ -0,0 +1,34 @@
+import sys
+
+from app.services.IA import reasoning
+
+
+def test_coerce_to_schema_normalizes_any_template_answer():
+    data = reasoning.coerce_to_schema(
+        {
+            "urgency_flag": "maybe",
+            "urgency_confidence": "1.7",
+            "diagnosis_hypotheses": [{"diagnosis": "IAM", "score": "0.8"}, "x"],
+            "actions": ["ECG", " ", 3],
+            "citations": ["ignored"],
+        }
+    )
+    assert data == {
+        "urgency_flag": "uncertain",
+        "urgency_confidence": 1.0,
+        "diagnosis_hypotheses": [{"condition": "IAM", "confidence": 0.8}],
+        "rationale": "",
+        "actions": ["ECG", "3"],
+    }
+
+
+def test_text_template_drops_triage_section():
+    prompt = reasoning.TEXT.build("Dolor torácico\n===== TRIAGE =====\nC2")
+    assert "Dolor torácico" in prompt
+    assert "C2" not in prompt
+
+
+def test_importing_the_app_does_not_load_the_genai_sdk():
+    # conftest already imported app.main
+    assert "app.main" in sys.modules
+    assert not any(name.startswith("google.genai") for name in sys.modules)
@@ -0,0 +1,139 @@
+import asyncio
+
+from app.services.IA import reasoning
+from app.services.IA.similar_cases import SimilarCaseIndex, precedent_output
+
+
+def _case(case_id, diagnostic, applies=True, validated=True):
+    return {
+        "attention_id": case_id,
+        "id_episodio": f"EP-{case_id}",
+        "created_at": None,
+        "diagnostic": diagnostic,
+        "applies_urgency_law": applies,
+        "validated": validated,
+    }
+
+
+def _index(*cases):
+    index = SimilarCaseIndex()
+    for case in cases:
+        index.upsert(case["attention_id"], case["diagnostic"], case)
+    return index
+
+
+def test_search_ranks_by_similarity_and_filters():
+    index = _index(
+        _case("1", "Dolor torácico opresivo irradiado a brazo izquierdo"),
+        _case("2", "Dolor abdominal en fosa iliaca derecha", validated=False),
+        _case("3", "Cefalea leve sin fiebre", applies=False),
+    )
+    results = index.search("dolor toracico opresivo irradiado al brazo izquierdo")
+    assert [case["attention_id"] for _, case in results][:2] == ["1", "2"]
+    assert results[0][0] > 0.9
+
+    validated = index.search("dolor abdominal fosa iliaca", validated_only=True)
+    assert "2" not in [case["attention_id"] for _, case in validated]
+    assert all(
+        case["attention_id"] != "1"
+        for _, case in index.search("dolor toracico opresivo", exclude=["1"])
+    )
+
+
+def test_upsert_replaces_and_remove_forgets():
+    index = _index(_case("1", "Cefalea intensa súbita"))
+    index.upsert("1", "Esguince de tobillo", _case("1", "Esguince de tobillo"))
+    assert index.search("cefalea intensa") == []
+    index.remove("1")
+    assert len(index) == 0
+    assert index.search("esguince de tobillo") == []
+
+
+def test_precedent_output_needs_close_agreeing_precedents():
+    close = {**_case("1", "x"), "score": 0.97}
+    assert precedent_output([close]).urgency_flag == "applies"
+    assert precedent_output([close]).tier == "precedent"
+
+    conflicting = {**_case("2", "x", applies=False), "score": 0.95}
+    assert precedent_output([close, conflicting]) is None
+    assert precedent_output([{**close, "score": 0.5}]) is None
+
+
+def test_grounded_prompt_lists_precedents():
+    prompt = reasoning.GROUNDED_TEXT.build(
+        {
+            "text": "Dolor torácico",
+            "precedents": [{**_case("1", "Dolor torácico opresivo"), "score": 0.7}],
+        }
+    )
+    assert prompt.startswith(reasoning.TEXT.build("Dolor torácico"))
+    assert "(similitud 0.70) aplicó Ley de Urgencia" in prompt
+
+
+def test_grounded_answers_are_not_cached(monkeypatch):
+    from app.services.IA import ai_cache, ai_task, similar_cases
+
+    stored = []
+    answer = precedent_output([{**_case("1", "x"), "score": 0.97}])
+    precedents = [{**_case("1", "Dolor torácico opresivo"), "score": 0.7}]
+
+    async def fake_reason(payload, template=reasoning.TEXT):
+        return answer
+
+    monkeypatch.setattr(ai_cache, "enabled", lambda: True)
+    monkeypatch.setattr(ai_cache, "get", lambda key: None)
+    monkeypatch.setattr(ai_cache, "put", lambda key, output: stored.append(key))
+    monkeypatch.setattr(ai_task, "ai_reasoner", fake_reason)
+    monkeypatch.setattr(similar_cases, "find_precedents", lambda *a: precedents)
+    asyncio.run(ai_task.evaluate("Dolor torácico"))
+    assert stored == []
+
+    monkeypatch.setattr(similar_cases, "find_precedents", lambda *a: [])
+    asyncio.run(ai_task.evaluate("Dolor torácico"))
+    assert len(stored) == 1
+
+
+def test_sync_rescans_an_overlap_window(monkeypatch):
+    from app.services.IA import similar_cases
+
+    filters = []
+    rows = [
+        {
+            "id": "1",
+            "updated_at": "2026-10-19T12:00:00+00:00",
+            "diagnostic": "Cefalea intensa súbita",
+        }
+    ]
+
+    class FakeQuery:
+        def select(self, columns):
+            return self
+
+        def gte(self, column, value):
+            filters.append((column, value))
+            return self
+
+        def order(self, column):
+            return self
+
+        def limit(self, n):
+            return self
+
+        def execute(self):
+            return type("Response", (), {"data": rows})
+
+    class FakeSupabase:
+        def table(self, name):
+            return FakeQuery()
+
+    monkeypatch.setattr(similar_cases, "supabase", FakeSupabase())
+    monkeypatch.setattr(similar_cases, "_index", SimilarCaseIndex())
+    monkeypatch.setattr(similar_cases, "_watermark", None)
+    monkeypatch.setattr(similar_cases.settings, "SIMILAR_CASES_OVERLAP_SECONDS", 300)
+
+    assert similar_cases.sync(force=True) == 1
+    assert filters == []
+    # A row committed late with an older updated_at is still read
+    assert similar_cases.sync(force=True) == 1
+    assert filters == [("updated_at", "2026-10-19T11:55:00+00:00")]
+    assert len(similar_cases._index) == 1
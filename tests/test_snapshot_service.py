@@ -0,0 +1,46 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.services import snapshot_service
+
+
+def test_sync_table_keeps_only_the_metric_columns(monkeypatch, tmp_path):
+    requested = []
+    rows = [{"id": "2", "updated_at": "2026-10-19T12:00:00+00:00", "first_name": "B"}]
+
+    class FakeQuery:
+        def select(self, columns):
+            requested.append(columns)
+            return self
+
+        def gte(self, column, value):
+            return self
+
+        def order(self, column):
+            return self
+
+        def limit(self, n):
+            return self
+
+        def execute(self):
+            return type("Response", (), {"data": rows})
+
+    class FakeSupabase:
+        def table(self, name):
+            return FakeQuery()
+
+    monkeypatch.setattr(snapshot_service, "supabase", FakeSupabase())
+    monkeypatch.setattr(snapshot_service.settings, "SNAPSHOT_DIR", str(tmp_path))
+    # Snapshot written before the column lists, with PII
+    old = pa.Table.from_pylist(
+        [{"id": "1", "first_name": "A", "email": "a@example.com", "rut": "1-9"}]
+    )
+    pq.write_table(old, tmp_path / "User.parquet")
+    snapshot_service._save_state({"User": "2026-10-19T11:00:00+00:00"})
+
+    assert snapshot_service.sync_table("User") == 1
+    assert requested == [", ".join(snapshot_service.SNAPSHOT_TABLES["User"])]
+    merged = pq.read_table(tmp_path / "User.parquet")
+    assert "email" not in merged.column_names
+    assert "rut" not in merged.column_names
+    assert sorted(merged["id"].to_pylist()) == ["1", "2"]